@@ -1,20 +1,33 @@
-import fileinput
 import sys
+import time
 
 import numpy as np
 from pythonosc.dispatcher import Dispatcher
+from pythonosc.osc_bundle_builder import IMMEDIATELY, OscBundleBuilder
+from pythonosc.osc_message_builder import OscMessageBuilder
 from pythonosc.osc_server import BlockingOSCUDPServer
 from pythonosc.udp_client import SimpleUDPClient
 
 from swf import *
 from swf.constants import *
+from swf import profiling
+from swf.export import DENSE, FUSED, SPARSE, export_encoder, write_encoder_text
+from swf.session import Session
 
 if __name__ == '__main__':
 
     # Lists for storing received values
-    pos = [0]
+    received = []
     quitFlag = [False]
 
+    # options: --mix sends one summed coarse mix instead of the gains of every source
+    mix = '--mix' in sys.argv
+    # --profile records timing spans and writes a summary and a Chrome trace (osc_trace.json) on exit
+    if '--profile' in sys.argv:
+        profiling.enable()
+    sys.argv = [arg for arg in sys.argv if arg not in ('--mix', '--profile')]
+    tick = 0.01 # control period in seconds, all the sources that moved during a tick are rendered together
+
     # ------------------ OSC ips / ports ------------------ #
     # connection parameters
     ip = "127.0.0.1"
@@ -33,12 +46,17 @@ if __name__ == '__main__':
     # in other words the dispatcher routes the osc message to the right action using the address provided
     dispatcher = Dispatcher()
 
-    # define the handler for messages starting with /position]
+    # define the handler for messages starting with /position, kept for single source patches as source 0
     def pos_message_handler(address, *args):
-        pos[0] = np.array(args)
+        received.append(('0', np.array(args)))
+
+    # define the handler for messages of the form /source/<id>/position
+    def source_message_handler(address, *args):
+        received.append((address.split('/')[2], np.array(args)))
 
     # pass the handlers to the dispatcher
     dispatcher.map("/position*", pos_message_handler)
+    dispatcher.map("/source/*/position", source_message_handler)
 
     # you can have a default_handler for messages that don't have dedicated handlers
     def default_handler(address, *args):
@@ -86,22 +104,56 @@ if __name__ == '__main__':
     
     print('built model!')
     
-    np.savetxt('encoder.txt',encoder,newline=';\n')
-    for line in fileinput.input('encoder.txt',inplace=True):
-        sys.stdout.write('%d, %s'%(fileinput.filelineno(), line))
+    level = int(sys.argv[2]) if method == 'transcoding' else 0
+    # text for the coll of the Max patch, and compact float32 binaries (dense, sparse and fused per face) for other consumers
+    write_encoder_text(encoder, 'encoder.txt')
+    export_encoder(model, 'encoder.bin', level, DENSE)
+    export_encoder(model, 'encoder_sparse.bin', level, SPARSE)
+    export_encoder(model, 'encoder_fused.bin', level, FUSED)
     
-    triangles = model.meshes[-1].vertices[model.meshes[-1].faces]
-
-    while (quitFlag[0] is False):
-        server.handle_request()
-        print(f"Received position value: {pos[0]}")
-        #rad = np.radians(pos[0])
-        #loc = toCartesian(np.hstack((1,rad)))
-        loc = pos[0].reshape((1,3))
-        fine = model.interpolate(loc)
+    session = Session(model, truncation_level=level)
 
-        # 3. Send Notes to pd (send pitch last to ensure syncing)
-        py_to_pd_OscSender.send_message("/interpolation", (fine.reshape(-1).tolist()))
-        print(f'interpolation: {fine[fine!=0]}')
+    try:
+        while (quitFlag[0] is False):
+            # collect every message received during one control tick
+            deadline = time.time() + tick
+            with profiling.span('osc/receive'):
+                while time.time() < deadline:
+                    server.timeout = max(deadline - time.time(), 0)
+                    server.handle_request()
+            for source_id, position in received:
+                print(f"Received position value for source {source_id}: {position}")
+                #rad = np.radians(position)
+                #loc = toCartesian(np.hstack((1,rad)))
+                session.set_position(source_id, position)
+            received.clear()
+
+            with profiling.span('osc/tick'):
+                updated = session.tick()
+            if len(updated) == 0:
+                continue
+
+            # 3. Send the gains of every updated source (or the coarse mix) to pd in one bundle
+            bundle = OscBundleBuilder(IMMEDIATELY)
+            if mix:
+                msg = OscMessageBuilder(address="/mix")
+                for g in session.mix().reshape(-1).tolist():
+                    msg.add_arg(g)
+                bundle.add_content(msg.build())
+            else:
+                for source_id, fine in updated.items():
+                    msg = OscMessageBuilder(address="/interpolation" if source_id == '0' else f"/source/{source_id}/interpolation")
+                    for g in fine.reshape(-1).tolist():
+                        msg.add_arg(g)
+                    bundle.add_content(msg.build())
+                    print(f'interpolation {source_id}: {fine[fine!=0]}')
+            with profiling.span('osc/send'):
+                py_to_pd_OscSender.send(bundle.build())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiling.enabled():
+            print(profiling.summary())
+            profiling.chrome_trace('osc_trace.json')
 
-    # ---------------------------------------------------------- #
\ No newline at end of file
+    # ---------------------------------------------------------- #
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from swf.constants import *
+from swf.optimal import OptimalSWF
+from swf.swf import SWF
+from swf.trimesh import Trimesh
+from swf.utils import cost
+
+def measure(fn, repeat=5):
+    """
+    Run fn repeat times and return the median wall time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def peak_memory(fn):
+    """
+    Run fn once and return its result and the peak memory traced during the call, in bytes
+    """
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+def import_time(statement, setup='pass', repeat=5):
+    """
+    Median time in seconds taken by an import statement in a fresh interpreter started at the root of the repository,
+    after running setup, e.g. to exclude the import of numpy
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    code = f'import time; {setup}; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)'
+    times = [float(subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout)
+             for _ in range(repeat)]
+    return float(np.median(times))
+
+def transcoding_chain():
+    """
+    The manually subdivided transcoding meshes, as built in OSCserver.py
+    """
+    key = transcoding_precomputed_coeffs
+    steps = [(v_5_0,f_5_0),(v_5_2,f_5_2),(v_7_4,f_7_4),(v_9_6,f_9_6),(v_11_8,f_11_8)]
+    base = Trimesh(v_3_0,f_3_0,ALPHA=key[0][0],BETA=key[0][1],GAMMA=key[0][2])
+    return base, [(v,f,key[i+1]) for i,(v,f) in enumerate(steps)]
+
+def run(max_level=3, repeat=5, batch=1000, samples=48000):
+    results = {}
+    def record(name, value, unit, better='lower'):
+        results[name] = {'value': value, 'unit': unit, 'better': better}
+        print(f'{name:<45} {value:>14.6g} {unit}')
+
+    # ------------------ Import ------------------ #
+    record('import/swf', import_time('import swf', repeat=repeat), 's')
+    record('import/swf/without_numpy', import_time('import swf', 'import numpy', repeat), 's')
+    record('import/swf.plotting', import_time('import swf.plotting', 'import swf', repeat), 's')
+
+    presets = {'octahedron': (verticesOCT, facesOCT), '704': (vertices704, faces704)}
+
+    # ------------------ Subdivision ------------------ #
+    for name, (v, f) in presets.items():
+        mesh = Trimesh(v, f)
+        for level in range(1, max_level + 1):
+            start = time.perf_counter()
+            mesh = mesh.subdivide()
+            record(f'subdivide/{name}/level{level}', time.perf_counter() - start, 's')
+
+    base, steps = transcoding_chain()
+    mesh = base
+    meshset = []
+    for level, (v, f, key) in enumerate(steps, 1):
+        start = time.perf_counter()
+        mesh = mesh.manual_subdivide(v, f, ALPHA=key[0], BETA=key[1], GAMMA=key[2])
+        record(f'subdivide/transcoding/level{level}', time.perf_counter() - start, 's')
+        meshset.append(mesh)
+
+    # ------------------ SWF construction ------------------ #
+    models = {}
+    for name, (v, f) in presets.items():
+        start = time.perf_counter()
+        model, peak = peak_memory(lambda: SWF(Trimesh(v, f), n=max_level))
+        record(f'swf/{name}/n{max_level}/build', time.perf_counter() - start, 's')
+        record(f'swf/{name}/n{max_level}/peak_memory', peak, 'B')
+        models[name] = model
+
+    # ------------------ Interpolation and encoding ------------------ #
+    rng = np.random.default_rng(0)
+    points = rng.standard_normal((batch, 3))
+    points = points/np.linalg.norm(points, axis=1).reshape(-1, 1)
+    for name, model in models.items():
+        record(f'interpolate/{name}/single', measure(lambda: model.interpolate(points[0]), repeat), 's')
+        elapsed = measure(lambda: model.interpolate(points), max(repeat//2, 1))
+        record(f'interpolate/{name}/batch', batch/elapsed, 'points/s', 'higher')
+
+        fine = rng.standard_normal((model.meshes[-1].vertices.shape[0], samples))
+        elapsed = measure(lambda: model.encode(fine), repeat)
+        record(f'encode/{name}', samples/elapsed, 'samples/s', 'higher')
+
+        record(f'cost/{name}', measure(lambda: cost(model, 1, 1), repeat), 's')
+
+    # ------------------ Optimization ------------------ #
+    np.random.seed(0)
+    record('optimal/704/n1', measure(lambda: OptimalSWF(vertices704, faces704, 1), 1), 's')
+    np.random.seed(0)
+    record('optimal/octahedron/n2', measure(lambda: OptimalSWF(verticesOCT, facesOCT, 2), 1), 's')
+    # with and without the symmetries of the octahedron, which are only used from a thousand finest vertices (n=4)
+    def optimal(n, symmetric):
+        np.random.seed(0)
+        OptimalSWF(verticesOCT, facesOCT, n, symmetric=symmetric)
+    for n in (3, 4):
+        for symmetric in (False, True):
+            elapsed = measure(lambda: optimal(n, symmetric), 3)
+            record(f'optimal/octahedron/n{n}' + ('/symmetric' if symmetric else ''), elapsed, 's')
+
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Print the ratio of each result to its baseline value and return the names of the regressions,
+    i.e. results worse than the baseline by more than the relative tolerance
+    """
+    regressions = []
+    print(f'\n{"benchmark":<45} {"baseline":>12} {"current":>12} {"ratio":>8}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        new = result['value']
+        ratio = new/old if old else float('inf')
+        if result['better'] == 'lower':
+            worse = new > old*(1 + tolerance)
+        else:
+            worse = new < old/(1 + tolerance)
+        flag = '  REGRESSION' if worse else ''
+        print(f'{name:<45} {old:>12.4g} {new:>12.4g} {ratio:>8.2f}{flag}')
+        if worse:
+            regressions.append(name)
+    return regressions
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark subdivision, SWF construction, interpolation, encoding and optimization.")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown tolerated before reporting a regression")
+    parser.add_argument("--max-level", type=int, default=3, help="deepest subdivision level (level 4 takes minutes)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=1000, help="number of points in the batch interpolation")
+    args = parser.parse_args()
+
+    results = run(max_level=args.max_level, repeat=args.repeat, batch=args.batch)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'max_level': args.max_level,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nwrote {args.output}')
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f'{len(regressions)} regressions')
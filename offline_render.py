@@ -0,0 +1,57 @@
+import argparse
+import time
+
+import numpy as np
+
+from swf import *
+from swf.constants import *
+from swf.render import Orbit, load_trajectory, render_file
+
+if __name__ == '__main__':
+
+    # ------------------ Arguments ------------------ #
+    parser = argparse.ArgumentParser(description="Render a mono source moving along a trajectory to the coarse layout of a SWF model, streaming the audio block by block.")
+    parser.add_argument("infile", help="input audio file (all channels are averaged unless --channel is given)")
+    parser.add_argument("outfile", help="output audio file, one channel per vertex of the mesh at the truncation level")
+    parser.add_argument("--model", choices=["704base", "transcoding", "octahedron"], default="704base")
+    parser.add_argument("--level", type=int, default=0, help="truncation level to encode to")
+    parser.add_argument("--subdivisions", type=int, default=2, help="number of subdivisions for 704base and octahedron")
+    parser.add_argument("--trajectory", help="trajectory file: .npz with 'times' and 'positions', or a csv of t,x,y,z lines")
+    parser.add_argument("--orbit", type=float, default=10., help="period in seconds of a horizontal orbit, used when no trajectory file is given")
+    parser.add_argument("--elevation", type=float, default=0., help="elevation in degrees of the orbit")
+    parser.add_argument("--blocksize", type=int, default=65536)
+    parser.add_argument("--hop", type=int, default=256, help="samples between two evaluations of the trajectory")
+    parser.add_argument("--channel", type=int, default=None)
+    parser.add_argument("--subtype", default=None, help="SoundFile subtype of the output, e.g. FLOAT or PCM_24")
+    args = parser.parse_args()
+    # ----------------------------------------------------------
+
+    # ------------------ Model GENERATION  ------------------ #
+    print('initializing model . . .')
+    if args.model == '704base':
+        model = SWF(Trimesh(vertices704,faces704), n=args.subdivisions)
+    elif args.model == 'octahedron':
+        model = SWF(Trimesh(verticesOCT,facesOCT), n=args.subdivisions)
+    elif args.model == 'transcoding':
+        key = transcoding_precomputed_coeffs
+        base = Trimesh(v_3_0,f_3_0,ALPHA=key[0][0],BETA=key[0][1],GAMMA=key[0][2])
+        first = base.manual_subdivide(v_5_0,f_5_0,ALPHA=key[1][0],BETA=key[1][1],GAMMA=key[1][2])
+        second = first.manual_subdivide(v_5_2,f_5_2,ALPHA=key[2][0],BETA=key[2][1],GAMMA=key[2][2])
+        third = second.manual_subdivide(v_7_4,f_7_4,ALPHA=key[3][0],BETA=key[3][1],GAMMA=key[3][2])
+        fourth = third.manual_subdivide(v_9_6,f_9_6,ALPHA=key[4][0],BETA=key[4][1],GAMMA=key[4][2])
+        fifth = fourth.manual_subdivide(v_11_8,f_11_8,ALPHA=key[5][0],BETA=key[5][1],GAMMA=key[5][2])
+        model = SWF(base,2,meshset=[first,second,third,fourth,fifth])
+    print('built model!')
+
+    if args.trajectory is not None:
+        trajectory = load_trajectory(args.trajectory)
+    else:
+        trajectory = Orbit(args.orbit, elevation=np.radians(args.elevation))
+
+    # ------------------ Rendering ------------------ #
+    start = time.time()
+    frames = render_file(model, args.infile, args.outfile, trajectory,
+                         truncation_level=args.level, blocksize=args.blocksize, hop_size=args.hop,
+                         channel=args.channel, subtype=args.subtype)
+    elapsed = time.time() - start
+    print(f'rendered {frames} samples in {elapsed:.2f}s')
@@ -1,7 +1,13 @@
-from optimal import OptimalSWF
-from trimesh import Trimesh
-from utils import *
-
-from swf import SWF
+from .swf import SWF
+from .trimesh import Trimesh
+from .utils import toCartesian, toSpherical
 
 __all__ = ["Trimesh", "SWF", "OptimalSWF", "toCartesian", "toSpherical"]
+
+
+def __getattr__(name):
+    # OptimalSWF pulls in scipy.optimize, only import it when it is asked for
+    if name == "OptimalSWF":
+        from .optimal import OptimalSWF
+        return OptimalSWF
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,191 @@
+import time
+import numpy as np
+import soundfile as sf
+
+# Transcoding of Ambisonics (B-format, HOA) to a SWF. An Ambisonic signal of order N is a sound field
+#   g(v) = sum over the (N+1)**2 channels i of B_i Y_i(v) / (4 pi)
+# with Y_i the real spherical harmonics in N3D normalization (the integral of Y_i**2 over the sphere is 4 pi), so that a
+# plane wave from u, encoded as B_i = Y_i(u), integrates to 1 over the sphere. The field is sampled at the vertices of
+# the finest mesh with the solid angle around each vertex as quadrature weight, which gives a signal over the finest
+# mesh whose sum is the pressure, as SWF.interpolate does for a source, and is then encoded with phi2s[truncation_level].
+# All of it is one (n_coarse, (N+1)**2) matrix, precomputed once and applied to every block of samples.
+
+def real_sh(directions,order,normalization='sn3d'):
+    """
+    Real spherical harmonics in ACN channel order, without the Condon-Shortley phase, as in AmbiX
+
+    Parameters
+    -----------
+    directions : (m, 3) float
+      x to the front, y to the left, z up
+    order : int
+    normalization : str
+      'sn3d', 'n3d', or 'fuma' (order 1 only, channels W X Y Z with W scaled by 1/sqrt(2))
+    Returns
+    -----------
+    Y : (m, (order+1)**2) float
+    """
+    from scipy.special import lpmv, factorial
+    directions = np.asarray(directions,dtype=float).reshape(-1,3)
+    directions = directions/np.linalg.norm(directions,axis=1).reshape(-1,1)
+    azimuth = np.arctan2(directions[:,1],directions[:,0])
+    sin_elevation = np.clip(directions[:,2],-1,1)
+    Y = np.empty((directions.shape[0],(order+1)**2))
+    for n in range(order+1):
+        for m in range(-n,n+1):
+            a = abs(m)
+            norm = np.sqrt((2 - (m == 0))*factorial(n-a)/factorial(n+a))
+            if normalization == 'n3d':
+                norm *= np.sqrt(2*n + 1)
+            legendre = (-1)**a*lpmv(a,n,sin_elevation) #cancels the Condon-Shortley phase of scipy
+            Y[:,n*n + n + m] = norm*legendre*(np.cos(a*azimuth) if m >= 0 else np.sin(a*azimuth))
+    if normalization == 'fuma':
+        if order != 1:
+            raise ValueError('the FuMa normalization is only supported at order 1')
+        Y = Y[:,[0,3,1,2]]*np.array([1/np.sqrt(2),1,1,1])
+    elif normalization not in ('sn3d','n3d'):
+        raise ValueError(f"unknown normalization {normalization}, use 'sn3d', 'n3d' or 'fuma'")
+    return Y
+
+def to_n3d(order,normalization='sn3d'):
+    """
+    The matrix that turns Ambisonic channels of a normalization into ACN/N3D channels
+
+    Returns
+    -----------
+    T : ((order+1)**2, (order+1)**2) float
+      n3d = T @ channels
+    """
+    if normalization == 'n3d':
+        return np.identity((order+1)**2)
+    if normalization == 'sn3d':
+        return np.diag(np.concatenate([np.full(2*n + 1,np.sqrt(2*n + 1)) for n in range(order+1)]))
+    if normalization == 'fuma':
+        if order != 1:
+            raise ValueError('the FuMa normalization is only supported at order 1')
+        T = np.zeros((4,4))
+        T[0,0] = np.sqrt(2) #W
+        T[3,1] = T[1,2] = T[2,3] = np.sqrt(3) #X Y Z to ACN 3 1 2
+        return T
+    raise ValueError(f"unknown normalization {normalization}, use 'sn3d', 'n3d' or 'fuma'")
+
+def max_re_weights(order):
+    """
+    Per-order gains of the max-rE decoder, which trade spatial resolution for smaller side lobes
+    (the Legendre polynomials at the cosine of 137.9 degrees / (order + 1.51))
+
+    Returns
+    -----------
+    ((order+1)**2,) float
+    """
+    from scipy.special import eval_legendre
+    x = np.cos(np.radians(137.9)/(order + 1.51))
+    return np.concatenate([np.full(2*n + 1,eval_legendre(n,x)) for n in range(order+1)])
+
+def vertex_solid_angles(mesh):
+    """
+    Solid angle around every vertex of a mesh: a third of the solid angle of each face around it, from the formula of
+    Van Oosterom and Strackee. The solid angles sum to 4 pi for a closed mesh, and to the area covered by a dome.
+
+    Returns
+    -----------
+    (n,) float
+    """
+    corners = mesh.vertices[mesh.faces]
+    corners = corners/np.linalg.norm(corners,axis=2,keepdims=True)
+    a,b,c = corners[:,0],corners[:,1],corners[:,2]
+    numerator = np.abs(np.sum(a*np.cross(b,c),axis=1))
+    denominator = 1 + np.sum(a*b,axis=1) + np.sum(b*c,axis=1) + np.sum(c*a,axis=1)
+    omega = 2*np.arctan2(numerator,denominator)
+    areas = np.zeros(mesh.vertices.shape[0])
+    np.add.at(areas,mesh.faces.reshape(-1),np.repeat(omega/3,3))
+    return areas
+
+def decoder(model,order,normalization='sn3d',weighting='basic'):
+    """
+    The sampling decoder from Ambisonic channels to a signal over the finest mesh of a SWF
+
+    Parameters
+    -----------
+    model : SWF
+    order : int
+    normalization : str
+      of the Ambisonic channels, see real_sh
+    weighting : str
+      'basic' or 'max_re'
+    Returns
+    -----------
+    D : (N_fine, (order+1)**2) float
+    """
+    mesh = model.meshes[-1]
+    Y = real_sh(mesh.vertices,order,'n3d')
+    if weighting == 'max_re':
+        Y = Y*max_re_weights(order)/max_re_weights(order)[0]
+    elif weighting != 'basic':
+        raise ValueError(f"unknown weighting {weighting}, use 'basic' or 'max_re'")
+    return (vertex_solid_angles(mesh)/(4*np.pi)).reshape(-1,1)*Y @ to_n3d(order,normalization)
+
+def transcoder(model,order,truncation_level=0,normalization='sn3d',weighting='basic'):
+    """
+    The Ambisonics to SWF matrix, the decoder over the finest mesh folded with phi2s[truncation_level]
+
+    Returns
+    -----------
+    M : (n_coarse, (order+1)**2) float
+      coarse = M @ channels
+    """
+    return np.asarray(model.phi2s[truncation_level] @ decoder(model,order,normalization,weighting))
+
+def order_of(channels):
+    """
+    The Ambisonic order of a number of channels, (order+1)**2 = channels
+    """
+    order = int(round(np.sqrt(channels))) - 1
+    if (order+1)**2 != channels:
+        raise ValueError(f'{channels} channels is not a full-sphere Ambisonic signal, expected (order+1)**2')
+    return order
+
+def transcode_file(model,infile,outfile,truncation_level=0,normalization='sn3d',weighting='basic',blocksize=65536,subtype='FLOAT'):
+    """
+    Transcode an Ambisonic audio file to the coarse channels of a SWF, block by block: each block is one
+    (blocksize, channels) @ (channels, n_coarse) product, so memory only depends on blocksize
+
+    Parameters
+    -----------
+    model : SWF
+      the format to transcode to
+    infile : str
+      Ambisonic audio file, (order+1)**2 channels in ACN order
+    outfile : str
+      audio file to write, one channel per vertex of the mesh at the truncation level
+    truncation_level : int
+    normalization : str
+      of the input, see real_sh
+    weighting : str
+      'basic' or 'max_re'
+    blocksize : int
+      number of samples read at once
+    subtype : str
+      SoundFile subtype of the output
+    Returns
+    -----------
+    report : dict
+      frames written, seconds spent in total and in the products, and the speed as a multiple of real time.
+      With many output channels, writing the file takes most of the time.
+    """
+    start = time.perf_counter()
+    frames = 0
+    compute = 0
+    with sf.SoundFile(infile) as src:
+        M = transcoder(model,order_of(src.channels),truncation_level,normalization,weighting)
+        MT = np.ascontiguousarray(M.T)
+        with sf.SoundFile(outfile,'w',src.samplerate,M.shape[0],subtype) as dst:
+            for block in src.blocks(blocksize=blocksize,always_2d=True):
+                tick = time.perf_counter()
+                out = block @ MT
+                compute += time.perf_counter() - tick
+                dst.write(out)
+                frames += block.shape[0]
+        samplerate = src.samplerate
+    elapsed = time.perf_counter() - start
+    return {'frames':frames,'seconds':elapsed,'compute_seconds':compute,'realtime':frames/samplerate/max(elapsed,1e-12)}
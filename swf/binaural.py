@@ -0,0 +1,163 @@
+import numpy as np
+from .metrics import layout
+
+# Binaural decoding of the coarse channels: every channel is a virtual loudspeaker in the direction of its vertex,
+# convolved with the head-related impulse responses (HRIRs) of the closest measured direction and summed per ear.
+# The convolution is uniformly partitioned: each HRIR is cut into partitions of one block, the spectra of the last
+# input blocks of every channel are kept in a frequency-domain delay line, and one block of output is
+#   Y[f] = sum over partitions p and channels c of X[f, p, c] * H[f, p, c]
+# computed for both ears as one batched product per frequency, then transformed back and overlap-added.
+
+def synthetic_hrirs(directions,samplerate=48000,taps=256,radius=0.0875,c=343.0):
+    """
+    HRIRs of a rigid spherical head with the ears on the y axis: the interaural time difference of Woodworth's formula
+    and the head shadow of Brown and Duda's one-pole model. A rough stand-in for measured HRIRs, e.g. for tests.
+
+    Parameters
+    -----------
+    directions : (m, 3) float
+      unit vectors, x to the front, y to the left, z up
+    samplerate : int
+    taps : int
+      length of the responses
+    radius : float
+      head radius in meters
+    c : float
+      speed of sound in m/s
+    Returns
+    -----------
+    hrirs : (m, 2, taps) float
+      left and right responses of every direction
+    """
+    directions = np.asarray(directions,dtype=float).reshape(-1,3)
+    f = np.fft.rfftfreq(2*taps,1/samplerate)
+    w0 = c/radius
+    hrirs = np.empty((directions.shape[0],2,taps))
+    for e,side in enumerate((1,-1)):
+        #angle between the direction and the ear
+        cos = np.clip(side*directions[:,1],-1,1)
+        angle = np.arccos(cos)
+        #path around the head from the closest point to the ear, with the head centre as reference
+        delay = np.where(angle < np.pi/2,-radius*cos,radius*(angle - np.pi/2))/c + 2*radius/c
+        alpha = (1 + cos).reshape(-1,1) #2 facing the ear, 0 opposite
+        shadow = (1 + 1j*alpha*np.pi*f/w0)/(1 + 1j*np.pi*f/w0)
+        H = shadow*np.exp(-2j*np.pi*f*delay.reshape(-1,1))
+        h = np.fft.irfft(H,2*taps,axis=1)[:,:taps]
+        hrirs[:,e] = h*np.hanning(2*taps)[taps:] #fade out the end
+    return hrirs
+
+def save_hrirs(path,directions,hrirs,samplerate):
+    """
+    Write HRIRs to a .npz file with the arrays directions (m, 3), hrirs (m, 2, taps) and samplerate
+    """
+    np.savez(path,directions=np.asarray(directions,dtype=float),hrirs=np.asarray(hrirs,dtype=float),samplerate=samplerate)
+
+def load_hrirs(path):
+    """
+    Read HRIRs from a .npz file holding the arrays hrirs (m, 2, taps), samplerate, and either directions (m, 3)
+    or azimuth and elevation (m,) in degrees, azimuth counterclockwise from the front
+
+    Returns
+    -----------
+    directions : (m, 3) float
+    hrirs : (m, 2, taps) float
+    samplerate : int
+    """
+    data = np.load(path)
+    if 'directions' in data:
+        directions = data['directions'].reshape(-1,3)
+    else:
+        azimuth,elevation = np.radians(data['azimuth']),np.radians(data['elevation'])
+        directions = np.column_stack((np.cos(elevation)*np.cos(azimuth),np.cos(elevation)*np.sin(azimuth),np.sin(elevation)))
+    directions = directions/np.linalg.norm(directions,axis=1).reshape(-1,1)
+    hrirs = data['hrirs']
+    if hrirs.ndim != 3 or hrirs.shape[:2] != (directions.shape[0],2):
+        raise ValueError(f'expected hrirs of shape ({directions.shape[0]}, 2, taps), got {hrirs.shape}')
+    return directions,hrirs,int(data['samplerate'])
+
+def nearest_hrirs(vertices,directions,hrirs):
+    """
+    The HRIRs of the measured direction closest to every vertex
+
+    Returns
+    -----------
+    (n, 2, taps) float
+    """
+    vertices = vertices/np.linalg.norm(vertices,axis=1).reshape(-1,1)
+    return hrirs[np.argmax(vertices @ directions.T,axis=1)]
+
+class BinauralDecoder():
+    def __init__(self,hrirs,blocksize):
+        '''
+        uniformly partitioned overlap-add convolution of many channels with a pair of HRIRs each, summed to two ears.
+        The spectra and the delay line are allocated here, and the output of a block only depends on the blocks up to that
+        one, so the latency is the block itself.
+
+        hrirs : (channels, 2, taps) float
+            left and right responses of every channel
+        blocksize : int
+            number of samples per block, also the length of the partitions
+        '''
+        hrirs = np.asarray(hrirs,dtype=float)
+        self.channels,_,taps = hrirs.shape
+        self.blocksize = B = int(blocksize)
+        self.partitions = P = -(-taps//B)
+        C = self.channels
+        F = B + 1
+        #spectra of the partitions, laid out (frequency, ear, partition*channel) for one batched product per frequency
+        padded = np.zeros((C,2,P*B))
+        padded[:,:,:taps] = hrirs
+        spectra = np.fft.rfft(padded.reshape(C,2,P,B),2*B,axis=3) #(C, 2, P, F)
+        self.spectra = np.ascontiguousarray(spectra.transpose(3,1,2,0).reshape(F,2,P*C))
+        #frequency-domain delay line, the newest block first
+        self.fdl = np.zeros((F,P*C,1),dtype=complex)
+        self._padded = np.zeros((2*B,C))
+        self._spectrum = np.empty((F,C),dtype=complex)
+        self._product = np.empty((F,2,1),dtype=complex)
+        self.tail = np.zeros((B,2))
+
+    def __repr__(self):
+        return f"binaural decoder of {self.channels} channels" + "\nblocksize, partitions: \n" + str((self.blocksize,self.partitions))
+
+    @classmethod
+    def from_model(cls,model,hrirs,directions,blocksize,truncation_level=0):
+        '''
+        decoder of the coarse channels of a SWF at a truncation level, with the HRIRs of the closest direction to every vertex
+        '''
+        return cls(nearest_hrirs(layout(model,truncation_level),directions,hrirs),blocksize)
+
+    def reset(self):
+        self.fdl[...] = 0
+        self.tail[...] = 0
+
+    def process(self,block,out=None):
+        '''
+        decode one block
+
+        Parameters
+        ----------
+        block : (blocksize, channels) float
+          coarse channels
+        out : (blocksize, 2) float (optional)
+          written with the left and right ears, a new array if None
+        Returns
+        ----------
+        out : (blocksize, 2) float
+        '''
+        B,C = self.blocksize,self.channels
+        if block.shape != (B,C):
+            raise ValueError(f'expected a block of shape {(B,C)}, got {block.shape}')
+        if out is None:
+            out = np.empty((B,2))
+        #shift the delay line by one partition and put the spectrum of the new block in front
+        fdl = self.fdl.reshape(B+1,-1)
+        if self.partitions > 1:
+            fdl[:,C:] = fdl[:,:-C]
+        self._padded[:B] = block
+        self._spectrum[...] = np.fft.rfft(self._padded,axis=0)
+        fdl[:,:C] = self._spectrum
+        np.matmul(self.spectra,self.fdl,out=self._product)
+        y = np.fft.irfft(self._product[:,:,0],2*B,axis=0) #(2B, 2)
+        np.add(y[:B],self.tail,out=out)
+        self.tail[...] = y[B:]
+        return out
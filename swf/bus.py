@@ -0,0 +1,298 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Layout of the shared block, every part aligned to 64 bytes:
+#   header  int64 [active slot, sequence of slot 0, sequence of slot 1, number of publishes]
+#   slot 0  faces (S,) int64, weights (S,3) float64, gains (S,C) float64
+#   slot 1  the same
+# The writer fills the slot that is not active and then makes it active, so readers of the active slot are never
+# written over by the next publish, only by the one after. Each slot is guarded by its sequence number: odd while the
+# slot is being written, and increasing over all publishes, so a reader that compares it before and after copying
+# detects a torn read and can tell new gains from ones it already has.
+_ALIGN = 64
+
+def _aligned(n):
+    return -(-n//_ALIGN)*_ALIGN
+
+class GainBus():
+    def __init__(self,sources,channels,name=None):
+        '''
+        double-buffered per-source faces, weights and coarse gains in shared memory, written by one control process
+        and read by any number of render processes without locks and without copying.
+
+        sources : int
+            number of sources
+        channels : int
+            number of coarse gains per source
+        name : str (optional)
+            name of an existing bus to attach to, a new bus is created if None. Pass bus.name to the other processes.
+        '''
+        self.sources = int(sources)
+        self.channels = int(channels)
+        S,C = self.sources,self.channels
+        parts = (('faces',(S,),np.int64),('weights',(S,3),np.float64),('gains',(S,C),np.float64))
+        header = _aligned(4*8)
+        slot = sum(_aligned(int(np.prod(shape))*8) for _,shape,_ in parts)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True,size=header + 2*slot)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < header + 2*slot:
+                raise ValueError(f'bus {name} is too small for {S} sources and {C} channels')
+        self.name = self.shm.name
+        self.header = np.ndarray(4,dtype=np.int64,buffer=self.shm.buf)
+        #views of both slots, built once so that reading and writing do not create any array
+        self.slots = []
+        offset = header
+        for _ in range(2):
+            views = {}
+            for part,shape,dtype in parts:
+                views[part] = np.ndarray(shape,dtype=dtype,buffer=self.shm.buf,offset=offset)
+                offset += _aligned(int(np.prod(shape))*8)
+            self.slots.append(views)
+        if self.owner:
+            self.header[:] = 0
+            for views in self.slots:
+                views['faces'][:] = -1
+                views['weights'][:] = 0
+                views['gains'][:] = 0
+
+    def __repr__(self):
+        return f"gain bus {self.name}" + "\nsources, channels, publishes: \n" + str((self.sources,self.channels,int(self.header[3])))
+
+    def close(self):
+        '''
+        detach from the bus, and release it if this process created it. Every other process must have closed it first.
+        '''
+        self.header = None
+        self.slots = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def publish(self,gains,faces=None,weights=None):
+        '''
+        write the gains of every source, and optionally their faces and interpolation weights, into the back slot
+        and make it the active one. Only one process may publish.
+
+        Parameters
+        ----------
+        gains : (sources, channels) float
+        faces : (sources,) int (optional)
+          face of the finest mesh of every source
+        weights : (sources, 3) float (optional)
+          interpolation weights over the vertices of every face
+        Returns
+        ----------
+        sequence : int
+          sequence number of the published slot
+        '''
+        header = self.header
+        back = 1 - int(header[0])
+        views = self.slots[back]
+        n = int(header[3])
+        header[1+back] = 2*n + 1 #odd: being written
+        np.copyto(views['gains'],gains)
+        if faces is not None:
+            np.copyto(views['faces'],faces)
+        if weights is not None:
+            np.copyto(views['weights'],np.reshape(weights,(-1,3)))
+        header[1+back] = 2*n + 2
+        header[3] = n + 1
+        header[0] = back
+        return 2*n + 2
+
+    def acquire(self):
+        '''
+        the active slot and its sequence number, to read self.slots[slot] in place. The views are consistent
+        if validate(slot, sequence) is still True once they have been used.
+
+        Returns
+        ----------
+        slot : int
+        sequence : int
+          0 before the first publish, -1 if the slot is being written
+        '''
+        slot = int(self.header[0])
+        sequence = int(self.header[1+slot])
+        return slot,(-1 if sequence & 1 else sequence)
+
+    def validate(self,slot,sequence):
+        '''
+        whether the slot acquired with this sequence number was not written over since
+        '''
+        return sequence >= 0 and int(self.header[1+slot]) == sequence
+
+    def read(self,gains,faces=None,weights=None,retries=4):
+        '''
+        copy the active slot into the caller's buffers, retrying a torn read a few times. Never waits for the writer.
+
+        Parameters
+        ----------
+        gains : (sources, channels) float
+          overwritten with the gains
+        faces : (sources,) int (optional)
+        weights : (sources, 3) float (optional)
+        retries : int
+          number of reads attempted before giving up
+        Returns
+        ----------
+        sequence : int
+          sequence number of the copied slot, or -1 if every attempt was torn and the buffers hold a mix of two publishes
+        '''
+        for _ in range(retries):
+            slot,sequence = self.acquire()
+            if sequence < 0:
+                continue
+            views = self.slots[slot]
+            np.copyto(gains,views['gains'])
+            if faces is not None:
+                np.copyto(faces,views['faces'])
+            if weights is not None:
+                np.copyto(weights,views['weights'])
+            if self.validate(slot,sequence):
+                return sequence
+        return -1
+
+class BusController():
+    def __init__(self,bus,engine):
+        '''
+        control side of a GainBus: locates the sources with the point location of an Engine and publishes their faces,
+        weights and gains. It runs in the control process (OSC, trajectories), away from the audio callbacks.
+
+        bus : GainBus
+        engine : Engine
+            used for its positions and control step only, its sources and channels must match the bus
+        '''
+        if (engine.sources,engine.channels) != (bus.sources,bus.channels):
+            raise ValueError(f'the engine has {(engine.sources,engine.channels)} sources and channels, the bus {(bus.sources,bus.channels)}')
+        self.bus = bus
+        self.engine = engine
+
+    def __repr__(self):
+        return f"bus controller" + "\nbus: \n" + str(self.bus)
+
+    def update(self,positions):
+        '''
+        publish the gains of the sources at new positions
+
+        Parameters
+        ----------
+        positions : (sources, 3) float
+        Returns
+        ----------
+        sequence : int
+        '''
+        np.copyto(self.engine.positions,positions)
+        self.engine.control()
+        return self.bus.publish(self.engine.gains,self.engine.face,self.engine._weights)
+
+class BusRenderer():
+    def __init__(self,bus,blocksize):
+        '''
+        render side of a GainBus: mixes blocks of every source with the last published gains, ramped linearly from the
+        gains of the previous block as in Engine.process. A block never waits for the control process: if nothing new
+        was published, or the read was torn, the gains of the previous block are kept. Allocates nothing once warmed up.
+
+        bus : GainBus
+        blocksize : int
+            number of samples per block
+        '''
+        self.bus = bus
+        self.blocksize = int(blocksize)
+        S,C,L = bus.sources,bus.channels,self.blocksize
+        self.sequence = 0 #of the gains in use
+        self.stale = 0 #blocks rendered while a newer publish than the gains in use was on the bus
+        self.torn = 0 #reads given up because the writer kept writing over the slot
+        self.previous = np.zeros((S,C))
+        self.gains = np.zeros((S,C))
+        self._read = np.zeros((S,C))
+        self.ramp = np.repeat(((np.arange(L) + 1)/L).reshape(-1,1),S,axis=1)
+        self._scaled = np.empty((L,S))
+        self._delta = np.empty((S,C))
+        self._out = np.empty((L,C))
+
+    def __repr__(self):
+        return f"bus renderer" + "\nsequence, stale, torn: \n" + str((self.sequence,self.stale,self.torn))
+
+    def poll(self):
+        '''
+        take the last published gains if they are new, returns whether they were
+        '''
+        slot,sequence = self.bus.acquire()
+        if sequence == self.sequence:
+            return False
+        sequence = self.bus.read(self._read)
+        if sequence < 0:
+            self.torn += 1
+            return False
+        np.copyto(self.gains,self._read)
+        self.sequence = sequence
+        return True
+
+    def process(self,in_block,out_block):
+        '''
+        render one block, writing into the caller's buffer
+
+        Parameters
+        ----------
+        in_block : (blocksize, sources) float64
+        out_block : (blocksize, channels) float64
+        '''
+        if in_block.shape != (self.blocksize,self.bus.sources) or out_block.shape != (self.blocksize,self.bus.channels):
+            raise ValueError(f'expected blocks of shape {(self.blocksize,self.bus.sources)} and {(self.blocksize,self.bus.channels)}')
+        self.poll()
+        #the gains of publish n carry the sequence number 2n + 2, header[3] counts the publishes
+        if int(self.bus.header[3]) > self.sequence//2:
+            self.stale += 1
+        np.matmul(in_block,self.previous,out=out_block)
+        np.multiply(in_block,self.ramp,out=self._scaled)
+        np.subtract(self.gains,self.previous,out=self._delta)
+        np.matmul(self._scaled,self._delta,out=self._out)
+        np.add(out_block,self._out,out=out_block)
+        np.copyto(self.previous,self.gains)
+
+def run_controller(name,model,trajectories,rate,duration,truncation_level=0,jitter=0.0,seed=0):
+    """
+    Control loop of a separate process: evaluates the trajectories at a control rate and publishes the gains on the bus,
+    optionally with random delays to simulate a busy control process (OSC parsing, garbage collection)
+
+    Parameters
+    -----------
+    name : str
+      name of the bus
+    model : SWF
+    trajectories : list of callable t -> (n,3) float
+      one per source, picklable (Trajectory, Orbit)
+    rate : float
+      publishes per second
+    duration : float
+      seconds to run
+    truncation_level : int
+    jitter : float
+      largest random delay added to each period, in seconds
+    seed : int
+    Returns
+    -----------
+    publishes : int
+    """
+    from .engine import Engine
+    engine = Engine(model,len(trajectories),1,truncation_level)
+    bus = GainBus(engine.sources,engine.channels,name=name)
+    controller = BusController(bus,engine)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    publishes = 0
+    try:
+        while True:
+            t = time.perf_counter() - start
+            if t >= duration:
+                break
+            controller.update(np.vstack([trajectory(np.array([t])) for trajectory in trajectories]))
+            publishes += 1
+            time.sleep(max(1/rate + jitter*rng.random() - (time.perf_counter() - start - t),0))
+    finally:
+        bus.close()
+    return publishes
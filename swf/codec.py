@@ -0,0 +1,156 @@
+import numpy as np
+
+def entropy_bits(symbols):
+    """
+    Number of bits needed to code a set of integer symbols with an ideal entropy coder, from their empirical distribution
+
+    Parameters
+    -----------
+    symbols : np.array int
+    Returns
+    -----------
+    bits : float
+    """
+    symbols = np.asarray(symbols).reshape(-1)
+    if symbols.size == 0:
+        return 0.0
+    _, counts = np.unique(symbols, return_counts=True)
+    p = counts/symbols.size
+    return float(-np.sum(counts*np.log2(p)))
+
+class Codec():
+    def __init__(self,model,thresholds=0,steps=None,base_step=None):
+        '''
+        wavelet-domain codec for signals defined over the finest mesh of a SWF. The detail coefficients d_j = psi2s[j] @ f
+        of every level are hard thresholded and uniformly quantized, and the signal is rebuilt through the scaling and wavelet
+        functions, f = phis[0] @ c_0 + sum_j psis[j] @ d_j.
+
+        model : SWF
+            the format
+        thresholds : float or list of float
+            per level, detail coefficients with an absolute value smaller or equal to the threshold are set to zero
+        steps : float or list of float (optional)
+            per level, quantization step of the detail coefficients. None keeps them as float
+        base_step : float (optional)
+            quantization step of the base coefficients c_0. None keeps them as float
+        '''
+        self.model = model
+        n = model.n
+        self.thresholds = list(np.broadcast_to(np.asarray(thresholds,dtype=float),(n,)))
+        self.steps = [None]*n if steps is None else [None if s is None else float(s) for s in (steps if np.ndim(steps) else [steps]*n)]
+        if len(self.steps) != n or len(self.thresholds) != n:
+            raise ValueError(f'give one threshold and one step per level ({n})')
+        self.base_step = base_step
+
+    def __repr__(self):
+        return f"codec over {self.model.n} levels" + "\nthresholds: \n" + str(self.thresholds) + "\nsteps: \n" + str(self.steps)
+
+    def analyze(self,fine):
+        '''
+        split a signal into base and detail coefficients
+
+        Parameters
+        ----------
+        fine : (N_fine, k) float
+        Returns
+        ----------
+        (base, details) : (N_0, k) float and list of (m_j, k) float
+        '''
+        return self.model.phi2s[0] @ fine, [psi2 @ fine for psi2 in self.model.psi2s]
+
+    def quantize(self,base,details):
+        '''
+        threshold and quantize the coefficients. Quantized levels are returned as integer arrays, the others as float
+
+        Returns
+        ----------
+        (base, details) : coded coefficients
+        '''
+        if self.base_step is not None:
+            base = np.rint(base/self.base_step).astype(np.int32)
+        coded = []
+        for d,t,q in zip(details,self.thresholds,self.steps):
+            d = np.where(np.abs(d) > t,d,0)
+            if q is not None:
+                d = np.rint(d/q).astype(np.int32)
+            coded.append(d)
+        return base,coded
+
+    def dequantize(self,base,details):
+        '''
+        inverse of the quantization (the thresholding cannot be undone)
+        '''
+        if self.base_step is not None:
+            base = base*self.base_step
+        return base,[d if q is None else d*q for d,q in zip(details,self.steps)]
+
+    def synthesize(self,base,details):
+        '''
+        rebuild a signal over the finest mesh from its base and detail coefficients
+
+        Returns
+        ----------
+        fine : (N_fine, k) float
+        '''
+        fine = self.model.phis[0] @ base
+        for psi,d in zip(self.model.psis,details):
+            fine = fine + psi @ d
+        return fine
+
+    def encode(self,fine):
+        '''
+        analyze, threshold and quantize a signal over the finest mesh
+        '''
+        return self.quantize(*self.analyze(fine))
+
+    def decode(self,base,details):
+        '''
+        dequantize and synthesize coded coefficients
+        '''
+        return self.synthesize(*self.dequantize(base,details))
+
+    def report(self,fine,truncation_level=None):
+        """
+        Rate and distortion of the codec on a signal, against the unquantized signal
+
+        Parameters
+        ----------
+        fine : (N_fine, k) float
+          the signal, e.g. the interpolation of a source over some samples
+        truncation_level : int (optional)
+          if given, also report the error after encoding both signals to that level, i.e. on the speaker feeds
+        Returns
+        ----------
+        report : dict
+          bits per level (entropy estimate for quantized levels, 32 bits per non-zero float otherwise, plus one bit per coefficient
+          for the significance map of thresholded float levels), total bits, compression ratio against float32 coefficients,
+          fraction of non-zero details, and the signal to noise ratio in dB of the reconstruction
+        """
+        fine = np.asarray(fine,dtype=float)
+        if fine.ndim == 1:
+            fine = fine.reshape(-1,1)
+        base,details = self.encode(fine)
+        decoded = self.decode(base,details)
+
+        def bits(c,step):
+            if step is not None:
+                return entropy_bits(c)
+            return 32.0*np.count_nonzero(c) + (c.size if np.count_nonzero(c) < c.size else 0)
+
+        level_bits = [bits(base,self.base_step)] + [bits(d,q) for d,q in zip(details,self.steps)]
+        total = float(np.sum(level_bits))
+        raw = 32.0*fine.size
+        error = decoded - fine
+        result = {
+            'bits_per_level': [float(b) for b in level_bits],
+            'bits': total,
+            'compression': raw/total if total > 0 else np.inf,
+            'nonzero_details': float(sum(np.count_nonzero(d) for d in details)/max(sum(d.size for d in details),1)),
+            'snr_db': float(10*np.log10(np.sum(fine**2)/np.sum(error**2))) if np.any(error) else np.inf,
+            'max_error': float(np.max(np.abs(error))),
+        }
+        if truncation_level is not None:
+            reference = self.model.encode(fine,truncation_level)
+            feeds = self.model.encode(decoded,truncation_level) - reference
+            result['snr_db_at_level'] = float(10*np.log10(np.sum(reference**2)/np.sum(feeds**2))) if np.any(feeds) else np.inf
+        return result
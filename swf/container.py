@@ -0,0 +1,203 @@
+import json
+import struct
+import numpy as np
+
+# A container starts with the magic 'SWFC', a uint32 length and a JSON header of that length.
+# The header lists the bands of the stream: band 0 holds the coarse channels over the base mesh, c_0 = phi2s[0] @ f,
+# and band j+1 the details added by subdivision j+1, d_j = psi2s[j] @ f. Each band is one contiguous float32 block
+# of shape (frames, channels), starting on a page boundary, so a reader can memory map only the bands it needs.
+# The coarse channels at level L are rebuilt from the base and the first L detail bands with c_j+1 = P_j+1 c_j + Q_j+1 d_j.
+MAGIC = b'SWFC'
+ALIGN = 4096
+
+def analysis(model):
+    """
+    The stacked analysis operator of a SWF, [phi2s[0]; psi2s[0]; ...; psi2s[n-1]], together with the number of channels of each band
+
+    Returns
+    -----------
+    operator : (N_fine, N_fine) float
+    channels : list of int
+    """
+    bands = [model.phi2s[0]] + list(model.psi2s)
+    return np.vstack([np.asarray(b) for b in bands]), [b.shape[0] for b in bands]
+
+def _band(path,dtype,mode,offset,frames,channels):
+    #memory map of one band, an empty array for an empty stream since a memory map cannot have zero bytes
+    if frames == 0:
+        return np.zeros((0,channels),dtype=dtype)
+    return np.memmap(path,dtype=dtype,mode=mode,offset=offset,shape=(frames,channels))
+
+class ContainerWriter():
+    def __init__(self,path,model,samplerate,frames):
+        '''
+        writes a level-progressive container of known length, block of samples by block of samples.
+
+        path : str
+            file to write
+        model : SWF
+            the format the stream is encoded in
+        samplerate : int
+        frames : int
+            total number of samples of the stream
+        '''
+        self.path = path
+        self.samplerate = int(samplerate)
+        self.frames = int(frames)
+        if self.frames < 0:
+            raise ValueError(f'the number of frames must not be negative, got {frames}')
+        self.operator,self.channels = analysis(model)
+        bands = []
+        header = {'samplerate':self.samplerate,'frames':self.frames,'dtype':'<f4',
+                  'vertices':[model.base.vertices.shape[0]] + [m.vertices.shape[0] for m in model.meshes],'bands':bands}
+        #the header size depends on the offsets it holds, reserve enough room for it first
+        size = len(json.dumps(header)) + 96*len(self.channels) + 8
+        offset = -(-size//ALIGN)*ALIGN
+        for c in self.channels:
+            nbytes = 4*c*self.frames
+            bands.append({'channels':c,'offset':offset,'nbytes':nbytes})
+            offset += -(-nbytes//ALIGN)*ALIGN
+        text = json.dumps(header).encode()
+        if len(text) + 8 > bands[0]['offset']:
+            raise ValueError(f'the header of {len(text)} bytes does not fit in the {bands[0]["offset"] - 8} bytes reserved for it')
+        with open(path,'wb') as f:
+            f.write(MAGIC + struct.pack('<I',len(text)) + text)
+            f.truncate(offset)
+        self.header = header
+        self.bands = [_band(path,'<f4','r+',b['offset'],self.frames,b['channels']) for b in bands]
+        self.position = 0
+
+    def __repr__(self):
+        return f"container writer to {self.path}" + "\nchannels per band: \n" + str(self.channels)
+
+    def write_bands(self,block):
+        '''
+        append samples already split in bands
+
+        Parameters
+        ----------
+        block : (L, N_fine) float
+          the base channels followed by the detail channels of every band, as produced by the analysis operator
+        '''
+        L = block.shape[0]
+        if self.position + L > self.frames:
+            raise ValueError('writing past the end of the container')
+        start = 0
+        for band,c in zip(self.bands,self.channels):
+            band[self.position:self.position+L] = block[:,start:start+c]
+            start += c
+        self.position += L
+
+    def write(self,fine):
+        '''
+        append samples of a signal defined over the finest mesh
+
+        Parameters
+        ----------
+        fine : (N_fine, L) float
+        '''
+        self.write_bands((self.operator @ fine).T)
+
+    def close(self):
+        for band in self.bands:
+            if isinstance(band,np.memmap):
+                band.flush()
+        self.bands = []
+
+class ContainerReader():
+    def __init__(self,path):
+        '''
+        reads a level-progressive container. Only the bands needed for the requested level are ever touched.
+
+        path : str
+            container file
+        '''
+        self.path = path
+        with open(path,'rb') as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f'{path} is not a SWF container')
+            length, = struct.unpack('<I',f.read(4))
+            self.header = json.loads(f.read(length))
+        self.samplerate = self.header['samplerate']
+        self.frames = self.header['frames']
+        self.levels = len(self.header['bands']) - 1
+        self._bands = {}
+
+    def __repr__(self):
+        return f"container {self.path}" + "\nlevels: \n" + str(self.levels)
+
+    def band(self,j):
+        '''
+        memory map of band j, (frames, channels) float32. Band 0 is the base, band j+1 the details of level j+1
+        '''
+        if j not in self._bands:
+            b = self.header['bands'][j]
+            self._bands[j] = _band(self.path,self.header['dtype'],'r',b['offset'],self.frames,b['channels'])
+        return self._bands[j]
+
+    def read(self,level=0,start=0,frames=None,model=None):
+        '''
+        coarse channels at some truncation level, rebuilt from the base and the first level detail bands
+
+        Parameters
+        ----------
+        level : int
+          truncation level, 0 reads the base band only
+        start : int
+          first sample
+        frames : int (optional)
+          number of samples, up to the end if None
+        model : SWF
+          the format of the stream, needed for level > 0
+        Returns
+        ----------
+        coarse : (frames, vertices at level) float
+        '''
+        if frames is None:
+            frames = self.frames - start
+        coarse = np.asarray(self.band(0)[start:start+frames],dtype=float).T
+        if level > 0 and model is None:
+            raise ValueError('reading above the base level needs the model to synthesize the coarse channels')
+        for j in range(level):
+            if self.header['bands'][j+1]['channels'] != model.Qs[j].shape[1]:
+                raise ValueError('the model does not match the container')
+            details = np.asarray(self.band(j+1)[start:start+frames],dtype=float).T
+            coarse = model.Ps[j] @ coarse + model.Qs[j] @ details
+        return coarse.T
+
+def render_container(model,infile,outfile,trajectory,blocksize=65536,hop_size=256,channel=None):
+    """
+    Render a mono source moving along a trajectory into a level-progressive container, streaming the audio block by block.
+    The gains of every band are computed directly from the interpolation weights, as in render.Renderer.
+
+    Parameters
+    -----------
+    model : SWF
+      the format to encode to
+    infile : str
+      audio file read with SoundFile
+    outfile : str
+      container to write
+    trajectory : callable t -> (n,3) float
+      position of the source for times in seconds
+    blocksize : int
+      number of samples per block
+    hop_size : int
+      number of samples between two evaluations of the trajectory
+    channel : int (optional)
+      channel of infile to render, all channels are averaged if None
+    Returns
+    -----------
+    frames : int
+      number of samples written
+    """
+    import soundfile as sf
+    from .render import Renderer
+    with sf.SoundFile(infile) as src:
+        writer = ContainerWriter(outfile,model,src.samplerate,src.frames)
+        renderer = Renderer(model,trajectory,src.samplerate,hop_size=hop_size,encoder=writer.operator)
+        for block in src.blocks(blocksize=blocksize,always_2d=True):
+            mono = block.mean(axis=1) if channel is None else block[:,channel]
+            writer.write_bands(renderer.process(mono,writer.position))
+        writer.close()
+    return writer.position
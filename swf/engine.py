@@ -0,0 +1,245 @@
+import tracemalloc
+import numpy as np
+from .export import fused_encoder
+
+class Engine():
+    def __init__(self,model,sources,blocksize,truncation_level=0,steps=32,gap=0.25,tol=1e-9):
+        '''
+        real-time block processing of a fixed number of sources into the coarse mesh at some truncation level, without allocating
+        any array once warmed up: every buffer is allocated here and every operation of process writes into one of them.
+        The position of each source is read once per block and its gains are ramped linearly from the previous block.
+
+        Point location walks each source from face to face: the face of the previous block is kept while the source stays inside it,
+        otherwise the source moves to the face it is the least outside of among the faces sharing a vertex with the current one,
+        until it is inside a face or no neighbour is better. In the thin gaps between faces, where the projection of a point falls
+        in no face, the walk ends on the face the source is the least outside of, where SWF.locate would take the closest face.
+        A walk that ends further outside than gap calls SWF.locate, which allocates, and the number of calls is counted in
+        self.relocations. A source found outside of the mesh that way (e.g. below a dome-shaped layout) is then walked to the face
+        it is the least outside of without calling SWF.locate again, until it comes back within gap of a face: its gains are
+        extrapolated from another face than SWF.locate would take.
+
+        model : SWF
+            the format to render to
+        sources : int
+            number of sources, the columns of the input blocks
+        blocksize : int
+            number of samples per block
+        truncation_level : int
+            level at which to encode
+        steps : int
+            largest number of faces walked per source and per block
+        gap : float
+            how far outside the face found by a walk a source may be, in barycentric coordinates, before calling SWF.locate
+        tol : float
+            tolerance on the barycentric coordinates of a face containing a source
+        '''
+        self.model = model
+        self.sources = int(sources)
+        self.blocksize = int(blocksize)
+        self.truncation_level = truncation_level
+        self.steps = int(steps)
+        self.gap = gap
+        self.tol = tol
+        mesh = model.meshes[-1]
+        geometry = mesh.geometry()
+        F = mesh.faces.shape[0]
+        fused = fused_encoder(model,truncation_level)
+        self.channels = fused.shape[1]
+        S,C,L = self.sources,self.channels,self.blocksize
+
+        #per-face data, gathered with np.take into the buffers below
+        self.fused = np.ascontiguousarray(fused.reshape(F,3,C))
+        self.solvers = np.ascontiguousarray(geometry['solvers'])
+        self.origins = np.ascontiguousarray(geometry['triangles'][:,0])
+        self.normals = np.ascontiguousarray(geometry['normals'])
+        #faces sharing a vertex with each face, the face itself included and padding replaced by the face itself
+        ring = geometry['incident'][mesh.faces].reshape(F,-1)
+        self.ring = np.ascontiguousarray(np.where(ring < 0,np.arange(F).reshape(-1,1),ring))
+        R = self.ring.shape[1]
+
+        #state
+        self.positions = np.zeros((S,3)) #written by the control side, see set_position
+        self.face = np.full(S,-1)
+        self.outside = np.zeros(S,dtype=bool) #sources located outside of the mesh, further than gap from any face
+        self.previous = np.zeros((S,C)) #gains at the end of the previous block
+        self.gains = np.zeros((S,C)) #gains at the end of this block
+        self.relocations = 0
+        #one column per source: multiplying by a broadcast (L,1) column makes numpy allocate an iteration buffer
+        self.ramp = np.repeat(((np.arange(L) + 1)/L).reshape(-1,1),S,axis=1)
+
+        #per-block buffers over all sources
+        self._solver = np.empty((S,3,3))
+        self._point = np.empty((S,3))
+        self._coords = np.empty((S,3,1))
+        self._bary = np.empty((S,3))
+        self._weights = np.empty((S,1,3))
+        self._columns = np.empty((S,3,C))
+        self._inside = np.empty(S,dtype=bool)
+        self._test = np.empty(S,dtype=bool)
+        self._least = np.empty(S)
+        self._sum = np.empty((S,1))
+        #buffers of the neighbour search of one source
+        self._ring = np.empty(R,dtype=self.ring.dtype)
+        self._ring_solver = np.empty((R,3,3))
+        self._ring_point = np.empty((R,3))
+        self._ring_coords = np.empty((R,3,1))
+        self._ring_bary = np.empty((R,3))
+        self._ring_least = np.empty(R)
+        self._ring_facing = np.empty(R)
+        self._ring_ok = np.empty(R,dtype=bool)
+        #output buffers
+        self._scaled = np.empty((L,S))
+        self._delta = np.empty((S,C))
+        self._out = np.empty((L,C))
+
+    def __repr__(self):
+        return f"engine of {self.sources} sources" + "\nblocksize, channels: \n" + str((self.blocksize,self.channels))
+
+    def set_position(self,source,position):
+        '''
+        set the position of a source for the next block, copied into self.positions. Pass an array to avoid a conversion.
+        '''
+        np.copyto(self.positions[source],position)
+
+    def _barycentric(self,faces,points,solver,point,coords,bary):
+        #signed barycentric coordinates of points projected onto faces, see SWF.barycentric, written into bary
+        np.take(self.solvers,faces,axis=0,out=solver,mode='clip')
+        np.take(self.origins,faces,axis=0,out=point,mode='clip')
+        np.subtract(points,point,out=point)
+        np.matmul(solver,point.reshape(-1,3,1),out=coords)
+        np.copyto(bary[:,1:],coords[:,:2,0])
+        np.add(bary[:,1],bary[:,2],out=bary[:,0])
+        np.subtract(1,bary[:,0],out=bary[:,0])
+        return bary
+
+    def _follow(self,i):
+        #walk source i to a face containing it, or the face it is the least outside of, or locate it over the whole mesh
+        face = self.face[i]
+        ring = self._ring
+        least = self._ring_least
+        for _ in range(self.steps if face >= 0 else 0):
+            np.copyto(ring,self.ring[face])
+            bary = self._barycentric(ring,self.positions[i],self._ring_solver,self._ring_point,self._ring_coords,self._ring_bary)
+            np.min(bary,axis=1,out=least)
+            #only faces the source is in front of
+            np.take(self.normals,ring,axis=0,out=self._ring_point,mode='clip')
+            np.matmul(self._ring_point,self.positions[i],out=self._ring_facing)
+            np.greater(self._ring_facing,0,out=self._ring_ok)
+            if not self._ring_ok.any():
+                break
+            np.logical_not(self._ring_ok,out=self._ring_ok)
+            np.copyto(least,-np.inf,where=self._ring_ok)
+            best = least.argmax()
+            if least[best] >= -self.tol or (ring[best] == face and (least[best] >= -self.gap or self.outside[i])):
+                self.face[i] = ring[best]
+                self.outside[i] = least[best] < -self.gap
+                return
+            if ring[best] == face:
+                break
+            face = ring[best]
+        self.relocations += 1
+        self.face[i] = self.model.locate(self.positions[i])[0]
+        self.outside[i] = self.model.barycentric(self.positions[i].reshape(1,3),self.face[i:i+1]).min() < -self.gap
+
+    def control(self):
+        '''
+        update the face, weights and end-of-block gains of every source from self.positions
+        '''
+        for i in range(self.sources):
+            if self.face[i] < 0:
+                self._follow(i)
+        bary = self._barycentric(self.face,self.positions,self._solver,self._point,self._coords,self._bary)
+        np.min(bary,axis=1,out=self._least)
+        np.greater_equal(self._least,-self.tol,out=self._inside)
+        np.take(self.normals,self.face,axis=0,out=self._point,mode='clip')
+        np.multiply(self._point,self.positions,out=self._point)
+        np.sum(self._point,axis=1,out=self._least)
+        np.greater(self._least,0,out=self._test)
+        np.logical_and(self._inside,self._test,out=self._inside)
+        if not self._inside.all():
+            for i in range(self.sources):
+                if not self._inside[i]:
+                    self._follow(i)
+            bary = self._barycentric(self.face,self.positions,self._solver,self._point,self._coords,self._bary)
+        #weights, as in SWF.weights, then the columns of the fused encoder for the three vertices of each face
+        weights = self._weights.reshape(-1,3)
+        np.abs(bary,out=weights)
+        np.sum(weights,axis=1,keepdims=True,out=self._sum)
+        np.divide(weights,self._sum,out=weights)
+        np.take(self.fused,self.face,axis=0,out=self._columns,mode='clip')
+        np.matmul(self._weights,self._columns,out=self.gains.reshape(-1,1,self.channels))
+
+    def process(self,in_block,out_block):
+        '''
+        render one block, writing into the caller's buffer
+
+        Parameters
+        ----------
+        in_block : (blocksize, sources) float64
+          one column per source
+        out_block : (blocksize, n_coarse) float64
+          overwritten with the coarse mix
+        '''
+        if in_block.shape != (self.blocksize,self.sources) or out_block.shape != (self.blocksize,self.channels):
+            raise ValueError(f'expected blocks of shape {(self.blocksize,self.sources)} and {(self.blocksize,self.channels)}')
+        if in_block.dtype != np.float64 or out_block.dtype != np.float64:
+            raise ValueError('the engine processes float64 blocks')
+        self.control()
+        #out = x @ G0 + (ramp*x) @ (G1 - G0)
+        np.matmul(in_block,self.previous,out=out_block)
+        np.multiply(in_block,self.ramp,out=self._scaled)
+        np.subtract(self.gains,self.previous,out=self._delta)
+        np.matmul(self._scaled,self._delta,out=self._out)
+        np.add(out_block,self._out,out=out_block)
+        np.copyto(self.previous,self.gains)
+
+def allocations(engine,trajectories,signal,samplerate=48000,warmup=16):
+    """
+    Run an engine in a simulated audio callback loop and measure the memory allocated by each callback after the warm-up blocks,
+    traced with tracemalloc. The positions are evaluated before the loop, as a control thread would do outside of the callback.
+    Any array allocated by a callback shows up in its peak, at least the size of a block of one source; the Python objects
+    (views, scalars) and ufunc iteration state of a callback take a few kilobytes.
+
+    Parameters
+    -----------
+    engine : Engine
+    trajectories : list of callable t -> (n,3) float
+      one per source
+    signal : (frames, sources) float64
+      the input, processed block by block
+    samplerate : int
+      sample rate used to evaluate the trajectories
+    warmup : int
+      number of blocks processed before measuring. They are traced too: numpy keeps a cache of small buffers (shapes and
+      strides of views) that is refilled by the first traced callbacks of a process, which would otherwise be counted as retained
+    Returns
+    -----------
+    report : dict
+      blocks traced, largest peak of memory allocated during a callback, memory still held after the callbacks (bytes),
+      and the number of fallbacks to SWF.locate while tracing
+    """
+    L = engine.blocksize
+    blocks = signal.shape[0]//L
+    t = (np.arange(blocks) + 1)*L/samplerate
+    positions = np.stack([trajectory(t) for trajectory in trajectories],axis=1) #(blocks, sources, 3)
+    out = np.zeros((L,engine.channels))
+    peak = 0
+    retained = 0
+    relocations = 0
+    tracemalloc.start()
+    try:
+        for b in range(blocks):
+            np.copyto(engine.positions,positions[b])
+            block = signal[b*L:(b+1)*L]
+            if b == warmup:
+                relocations = engine.relocations
+            tracemalloc.reset_peak()
+            before,_ = tracemalloc.get_traced_memory()
+            engine.process(block,out)
+            after,top = tracemalloc.get_traced_memory()
+            if b >= warmup:
+                peak = max(peak,top - before)
+                retained += after - before
+    finally:
+        tracemalloc.stop()
+    return {'blocks':max(blocks - warmup,0),'peak_bytes':peak,'retained_bytes':retained,'relocations':engine.relocations - relocations}
@@ -0,0 +1,129 @@
+import struct
+import numpy as np
+
+# Binary encoder files start with a 32 byte little-endian header:
+#   magic 'SWFE' | version uint16 | layout uint16 | rows uint32 | cols uint32 | nnz uint32 | truncation level uint32 | faces uint32 | reserved uint32
+# followed by the data of the layout, always float32 values and uint32 indices:
+#   DENSE  rows*cols values, row by row
+#   SPARSE CSR: rows+1 row pointers, nnz column indices, nnz values
+#   FUSED  dense (faces*3, cols): row 3*f+i holds the coarse gains of the i-th vertex of face f of the finest mesh,
+#          so that the coarse gains of a source in face f with barycentric weights w are w @ fused[3*f:3*f+3]
+MAGIC = b'SWFE'
+VERSION = 1
+DENSE = 0
+SPARSE = 1
+FUSED = 2
+_header = struct.Struct('<4sHHIIIIII')
+
+def fused_encoder(model,truncation_level=0):
+    """
+    The encoder of a SWF fused with the faces of the finest mesh, so that rendering a source only needs its face and its three interpolation weights
+
+    Parameters
+    -----------
+    model : SWF
+      the format
+    truncation_level : int
+      level of the encoder
+    Returns
+    -----------
+    fused : (faces*3, n_coarse) float
+      row 3*f+i is the column of the encoder for the i-th vertex of face f
+    """
+    encoder = model.phi2s[truncation_level]
+    return np.asarray(encoder)[:,model.meshes[-1].faces.reshape(-1)].T
+
+def export_encoder(model,path,truncation_level=0,layout=DENSE,tol=0):
+    """
+    Write the encoder phi2s[truncation_level] of a SWF as a compact float32 binary file
+
+    Parameters
+    -----------
+    model : SWF
+      the format
+    path : str
+      file to write
+    truncation_level : int
+      level of the encoder
+    layout : int
+      DENSE, SPARSE (row-compressed, for encoders that are mostly zeros) or FUSED (see fused_encoder)
+    tol : float
+      for SPARSE, entries with an absolute value smaller or equal to tol are dropped
+    Returns
+    -----------
+    nbytes : int
+      size of the file written
+    """
+    if layout == FUSED:
+        matrix = fused_encoder(model,truncation_level)
+    else:
+        matrix = np.asarray(model.phi2s[truncation_level])
+    rows,cols = matrix.shape
+    faces = model.meshes[-1].faces.shape[0] if layout == FUSED else 0
+    if layout == SPARSE:
+        keep = np.abs(matrix) > tol
+        indptr = np.concatenate(([0],np.cumsum(keep.sum(axis=1)))).astype('<u4')
+        indices = np.nonzero(keep)[1].astype('<u4')
+        values = matrix[keep].astype('<f4')
+        blocks = [indptr,indices,values]
+        nnz = values.shape[0]
+    elif layout in (DENSE,FUSED):
+        blocks = [np.ascontiguousarray(matrix,dtype='<f4')]
+        nnz = rows*cols
+    else:
+        raise ValueError(f'unknown encoder layout {layout}')
+    with open(path,'wb') as f:
+        f.write(_header.pack(MAGIC,VERSION,layout,rows,cols,nnz,truncation_level,faces,0))
+        for block in blocks:
+            f.write(block.tobytes())
+    return _header.size + sum(block.nbytes for block in blocks)
+
+def read_header(path):
+    """
+    Read the header of a binary encoder file
+
+    Returns
+    -----------
+    header : dict
+      version, layout, rows, cols, nnz, truncation_level and faces
+    """
+    with open(path,'rb') as f:
+        magic,version,layout,rows,cols,nnz,level,faces,_ = _header.unpack(f.read(_header.size))
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a SWF encoder file')
+    if version > VERSION:
+        raise ValueError(f'{path} has version {version}, this reader supports up to {VERSION}')
+    return {'version':version,'layout':layout,'rows':rows,'cols':cols,'nnz':nnz,'truncation_level':level,'faces':faces}
+
+def load_encoder(path):
+    """
+    Load a binary encoder file without copying it, by memory mapping its data
+
+    Returns
+    -----------
+    encoder : (rows, cols) float32 memory map for DENSE and FUSED files,
+      (indptr, indices, values) memory maps for SPARSE files
+    header : dict
+      see read_header
+    """
+    header = read_header(path)
+    rows,cols,nnz = header['rows'],header['cols'],header['nnz']
+    offset = _header.size
+    if header['layout'] == SPARSE:
+        indptr = np.memmap(path,dtype='<u4',mode='r',offset=offset,shape=(rows+1,))
+        offset += 4*(rows+1)
+        indices = np.memmap(path,dtype='<u4',mode='r',offset=offset,shape=(nnz,))
+        offset += 4*nnz
+        values = np.memmap(path,dtype='<f4',mode='r',offset=offset,shape=(nnz,))
+        return (indptr,indices,values),header
+    return np.memmap(path,dtype='<f4',mode='r',offset=offset,shape=(rows,cols)),header
+
+def write_encoder_text(encoder,path):
+    """
+    Write an encoder as text in the format read by the coll object of the Max patch, one line 'index, values;' per row (1-based).
+    Kept for the Max patch, prefer the binary files for anything else.
+    """
+    encoder = np.asarray(encoder)
+    with open(path,'w') as f:
+        for i,row in enumerate(encoder,1):
+            f.write(f'{i}, ' + ' '.join('%.18e' % v for v in row) + ';\n')
@@ -0,0 +1,187 @@
+import numpy as np
+
+# Spatial-quality metrics of a SWF over arbitrary grids of directions. A source in direction u is panned through the
+# interpolation path (face of the finest mesh and its three weights) and encoded to the coarse gains g of a truncation level,
+# whose vertices are the loudspeaker directions v_i. For every direction:
+#   pressure   P = sum g_i
+#   energy     E = sum g_i**2
+#   velocity   rV = sum g_i v_i / P, split into a longitudinal part rV.u and a transverse part |rV x u|
+#   intensity  rE = sum g_i**2 v_i / E, split the same way
+# A perfect format has P = 1, a longitudinal part of 1 and a transverse part of 0. The directions are processed in chunks,
+# so the memory used does not grow with the size of the grid.
+MAPS = ('pressure','energy','velocity_l','velocity_t','intensity_l','intensity_t',
+        'pressure_error','energy_db','velocity_angle','intensity_angle','cost')
+
+def fibonacci_grid(n):
+    """
+    n directions spread almost uniformly over the unit sphere, along a golden-angle spiral
+
+    Returns
+    -----------
+    directions : (n, 3) float
+    """
+    i = np.arange(n) + 0.5
+    z = 1 - 2*i/n
+    r = np.sqrt(1 - z**2)
+    a = np.pi*(1 + np.sqrt(5))*i
+    return np.stack((r*np.cos(a),r*np.sin(a),z),axis=1)
+
+def layout(model,truncation_level=0):
+    """
+    The vertices of the mesh at a truncation level, i.e. the loudspeaker directions the encoder phi2s[truncation_level] feeds
+    """
+    if truncation_level == 0:
+        return model.base.vertices
+    return model.meshes[truncation_level-1].vertices
+
+def direction_gains(model,directions,truncation_level=0,encoder=None):
+    """
+    Coarse gains of sources in the given directions, through the interpolation path of SWF.interpolate followed by the encoder
+
+    Parameters
+    -----------
+    model : SWF
+    directions : (k, 3) float
+    truncation_level : int
+    encoder : (n_coarse, N_fine) float or sparse matrix (optional)
+      encoder to evaluate in place of phi2s[truncation_level], e.g. a pruned one from sparsify
+    Returns
+    -----------
+    gains : (n_coarse, k) float
+    """
+    if encoder is None:
+        encoder = model.phi2s[truncation_level]
+    encoder = encoder.toarray() if hasattr(encoder,'toarray') else np.asarray(encoder)
+    directions = directions.reshape((-1,3))
+    ind = model.locate(directions)
+    weights = model.weights(directions,ind)
+    faces = model.meshes[-1].faces[ind]
+    #only three columns of the encoder are needed for each direction
+    return np.einsum('cki,ki->ck',encoder[:,faces],weights)
+
+def measures(gains,vertices,directions,wl=1,wt=1):
+    """
+    Pressure, energy, velocity and intensity of coarse gains, with their error maps
+
+    Parameters
+    -----------
+    gains : (n, k) float
+      coarse gains of k sources
+    vertices : (n, 3) float
+      loudspeaker directions of the coarse layout
+    directions : (k, 3) float
+      direction of each source
+    wl : float
+      weight of the longitudinal velocity in the cost, as in utils.cost
+    wt : float
+      weight of the transverse velocity in the cost, as in utils.cost
+    Returns
+    -----------
+    maps : dict of str -> (k,) float
+      the entries of MAPS: pressure_error is P - 1, energy_db is E in dB, the angles are the angular errors in degrees of the
+      velocity and intensity vectors, and cost is wl*(V.u - 1)**2 + wt*|V x u|**2, the per-direction term of utils.cost, with the
+      velocity V = sum g_i v_i not divided by the pressure as in utils.velocity (the same when P = 1)
+    """
+    u = directions.reshape((-1,3))
+    pressure = gains.sum(axis=0)
+    energy = np.sum(gains**2,axis=0)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        velocity = (gains.T @ vertices)/pressure.reshape(-1,1)
+        intensity = ((gains**2).T @ vertices)/energy.reshape(-1,1)
+        energy_db = 10*np.log10(energy)
+    maps = {'pressure':pressure,'energy':energy,'energy_db':energy_db,'pressure_error':pressure - 1}
+    for name,vector in (('velocity',velocity),('intensity',intensity)):
+        longitudinal = np.sum(vector*u,axis=1)
+        transverse = np.linalg.norm(np.cross(vector,u),axis=1)
+        maps[name+'_l'] = longitudinal
+        maps[name+'_t'] = transverse
+        maps[name+'_angle'] = np.degrees(np.arctan2(transverse,longitudinal))
+    raw = gains.T @ vertices
+    maps['cost'] = wl*(np.sum(raw*u,axis=1) - 1)**2 + wt*np.linalg.norm(np.cross(raw,u),axis=1)**2
+    return maps
+
+def evaluate(model,directions=None,truncation_level=0,points=100000,chunk=8192,encoder=None,wl=1,wt=1):
+    """
+    Metric maps of a SWF over a grid of directions, computed chunk by chunk
+
+    Parameters
+    -----------
+    model : SWF
+    directions : (k, 3) float (optional)
+      the grid, a Fibonacci grid of the given number of points if None. Use model.meshes[-1].vertices to sample the finest vertices as utils.cost does
+    truncation_level : int
+      level of the encoder
+    points : int
+      size of the Fibonacci grid
+    chunk : int
+      number of directions processed at once
+    encoder : (n_coarse, N_fine) float or sparse matrix (optional)
+      see direction_gains
+    wl, wt : float
+      weights of the cost, see measures
+    Returns
+    -----------
+    maps : dict of str -> (k,) float32
+      see measures, plus 'directions'
+    """
+    if directions is None:
+        directions = fibonacci_grid(points)
+    directions = np.asarray(directions,dtype=float).reshape((-1,3))
+    vertices = layout(model,truncation_level)
+    if encoder is None:
+        encoder = model.phi2s[truncation_level]
+    encoder = encoder.toarray() if hasattr(encoder,'toarray') else np.asarray(encoder) #densified once, not per chunk
+    k = directions.shape[0]
+    maps = {name:np.empty(k,dtype=np.float32) for name in MAPS}
+    for start in range(0,k,chunk):
+        d = directions[start:start+chunk]
+        gains = direction_gains(model,d,truncation_level,encoder)
+        for name,values in measures(gains,vertices,d,wl,wt).items():
+            maps[name][start:start+chunk] = values
+    maps['directions'] = directions
+    return maps
+
+def summary(maps):
+    """
+    Summary statistics of metric maps: mean, standard deviation, min, max and the 5th and 95th percentiles of every map,
+    plus the root mean square of the error maps, over their finite values only (all NaN when there is none)
+
+    Returns
+    -----------
+    stats : dict of str -> dict of str -> float
+    """
+    stats = {}
+    for name in MAPS:
+        values = np.asarray(maps[name],dtype=float)
+        values = values[np.isfinite(values)]
+        if values.shape[0] == 0:
+            stats[name] = {key:np.nan for key in ('mean','std','min','max','p5','p95')}
+        else:
+            p5,p95 = np.percentile(values,[5,95])
+            stats[name] = {'mean':float(np.mean(values)),'std':float(np.std(values)),'min':float(np.min(values)),'max':float(np.max(values)),
+                           'p5':float(p5),'p95':float(p95)}
+        if name in ('pressure_error','velocity_t','intensity_t','velocity_angle','intensity_angle'):
+            stats[name]['rms'] = float(np.sqrt(np.mean(values**2))) if values.shape[0] else np.nan
+    return stats
+
+def compare(models,directions=None,points=100000,chunk=8192,wl=1,wt=1):
+    """
+    Summary statistics of several formats over the same grid of directions
+
+    Parameters
+    -----------
+    models : dict of str -> SWF or (SWF, truncation level) or (SWF, truncation level, encoder)
+    directions : (k, 3) float (optional)
+      the grid, a Fibonacci grid of the given number of points if None
+    Returns
+    -----------
+    stats : dict of str -> summary
+    """
+    if directions is None:
+        directions = fibonacci_grid(points)
+    stats = {}
+    for name,entry in models.items():
+        entry = entry if isinstance(entry,tuple) else (entry,)
+        model,level,encoder = entry + (0,None)[len(entry)-1:]
+        stats[name] = summary(evaluate(model,directions,level,chunk=chunk,encoder=encoder,wl=wl,wt=wt))
+    return stats
@@ -0,0 +1,209 @@
+import numpy as np
+from .render import Renderer
+
+# Bands are split as a Laplacian pyramid: d_K is the input at the full rate, d_k-1 is d_k lowpassed at the crossover
+# frequency and decimated, the lowest band is d_0 and band k > 0 is what d_k has that the upsampled d_k-1 lacks,
+#   b_k = delay(d_k) - delay(up(d_k-1))
+# Each band is rendered at its own rate and truncation level, then the rendered bands are rebuilt from the lowest:
+# the coarse channels of band k-1 are expanded to the layout of band k with the synthesis operators Ps (which keep the
+# total pressure) and upsampled with the same filter, and band k is added. The delays make every band line up, so that
+# for a static source at a single level the sum is exactly the full-band rendering, whatever the filters; the filters
+# only decide how well the bands are separated.
+
+def lowpass(samplerate,cutoff,attenuation=80):
+    """
+    Linear-phase FIR lowpass with its -6 dB point at cutoff, a transition band from cutoff/2 to 3*cutoff/2
+    and the given stopband attenuation (Kaiser window)
+
+    Returns
+    -----------
+    h : (taps,) float
+      an odd number of taps, so that the delay is (taps-1)/2 samples
+    """
+    from scipy.signal import firwin, kaiserord
+    taps,beta = kaiserord(attenuation,cutoff/(samplerate/2))
+    taps += 1 - taps % 2
+    return firwin(taps,cutoff,window=('kaiser',beta),fs=samplerate)
+
+class _Delay():
+    #streaming delay of a whole number of samples along the first axis
+    def __init__(self,samples):
+        self.samples = int(samples)
+        self.buffer = None
+
+    def __call__(self,x):
+        if self.buffer is None:
+            self.buffer = np.zeros((self.samples,) + x.shape[1:])
+        y = np.concatenate((self.buffer,x))
+        self.buffer = y[x.shape[0]:]
+        return y[:x.shape[0]]
+
+class _Resampler():
+    #streaming polyphase FIR filter decimating (down) or interpolating (up) by ratio along the first axis
+    def __init__(self,h,ratio,up):
+        self.h = h
+        self.ratio = int(ratio)
+        self.up = up
+        #input samples kept from the previous blocks, enough for the filter to see a full history
+        self.keep = -(-(h.shape[0]-1)//self.ratio) if up else -(-(h.shape[0]-1)//self.ratio)*self.ratio
+        self.buffer = None
+
+    def __call__(self,x):
+        from scipy.signal import upfirdn
+        if self.buffer is None:
+            self.buffer = np.zeros((self.keep,) + x.shape[1:])
+        y = np.concatenate((self.buffer,x))
+        self.buffer = y[y.shape[0]-self.keep:]
+        if self.up:
+            start = self.keep*self.ratio
+            return self.ratio*upfirdn(self.h,y,up=self.ratio,axis=0)[start:start + x.shape[0]*self.ratio]
+        start = self.keep//self.ratio
+        return upfirdn(self.h,y,down=self.ratio,axis=0)[start:start + x.shape[0]//self.ratio]
+
+class _Delayed():
+    '''
+    a trajectory delayed by some seconds, to follow the latency of a band
+    '''
+    def __init__(self,trajectory,delay):
+        self.trajectory = trajectory
+        self.delay = delay
+
+    def __call__(self,t):
+        return self.trajectory(np.asarray(t,dtype=float) - self.delay)
+
+class MultibandRenderer():
+    def __init__(self,model,trajectories,samplerate,crossovers=(700,),levels=(0,None),hop_size=256,attenuation=80,gate=None):
+        '''
+        renders sources moving along trajectories with a crossover filterbank: every band is rendered at its own
+        truncation level, sample rate and control rate, and the bands are recombined at the level of the highest one.
+        A band is decimated by the largest power of two that leaves its sample rate at 4 times its upper crossover or more,
+        and its gains are computed every hop_size samples of its own rate, so low bands are located and encoded much less often.
+
+        model : SWF
+            the format to render to
+        trajectories : list of callable t -> (n,3) float
+            one per source
+        samplerate : int
+            sample rate of the signals
+        crossovers : iterable of float
+            increasing crossover frequencies in Hz, one less than the number of bands
+        levels : iterable of int or None
+            non-decreasing truncation level of each band from the lowest, None for the finest level
+        hop_size : int or iterable of int
+            number of samples of each band between two evaluations of the trajectories, or one per band. The same number of
+            samples for every band makes the control rate of a band decimated with its sample rate.
+        attenuation : float
+            stopband attenuation of the crossover filters in dB
+        gate : float (optional)
+            in dB: a band of a source is not rendered for a block when its level is that far below the level of the source,
+            which saves the band for sources with little content there (or silent ones). Every band is rendered if None.
+        '''
+        self.model = model
+        self.samplerate = samplerate
+        self.crossovers = [float(f) for f in crossovers]
+        top = len(model.phi2s) - 1
+        self.levels = [top if level is None else level for level in levels]
+        K = len(self.crossovers)
+        if len(self.levels) != K + 1:
+            raise ValueError(f'{K} crossovers need {K+1} levels, got {len(self.levels)}')
+        if np.any(np.diff(self.crossovers) <= 0) or np.any(np.diff(self.levels) < 0):
+            raise ValueError('crossovers must increase and levels must not decrease')
+        self.hop_sizes = [int(h) for h in (hop_size if np.iterable(hop_size) else [hop_size]*len(self.levels))]
+        if len(self.hop_sizes) != len(self.levels):
+            raise ValueError(f'{len(self.levels)} bands need {len(self.levels)} hop sizes, got {len(self.hop_sizes)}')
+        self.gate = None if gate is None else 10**(gate/20)
+        #decimation of every band, the last one at the full rate
+        self.decimations = [max(1 << int(np.floor(np.log2(max(samplerate/(4*f),1)))),1) for f in self.crossovers] + [1]
+        #filter, delay in samples of the upper band, and spatial upsampling of every stage k from band k-1 to band k
+        self.filters = [None]
+        self.stage_delays = [0]
+        self.upsamplers = [None]
+        for k in range(1,K+1):
+            h = lowpass(samplerate/self.decimations[k],self.crossovers[k-1],attenuation)
+            self.filters.append(h)
+            self.stage_delays.append((h.shape[0]-1)//2)
+            U = np.identity(model.phi2s[self.levels[k-1]].shape[0])
+            for j in range(self.levels[k-1],self.levels[k]):
+                U = np.asarray(model.Ps[j]) @ U
+            self.upsamplers.append(U)
+        #delay of d_k behind the input (tau, full-rate samples) and of band k behind d_k (delta, samples of band k)
+        tau = [0]*(K+1)
+        for k in range(K,0,-1):
+            tau[k-1] = tau[k] + self.stage_delays[k]*self.decimations[k]
+        delta = [0]*(K+1)
+        for k in range(1,K+1):
+            delta[k] = 2*self.stage_delays[k] + self.ratio(k)*delta[k-1]
+        self.latency = delta[K] #of the output, in samples
+        self.sources = []
+        for trajectory in trajectories:
+            source = {'renderers':[],'down':[],'up':[],'delay':[],'delay_up':[]}
+            for k in range(K+1):
+                lag = (tau[k] + delta[k]*self.decimations[k])/samplerate
+                source['renderers'].append(Renderer(model,_Delayed(trajectory,lag),samplerate/self.decimations[k],self.levels[k],self.hop_sizes[k]))
+                if k > 0:
+                    source['down'].append(_Resampler(self.filters[k],self.ratio(k),False))
+                    source['up'].append(_Resampler(self.filters[k],self.ratio(k),True))
+                    source['delay'].append(_Delay(delta[k]))
+                    source['delay_up'].append(_Delay(self.ratio(k)*delta[k-1]))
+            self.sources.append(source)
+        self.synthesis = [None] + [_Resampler(self.filters[k],self.ratio(k),True) for k in range(1,K+1)]
+        self.channels = model.phi2s[self.levels[-1]].shape[0]
+        self.rendered = np.zeros(K+1,dtype=int) #blocks rendered per band, over all sources
+        self.gated = np.zeros(K+1,dtype=int) #blocks skipped per band, over all sources
+
+    def __repr__(self):
+        return f"multiband renderer of {len(self.sources)} sources" + "\ncrossovers, levels, decimations: \n" + str((self.crossovers,self.levels,self.decimations))
+
+    def ratio(self,k):
+        '''
+        decimation between band k-1 and band k
+        '''
+        return self.decimations[k-1]//self.decimations[k]
+
+    def split(self,source,block):
+        '''
+        the bands of one block of a source, from the lowest, each at its own rate
+        '''
+        K = len(self.crossovers)
+        d = [None]*(K+1)
+        d[K] = block
+        for k in range(K,0,-1):
+            d[k-1] = source['down'][k-1](d[k])
+        bands = [d[0]]
+        for k in range(1,K+1):
+            bands.append(source['delay'][k-1](d[k]) - source['delay_up'][k-1](source['up'][k-1](d[k-1])))
+        return bands
+
+    def process(self,blocks,offset):
+        '''
+        render one block of every source and sum them
+
+        Parameters
+        ----------
+        blocks : (L, sources) float
+          mono signal of every source, L a multiple of the largest decimation
+        offset : int
+          index of the first sample of the block in the whole signal, from 0 in steps of L
+        Returns
+        ----------
+        out : (L, n_coarse) float
+          the mix at the level of the highest band, self.latency samples late
+        '''
+        blocks = np.asarray(blocks,dtype=float).reshape(blocks.shape[0],-1)
+        L = blocks.shape[0]
+        if L % self.decimations[0] or offset % self.decimations[0]:
+            raise ValueError(f'blocks and offsets must be multiples of {self.decimations[0]} samples')
+        K = len(self.crossovers)
+        mixes = [np.zeros((L//D,self.model.phi2s[level].shape[0])) for D,level in zip(self.decimations,self.levels)]
+        for source,block in zip(self.sources,blocks.T):
+            level = np.sqrt(np.mean(block**2))
+            for k,band in enumerate(self.split(source,block)):
+                if self.gate is not None and np.sqrt(np.mean(band**2)) <= self.gate*level:
+                    self.gated[k] += 1
+                    continue
+                mixes[k] += source['renderers'][k].process(band,offset//self.decimations[k])
+                self.rendered[k] += 1
+        out = mixes[0]
+        for k in range(1,K+1):
+            out = mixes[k] + self.synthesis[k](out @ self.upsamplers[k].T)
+        return out
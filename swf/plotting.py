@@ -0,0 +1,301 @@
+import numpy as np 
+import matplotlib.pyplot as plt
+import plotly.graph_objects as go
+import plotly.offline as pyo
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from plotly.subplots import make_subplots
+from .utils import faces_to_edges
+
+def wireframe(mesh,max_edges=None):
+    """
+    Line segments of the edges of a mesh, in the format expected by go.Scatter3d: 
+    every unique edge once, each followed by a NaN to break the line
+    
+    Parameters
+    -----------
+    mesh : Trimesh
+      the mesh to draw
+    max_edges : int (optional)
+      if the mesh has more edges than this, only max_edges evenly spread edges are kept
+      
+    Returns
+    -----------
+    (Xe,Ye,Ze) : 3-tuple of (3*edges,) float32
+    
+    """
+    edges = np.unique(np.sort(faces_to_edges(mesh.faces),axis=1),axis=0)
+    if max_edges is not None and edges.shape[0] > max_edges:
+        edges = edges[np.linspace(0,edges.shape[0]-1,int(max_edges)).astype(int)]
+    segments = np.full((edges.shape[0],3,3),np.nan,dtype=np.float32)
+    segments[:,0] = mesh.vertices[edges[:,0]]
+    segments[:,1] = mesh.vertices[edges[:,1]]
+    segments = segments.reshape(-1,3)
+    return segments[:,0],segments[:,1],segments[:,2]
+
+def PlotMesh(mesh,name='',lod=None,max_edges=50000,show=True):  
+    """
+    plot the wireframe of a mesh, and the mesh with its faces colored
+    
+    Parameters
+    -----------
+    mesh : Trimesh
+      the mesh to plot
+    lod : Trimesh (optional)
+      a coarser mesh of the same format (e.g. SWF.meshes[1]) drawn instead in both the wireframe and the colored faces, to keep
+      plots of deep meshes light
+    max_edges : int (optional)
+      at most this many edges are drawn in the wireframe, the colored faces are not thinned
+    show : bool
+      whether to open the figure, set to False in batch jobs and save it with fig.write_html or SaveMesh instead
+      
+    Returns
+    -----------
+    plotly fig
+    
+    """
+    if lod is not None:
+        mesh = lod
+    x = mesh.vertices[:,0].astype(np.float32)
+    y = mesh.vertices[:,1].astype(np.float32)
+    z = mesh.vertices[:,2].astype(np.float32)
+    i = mesh.faces[:,0]
+    j = mesh.faces[:,1]
+    k = mesh.faces[:,2]
+
+    faces = mesh.faces
+
+    fig = make_subplots(
+              rows=1, cols=2, 
+              subplot_titles=(f'{name} Level {mesh.level} 3D Mesh', f'{name} Level {mesh.level} 3D Mesh with faces colored'),
+              horizontal_spacing=0.02,
+              specs=[[{"type": "scene"}]*2])  
+
+    #plot surface triangulation
+    Xe, Ye, Ze = wireframe(mesh, max_edges)
+
+    fig.add_trace(go.Scatter3d(x=Xe,
+                         y=Ye,
+                         z=Ze,
+                         mode='lines',
+                         name='',
+                         line=dict(color= 'rgb(40,40,40)', width=0.5)), 1, 1);
+
+    lighting = dict(ambient=0.5,
+                    diffuse=1,
+                    fresnel=4,        
+                    specular=0.5,
+                    roughness=0.05,
+                    facenormalsepsilon=0)
+    lightposition=dict(x=100,
+                       y=100,
+                       z=10000)
+
+    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, 
+                            i=i, j=j, k=k, colorscale='matter_r' ,
+                            colorbar_len=0.85,
+                            colorbar_x=0.97,
+                            colorbar_thickness=20,
+                            intensity=np.random.rand(len(faces)),  
+                            intensitymode='cell',
+                            flatshading=True), 1, 2)
+    fig.data[1].update(lighting=lighting,
+                       lightposition=lightposition)                         
+
+
+    fig.update_layout(width=1000, height=600, font_size=10)
+    fig.update_scenes(camera_eye_x=1.45, camera_eye_y=1.45, camera_eye_z=1.45);
+    fig.update_scenes(xaxis_visible=False, yaxis_visible=False,zaxis_visible=False )
+
+    if show:
+        fig.show()
+    return fig
+    
+def weights3D(mesh, weights, name='', show=True):  
+    """
+    plot weights over the vertices of a mesh
+    
+    Parameters
+    -----------
+    mesh : Trimesh
+      the mesh over which to plot
+    weights : np.arr
+      array of weights, same length as vertices in the mesh 
+    show : bool
+      whether to open the figure, set to False in batch jobs and save it with fig.write_html or SaveMesh instead
+      
+    Returns
+    -----------
+    plotly fig
+    
+    """
+    x = mesh.vertices[:,0].astype(np.float32)
+    y = mesh.vertices[:,1].astype(np.float32)
+    z = mesh.vertices[:,2].astype(np.float32)
+    i = mesh.faces[:,0]
+    j = mesh.faces[:,1]
+    k = mesh.faces[:,2]
+
+    fig = make_subplots(
+              rows=1, cols=1, 
+              subplot_titles=[f'{name}'],
+              horizontal_spacing=0.02,
+              specs=[[{"type": "scene"}]*1])  
+
+    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, 
+                            i=i, j=j, k=k, colorscale='matter_r' ,
+                            colorbar_len=0.85,
+                            colorbar_x=0.97,
+                            colorbar_thickness=20,
+                            intensity=weights,
+                            text=weights,
+                            intensitymode='vertex',
+                            flatshading=True), 1, 1)
+    lighting = dict(ambient=0.5,
+                    diffuse=1,
+                    fresnel=4,        
+                    specular=0.5,
+                    roughness=0.05,
+                    facenormalsepsilon=0)
+    lightposition=dict(x=100,
+                       y=100,
+                       z=10000)
+    
+    fig.data[0].update(lighting=lighting,
+                       lightposition=lightposition)                         
+
+
+    fig.update_layout(width=1000, height=600, font_size=10)
+    fig.update_scenes(camera_eye_x=1.45, camera_eye_y=1.45, camera_eye_z=1.45);
+    fig.update_scenes(xaxis_visible=False, yaxis_visible=False,zaxis_visible=False )
+
+    if show:
+        fig.show()
+    return fig
+    
+def PlotFilters(meshset,idx=0):
+    """
+    plot first row/column of A,B,P,Q filters for every mesh in meshset
+    
+    Parameters
+    -----------
+    meshset : iterable of Trimesh
+      the meshes from which to plot
+      
+    Returns
+    -----------
+    matplotlib fig
+    
+    """
+    fig, axs = plt.subplots(2,2,figsize=(12,12))
+    for mesh in (meshset):
+        plane = np.isclose(mesh.vertices[:,2],np.zeros(mesh.vertices[:,2].shape))
+        P,Q,A,B = mesh.filters
+        azimuth = np.arctan2(mesh.vertices[:,1],mesh.vertices[:,0])[plane].flatten()
+        sorts = np.argsort(azimuth)
+        axs[0,0].plot(azimuth[sorts],A[idx,:][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+
+        axs[0,1].plot(azimuth[sorts],B[idx,:][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+
+        axs[1,0].plot(azimuth[sorts],P[:,idx][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+
+        axs[1,1].plot(azimuth[sorts],Q[:,idx][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+
+    axs[0,0].set_title('First Row of A')
+    axs[0,1].set_title('First Row of B')
+    axs[1,0].set_title('First Column of P')
+    axs[1,1].set_title('First Column of Q')
+    axs[0,0].legend()
+    axs[0,1].legend()
+    axs[1,0].legend()
+    axs[1,1].legend()
+    fig.tight_layout()
+
+def PlotWavelets(SWF,idx=0):
+    """
+    plot wavelets and scaling functions for a given base vertex within a given SWF
+    
+    Parameters
+    -----------
+    SWF : SWF object
+      the format of interest
+    idx : int
+      the index of the vertex to graph
+      
+    Returns
+    -----------
+    matplotlib fig
+    
+    """
+    fig, axs = plt.subplots(2,2,figsize=(10,10))
+    for i in range(0,SWF.n):
+        mesh = SWF.meshes[-1]
+        plane = np.isclose(mesh.vertices[:,2],np.zeros(mesh.vertices[:,2].shape))
+        phi,psi,dualphi,dualpsi = (SWF.phis[i],SWF.psis[i],SWF.phi2s[i],SWF.psi2s[i]) 
+        azimuth = np.arctan2(mesh.vertices[:,1],mesh.vertices[:,0])[plane].flatten()
+        sorts = np.argsort(azimuth)
+        axs[0,0].plot(azimuth[sorts],dualphi[idx,:][plane].flatten()[sorts],'-',label=f'$\overline{{\phi^{i+1}_{idx}}}$')
+
+        axs[0,1].plot(azimuth[sorts],dualpsi[idx,:][plane].flatten()[sorts],'-',label=f'$\overline{{\psi^{i+1}_{idx}}}$')
+
+        axs[1,0].plot(azimuth[sorts],phi[:,idx][plane].flatten()[sorts],'-',label=f'$\phi^{i+1}_{idx}$')
+
+        axs[1,1].plot(azimuth[sorts],psi[:,idx][plane].flatten()[sorts],'-',label=f'$\psi^{i+1}_{idx}$')
+
+    axs[0,0].set_title('horizontal section of dual scaling function, first row')
+    axs[0,1].set_title('horizontal section of dual wavelet, first row')
+    axs[1,0].set_title('horizontal section of scaling function, first column')
+    axs[1,1].set_title('horizontal section of wavelet, first column')
+    axs[0,0].legend()
+    axs[0,1].legend()
+    axs[1,0].legend()
+    axs[1,1].legend()
+    fig.tight_layout()
+
+def SaveMesh(mesh, path, weights=None, name='', elev=30, azim=45, dpi=150):
+    """
+    render a mesh, optionally colored by weights over its vertices, to an image file with matplotlib's Agg backend.
+    No browser or display is needed, which makes it suitable for inspecting deep formats in batch jobs.
+    
+    Parameters
+    -----------
+    mesh : Trimesh
+      the mesh to draw
+    path : str
+      image file to write, the format follows the extension (png, pdf, svg...)
+    weights : np.arr (optional)
+      array of weights, same length as vertices in the mesh, each face is colored by the mean of its vertices
+    name : str
+      title of the image
+    elev, azim : float
+      camera elevation and azimuth in degrees
+    dpi : int
+      resolution of the image
+      
+    Returns
+    -----------
+    matplotlib fig
+    
+    """
+    fig = Figure(figsize=(6,6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(projection='3d')
+    polygons = Poly3DCollection(mesh.vertices[mesh.faces], linewidths=0.2, edgecolors='k')
+    if weights is not None:
+        values = np.asarray(weights).reshape(-1)[mesh.faces].mean(axis=1)
+        polygons.set_array(values)
+        polygons.set_cmap('magma')
+        fig.colorbar(polygons, ax=ax, shrink=0.6)
+    else:
+        polygons.set_facecolor((0.8,0.8,0.8,1))
+    ax.add_collection3d(polygons)
+    ax.set_xlim(-1,1)
+    ax.set_ylim(-1,1)
+    ax.set_zlim(-1,1)
+    ax.set_box_aspect((1,1,1))
+    ax.view_init(elev=elev, azim=azim)
+    ax.set_axis_off()
+    ax.set_title(f'{name} Level {mesh.level}')
+    fig.savefig(path, dpi=dpi)
+    return fig
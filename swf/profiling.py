@@ -0,0 +1,176 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+#profiling is off unless enabled with enable() or by setting the environment variable SWF_PROFILE=1
+_state = {'enabled': os.environ.get('SWF_PROFILE', '') not in ('', '0'), 'origin': time.perf_counter()}
+_events = [] #(name, start, duration, thread id) for every finished span
+_counters = {}
+_lock = threading.Lock()
+_null = nullcontext()
+
+class _Span():
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        with _lock:
+            _events.append((self.name, self.start, duration, threading.get_ident()))
+        return False
+
+def enable():
+    """
+    Start recording spans and counters
+    """
+    _state['enabled'] = True
+
+def disable():
+    """
+    Stop recording spans and counters, what was recorded so far is kept
+    """
+    _state['enabled'] = False
+
+def enabled():
+    """
+    Returns
+    -----------
+    bool
+      whether spans and counters are being recorded
+    """
+    return _state['enabled']
+
+def reset():
+    """
+    Forget every recorded span and counter
+    """
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _state['origin'] = time.perf_counter()
+
+def span(name):
+    """
+    Time a block of code under some name. When profiling is disabled, this returns a shared no-op context manager.
+
+    Parameters
+    -----------
+    name : str
+      name of the span, use / to group related spans, e.g. 'subdivide/adjacency'
+    Returns
+    -----------
+    context manager
+    """
+    if not _state['enabled']:
+        return _null
+    return _Span(name)
+
+def count(name, n=1):
+    """
+    Add n to the counter name, when profiling is enabled
+
+    Parameters
+    -----------
+    name : str
+      name of the counter
+    n : int or float
+      increment
+    """
+    if _state['enabled']:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as a span name
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def stats():
+    """
+    Aggregate the recorded spans by name
+
+    Returns
+    -----------
+    stats : dict of str -> dict
+      calls, total, mean and max duration in seconds for each span name
+    """
+    with _lock:
+        events = list(_events)
+    result = {}
+    for name, start, duration, tid in events:
+        s = result.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0})
+        s['calls'] += 1
+        s['total'] += duration
+        s['max'] = max(s['max'], duration)
+    for s in result.values():
+        s['mean'] = s['total']/s['calls']
+    return result
+
+def counters():
+    """
+    Returns
+    -----------
+    counters : dict of str -> number
+      a copy of the recorded counters
+    """
+    with _lock:
+        return dict(_counters)
+
+def summary():
+    """
+    Format the recorded spans and counters as a table, spans sorted by total time
+
+    Returns
+    -----------
+    str
+    """
+    lines = [f'{"span":<40} {"calls":>8} {"total (s)":>12} {"mean (ms)":>12} {"max (ms)":>12}']
+    for name, s in sorted(stats().items(), key=lambda item: -item[1]['total']):
+        lines.append(f'{name:<40} {s["calls"]:>8} {s["total"]:>12.4f} {1e3*s["mean"]:>12.4f} {1e3*s["max"]:>12.4f}')
+    c = counters()
+    if c:
+        lines.append('')
+        lines.append(f'{"counter":<40} {"value":>8}')
+        for name in sorted(c):
+            lines.append(f'{name:<40} {c[name]:>8}')
+    return '\n'.join(lines)
+
+def chrome_trace(path):
+    """
+    Write the recorded spans as a Chrome trace (chrome://tracing, Perfetto), and the counters as the arguments of a final counter event
+
+    Parameters
+    -----------
+    path : str
+      JSON file to write
+    """
+    with _lock:
+        events = list(_events)
+        c = dict(_counters)
+    pid = os.getpid()
+    origin = _state['origin']
+    trace = [{'name': name, 'ph': 'X', 'ts': 1e6*(start - origin), 'dur': 1e6*duration, 'pid': pid, 'tid': tid}
+             for name, start, duration, tid in events]
+    if c:
+        end = max([e['ts'] + e['dur'] for e in trace], default=0)
+        trace.append({'name': 'counters', 'ph': 'C', 'ts': end, 'pid': pid, 'args': c})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
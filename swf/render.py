@@ -0,0 +1,359 @@
+import numpy as np
+import soundfile as sf
+from multiprocessing import Pool, shared_memory
+from .swf import SWF
+from .trimesh import Trimesh
+
+class Trajectory():
+    def __init__(self,times,positions):
+        '''
+        a source path sampled at arbitrary times, linearly interpolated in between
+
+        times : (k,) float
+            increasing times in seconds
+        positions : (k,3) float
+            cartesian coordinates of the source at each time
+        '''
+        self.times = np.asarray(times,dtype=float).reshape(-1)
+        self.positions = np.asarray(positions,dtype=float).reshape(-1,3)
+        if self.times.shape[0] != self.positions.shape[0]:
+            raise ValueError('a trajectory needs one position per time')
+        if np.any(np.diff(self.times) < 0):
+            raise ValueError('trajectory times must be increasing')
+
+    def __repr__(self):
+        return f"trajectory of {self.times.shape[0]} points" + "\nduration: \n" + str(self.times[-1]-self.times[0])
+
+    def __call__(self,t):
+        '''
+        position of the source at the times t, held constant outside of the sampled range
+
+        Parameters
+        ----------
+        t : (n,) float
+          times in seconds
+        Returns
+        ----------
+        loc : (n,3) float
+          unit vectors pointing to the source
+        '''
+        t = np.asarray(t,dtype=float).reshape(-1)
+        loc = np.column_stack([np.interp(t,self.times,self.positions[:,i]) for i in range(3)])
+        return loc/np.linalg.norm(loc,axis=1).reshape(-1,1)
+
+def load_trajectory(path):
+    """
+    Read a trajectory from a file
+
+    Parameters
+    -----------
+    path : str
+      either a .npz file holding the arrays 'times' (k,) and 'positions' (k,3),
+      or a text file (.csv) with one line t,x,y,z per point. A header line is allowed.
+    Returns
+    -----------
+    Trajectory
+    """
+    if str(path).endswith('.npz'):
+        data = np.load(path)
+        return Trajectory(data['times'],data['positions'])
+    data = np.genfromtxt(path,delimiter=',',comments='#')
+    data = data[~np.any(np.isnan(data),axis=1)] #drop the header if there is one
+    return Trajectory(data[:,0],data[:,1:4])
+
+class Orbit():
+    def __init__(self,period,elevation=0,start=0):
+        '''
+        analytic trajectory turning around the vertical axis at a constant elevation
+
+        period : float
+            time in seconds for one full turn, negative turns clockwise
+        elevation : float
+            elevation in radians above the horizontal plane
+        start : float
+            azimuth in radians at t = 0
+        '''
+        self.period = period
+        self.elevation = elevation
+        self.start = start
+
+    def __repr__(self):
+        return f"orbit of period {self.period}" + "\nelevation: \n" + str(self.elevation)
+
+    def __call__(self,t):
+        '''
+        position of the source at the times t
+
+        Parameters
+        ----------
+        t : (n,) float
+          times in seconds
+        Returns
+        ----------
+        loc : (n,3) float
+          unit vectors pointing to the source
+        '''
+        azimuth = self.start + 2*np.pi*np.asarray(t,dtype=float).reshape(-1)/self.period
+        return np.column_stack((np.cos(self.elevation)*np.cos(azimuth),np.cos(self.elevation)*np.sin(azimuth),np.full(azimuth.shape,np.sin(self.elevation))))
+
+class Renderer():
+    def __init__(self,model,trajectory,samplerate,truncation_level=0,hop_size=256,encoder=None):
+        '''
+        renders a mono signal moving along a trajectory directly to the coarse mesh at some truncation level,
+        without ever forming the (N_fine, n_samples) interpolation matrix.
+        The gains are computed every hop_size samples and linearly interpolated in between.
+
+        model : SWF
+            the format to render to
+        trajectory : callable t -> (n,3) float
+            position of the source for times in seconds, for example a Trajectory or an Orbit
+        samplerate : int
+            sample rate of the signal
+        truncation_level : int
+            level at which to encode
+        hop_size : int
+            number of samples between two evaluations of the trajectory
+        encoder : (channels, N_fine) float (optional)
+            operator applied to the interpolation instead of phi2s[truncation_level], e.g. the analysis operator of container.py
+        '''
+        self.model = model
+        self.trajectory = trajectory
+        self.samplerate = samplerate
+        self.truncation_level = truncation_level
+        self.hop_size = int(hop_size)
+        self.encoder = self.model.phi2s[truncation_level] if encoder is None else encoder
+        self.face = None #locator cache, face of the last evaluated position
+
+    def __repr__(self):
+        return f"renderer to {self.encoder.shape[0]} channels" + "\nhop size: \n" + str(self.hop_size)
+
+    def gains(self,hops):
+        '''
+        coarse gains at the given hop indices
+
+        Parameters
+        ----------
+        hops : (k,) int
+          hop indices, the hop h is at sample h*hop_size
+        Returns
+        ----------
+        gains : (n_coarse, k) float
+        '''
+        loc = self.trajectory(hops*self.hop_size/self.samplerate).reshape(-1,3)
+        ind = np.full(loc.shape[0],-1 if self.face is None else self.face)
+        found = ind >= 0
+        if np.any(found):
+            found[found] = self.model.contains(loc[found],ind[found])
+        if not np.all(found):
+            ind[~found] = self.model.locate(loc[~found])
+        self.face = ind[-1]
+        weights = self.model.weights(loc,ind)
+        faces = self.model.meshes[-1].faces[ind]
+        #only three columns of the encoder are needed for each position
+        return np.einsum('cki,ki->ck',self.encoder[:,faces],weights)
+
+    def process(self,block,offset):
+        '''
+        render one block of the signal
+
+        Parameters
+        ----------
+        block : (L,) float
+          mono signal
+        offset : int
+          index of the first sample of the block in the whole signal
+        Returns
+        ----------
+        out : (L, n_coarse) float
+        '''
+        block = np.asarray(block).reshape(-1)
+        frames = offset + np.arange(block.shape[0])
+        first = frames[0]//self.hop_size
+        hops = np.arange(first,frames[-1]//self.hop_size + 2)
+        G = self.gains(hops)
+        pos = (frames - first*self.hop_size)/self.hop_size
+        i0 = pos.astype(int)
+        frac = pos - i0
+        g = G[:,i0]*(1-frac) + G[:,i0+1]*frac
+        return (g*block).T
+
+def render_file(model,infile,outfile,trajectory,truncation_level=0,blocksize=65536,hop_size=256,channel=None,subtype=None):
+    """
+    Stream an audio file through a Renderer and write the coarse multichannel result, block by block.
+    Memory use only depends on blocksize, not on the length of the file.
+
+    Parameters
+    -----------
+    model : SWF
+      the format to render to
+    infile : str
+      audio file read with SoundFile
+    outfile : str
+      audio file to write, one channel per vertex of the mesh at the truncation level
+    trajectory : callable t -> (n,3) float
+      position of the source for times in seconds
+    truncation_level : int
+      level at which to encode
+    blocksize : int
+      number of samples per block
+    hop_size : int
+      number of samples between two evaluations of the trajectory
+    channel : int (optional)
+      channel of infile to render, all channels are averaged if None
+    subtype : str (optional)
+      SoundFile subtype of the output, the same as the input if None
+    Returns
+    -----------
+    frames : int
+      number of samples written
+    """
+    frames = 0
+    with sf.SoundFile(infile) as src:
+        renderer = Renderer(model,trajectory,src.samplerate,truncation_level,hop_size)
+        channels = renderer.encoder.shape[0]
+        with sf.SoundFile(outfile,'w',src.samplerate,channels,subtype if subtype is not None else src.subtype) as dst:
+            for block in src.blocks(blocksize=blocksize,always_2d=True):
+                mono = block.mean(axis=1) if channel is None else block[:,channel]
+                dst.write(renderer.process(mono,frames))
+                frames += block.shape[0]
+    return frames
+
+class SharedModel():
+    def __init__(self,model,truncation_level=0):
+        '''
+        the parts of a SWF needed for rendering (finest mesh and one encoder), stored in shared memory 
+        so that worker processes can attach to them instead of receiving a pickled copy of the whole model.
+
+        model : SWF
+            the format to render to
+        truncation_level : int
+            level of the encoder to share
+        '''
+        self.truncation_level = truncation_level
+        self.blocks = []
+        self.spec = {}
+        for name,arr in (('vertices',model.meshes[-1].vertices),('faces',model.meshes[-1].faces),('encoder',model.phi2s[truncation_level])):
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True,size=max(arr.nbytes,1))
+            np.ndarray(arr.shape,dtype=arr.dtype,buffer=shm.buf)[...] = arr
+            self.blocks.append(shm)
+            self.spec[name] = (shm.name,arr.shape,arr.dtype.str)
+
+    def __repr__(self):
+        return f"shared model" + "\nblocks: \n" + str(list(self.spec))
+
+    def close(self):
+        '''
+        release the shared memory, every worker must be done with it
+        '''
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+class _SharedView():
+    '''
+    read-only SWF look-alike built in a worker process from the blocks of a SharedModel. 
+    It borrows the point location and interpolation methods of SWF, which only need the finest mesh.
+    '''
+    locate = SWF.locate
+    contains = SWF.contains
+    weights = SWF.weights
+    barycentric = SWF.barycentric
+
+    def __init__(self,spec,truncation_level):
+        self.blocks = []
+        arrays = {}
+        for name,(shm_name,shape,dtype) in spec.items():
+            shm = shared_memory.SharedMemory(name=shm_name)
+            self.blocks.append(shm)
+            arrays[name] = np.ndarray(shape,dtype=np.dtype(dtype),buffer=shm.buf)
+        self.meshes = [Trimesh(arrays['vertices'],arrays['faces'],filters=(),level=1)]
+        self.phi2s = {truncation_level: arrays['encoder']}
+
+_worker = {}
+
+def _init_worker(spec,truncation_level,sources,samplerate,blocksize,hop_size,channels):
+    _worker['model'] = _SharedView(spec,truncation_level)
+    _worker['args'] = (sources,samplerate,truncation_level,blocksize,hop_size,channels)
+
+def _render_chunk(chunk):
+    start,frames = chunk
+    sources,samplerate,truncation_level,blocksize,hop_size,channels = _worker['args']
+    return _mix_chunk(_worker['model'],sources,samplerate,truncation_level,blocksize,hop_size,channels,start,frames)
+
+def _mix_chunk(model,sources,samplerate,truncation_level,blocksize,hop_size,channels,start,frames):
+    """
+    Render the samples [start, start+frames) of every source and sum them, always in the order of sources 
+    so that the result does not depend on which process rendered the chunk.
+    """
+    out = np.zeros((frames,channels))
+    for infile,trajectory in sources:
+        renderer = Renderer(model,trajectory,samplerate,truncation_level,hop_size)
+        with sf.SoundFile(infile) as src:
+            if start >= src.frames:
+                continue
+            src.seek(start)
+            done = 0
+            while done < frames:
+                block = src.read(min(blocksize,frames-done),always_2d=True)
+                if block.shape[0] == 0:
+                    break
+                out[done:done+block.shape[0]] += renderer.process(block.mean(axis=1),start+done)
+                done += block.shape[0]
+    return out
+
+def render_scene(model,sources,outfile,truncation_level=0,blocksize=65536,hop_size=256,chunk_size=None,processes=None,subtype='FLOAT'):
+    """
+    Render several sources moving along their trajectories and write the coarse mix, splitting the work across a process pool by time chunks.
+    The finest mesh and the encoder are placed in shared memory once, and the chunks are written in order as they come back, 
+    so the result is identical for any number of processes.
+
+    Parameters
+    -----------
+    model : SWF
+      the format to render to
+    sources : iterable of (str, callable)
+      audio file and trajectory of each source, the trajectories must be picklable (Trajectory, Orbit)
+    outfile : str
+      audio file to write, one channel per vertex of the mesh at the truncation level
+    truncation_level : int
+      level at which to encode
+    blocksize : int
+      number of samples read at once in a worker
+    hop_size : int
+      number of samples between two evaluations of the trajectories
+    chunk_size : int (optional)
+      number of samples rendered by one task, 8 blocks if None
+    processes : int (optional)
+      number of worker processes, os.cpu_count() if None. With 1, everything runs in this process.
+    subtype : str
+      SoundFile subtype of the output
+    Returns
+    -----------
+    frames : int
+      number of samples written
+    """
+    sources = list(sources)
+    infos = [sf.info(infile) for infile,_ in sources]
+    samplerate = infos[0].samplerate
+    if any(info.samplerate != samplerate for info in infos):
+        raise ValueError('all the sources of a scene must have the same sample rate')
+    total = max(info.frames for info in infos)
+    channels = model.phi2s[truncation_level].shape[0]
+    chunk_size = int(chunk_size) if chunk_size is not None else 8*blocksize
+    chunks = [(start,min(chunk_size,total-start)) for start in range(0,total,chunk_size)]
+
+    with sf.SoundFile(outfile,'w',samplerate,channels,subtype) as dst:
+        if processes == 1:
+            for start,frames in chunks:
+                dst.write(_mix_chunk(model,sources,samplerate,truncation_level,blocksize,hop_size,channels,start,frames))
+            return total
+        shared = SharedModel(model,truncation_level)
+        try:
+            with Pool(processes,initializer=_init_worker,initargs=(shared.spec,truncation_level,sources,samplerate,blocksize,hop_size,channels)) as pool:
+                for out in pool.imap(_render_chunk,chunks):
+                    dst.write(out)
+        finally:
+            shared.close()
+    return total
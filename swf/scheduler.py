@@ -0,0 +1,261 @@
+import time
+import numpy as np
+from .swf import SWF
+from .render import Renderer, Orbit
+
+class _LevelView():
+    '''
+    SWF look-alike whose finest mesh is an intermediate level of a model, for point location on a coarser mesh.
+    It borrows the point location and interpolation methods of SWF, which only need the finest mesh.
+    '''
+    locate = SWF.locate
+    contains = SWF.contains
+    weights = SWF.weights
+    barycentric = SWF.barycentric
+
+    def __init__(self,mesh):
+        self.meshes = [mesh]
+
+def level_mesh(model,level):
+    """
+    The mesh of a SWF at some level, 0 being the base and model.n the finest mesh
+    """
+    return model.base if level == 0 else model.meshes[level-1]
+
+def level_encoders(model,truncation_level=0):
+    """
+    Encoders from the vertices of every level down to the truncation level, A_t @ ... @ A_L-1 for the mesh of level L,
+    so that a source interpolated over a coarser mesh is encoded like a fine one. The finest one is phi2s[truncation_level].
+
+    Returns
+    -----------
+    encoders : dict of int -> (n_coarse, vertices at level) float
+      for every level from truncation_level to model.n
+    """
+    encoders = {truncation_level:np.identity(level_mesh(model,truncation_level).vertices.shape[0])}
+    for level in range(truncation_level+1,model.n+1):
+        encoders[level] = np.asarray(encoders[level-1] @ model.As[level-1])
+    return encoders
+
+class ScheduledSource():
+    def __init__(self,source_id,trajectory,weight=1.0):
+        '''
+        per-source state of a Scheduler
+
+        source_id : str
+        trajectory : callable t -> (n,3) float
+            position of the source for times in seconds
+        weight : float
+            user priority of the source, multiplies its loudness and speed priorities
+        '''
+        self.source_id = source_id
+        self.trajectory = trajectory
+        self.weight = float(weight)
+        self.level = None #interpolation level and hop size of the last block
+        self.hop_size = None
+        self.renderers = {} #one per level, each keeps its own locator cache
+
+    def __repr__(self):
+        return f"scheduled source {self.source_id}" + "\nlevel, hop size: \n" + str((self.level,self.hop_size))
+
+class Scheduler():
+    def __init__(self,model,samplerate,truncation_level=0,blocksize=1024,budget=None,levels=None,hop_sizes=(32,64,128,256,512,1024,2048)):
+        '''
+        renders many moving sources block by block within a CPU budget, by choosing for each source the level of the mesh it is
+        interpolated over and the number of samples between two evaluations of its position (its control rate).
+        Coarser levels make point location cheaper, larger hops make it rarer. Every block, each source starts from its current
+        level and the largest hop, and the budget left is spent greedily on the upgrades with the best priority per second: a finer
+        level is worth the loudness of the source, a smaller hop its loudness times its angular speed, both scaled by the user weight.
+        A change of level is crossfaded over the block, which renders the source twice and is planned at the cost of both renders;
+        when the current levels alone exceed the budget, the sources of lowest priority are moved to the coarsest level.
+        The cost of each setting is calibrated once, and scaled by the ratio of measured to predicted time of the
+        previous blocks, so that the plan degrades gracefully when the machine is loaded.
+
+        model : SWF
+            the format to render to
+        samplerate : int
+        truncation_level : int
+            level at which to encode
+        blocksize : int
+            number of samples per block
+        budget : float (optional)
+            seconds of CPU allowed per block for all the sources, half of the duration of a block if None
+        levels : iterable of int (optional)
+            interpolation levels allowed, every level from the truncation level to the finest if None
+        hop_sizes : iterable of int
+            control rates allowed, in samples
+        '''
+        self.model = model
+        self.samplerate = samplerate
+        self.truncation_level = truncation_level
+        self.blocksize = int(blocksize)
+        self.budget = 0.5*self.blocksize/self.samplerate if budget is None else float(budget)
+        encoders = level_encoders(model,truncation_level)
+        self.levels = sorted(encoders if levels is None else [L for L in levels if L in encoders])
+        if len(self.levels) == 0:
+            raise ValueError(f'no interpolation level between the truncation level {truncation_level} and {model.n}')
+        self.hop_sizes = sorted(int(h) for h in hop_sizes)[::-1] #cheapest first
+        self.views = {L:_LevelView(level_mesh(model,L)) for L in self.levels}
+        self.encoders = {L:encoders[L] for L in self.levels}
+        self.sources = {}
+        self.load = 1.0 #measured over predicted time, smoothed over blocks
+        self.last = {}
+        self.calibrate()
+
+    def __repr__(self):
+        return f"scheduler of {len(self.sources)} sources" + "\nbudget per block: \n" + str(self.budget)
+
+    def calibrate(self,blocks=3):
+        '''
+        time the rendering of one block of a fast moving source for every interpolation level and hop size,
+        the table used to predict the cost of a plan
+        '''
+        orbit = Orbit(period=2.0,elevation=0.3) #a fast source, whose locator cache misses now and then
+        samples = np.zeros(self.blocksize)
+        self.cost = {}
+        for L in self.levels:
+            renderer = Renderer(self.views[L],orbit,self.samplerate,encoder=self.encoders[L])
+            for hop_size in self.hop_sizes:
+                renderer.hop_size = hop_size
+                renderer.process(samples,0) #warm the locator cache
+                times = []
+                for i in range(1,blocks+1):
+                    start = time.perf_counter()
+                    renderer.process(samples,i*self.blocksize)
+                    times.append(time.perf_counter() - start)
+                self.cost[L,hop_size] = float(np.median(times))
+
+    def add(self,source_id,trajectory,weight=1.0):
+        '''
+        add a source, or replace the trajectory and weight of an existing one
+        '''
+        source_id = str(source_id)
+        self.sources[source_id] = ScheduledSource(source_id,trajectory,weight)
+        return self.sources[source_id]
+
+    def remove(self,source_id):
+        self.sources.pop(str(source_id),None)
+
+    def predict(self,level,hop_size):
+        '''
+        predicted seconds to render one block of a source at an interpolation level and hop size
+        '''
+        return self.load*self.cost[level,hop_size]
+
+    def priorities(self,blocks,offset):
+        '''
+        loudness (rms of the block) and angular speed (radians per second over the block) of every source
+        '''
+        t = np.array([offset,offset + self.blocksize])/self.samplerate
+        result = {}
+        for source_id,block in blocks.items():
+            s = self.sources[source_id]
+            loudness = float(np.sqrt(np.mean(np.square(block)))) if len(block) else 0.0
+            a,b = s.trajectory(t)
+            speed = float(np.arccos(np.clip(np.dot(a,b)/(np.linalg.norm(a)*np.linalg.norm(b)),-1,1)))/(t[1]-t[0])
+            result[source_id] = (s.weight*loudness,s.weight*loudness*speed)
+        return result
+
+    def plan(self,blocks,offset):
+        '''
+        choose the interpolation level and hop size of every source for the next block
+
+        Parameters
+        ----------
+        blocks : dict of str -> (L,) float
+          the next block of every source
+        offset : int
+          index of the first sample of the block
+        Returns
+        ----------
+        plan : dict of str -> (level, hop_size)
+        predicted : float
+          predicted seconds for the whole block, the crossfades of the sources that change level included
+        '''
+        priorities = self.priorities(blocks,offset)
+        previous = {i:self.sources[i].level for i in blocks}
+        def cost(i,r,crossfade=True):
+            #a source that changes level is rendered at its previous level too, to crossfade, with the new hop size
+            level,hop_size = self.levels[r[0]],self.hop_sizes[r[1]]
+            seconds = self.predict(level,hop_size)
+            if crossfade and previous[i] is not None and previous[i] != level:
+                seconds += self.predict(previous[i],hop_size)
+            return seconds
+        #every source starts at its current level, the cheapest since changing level costs a second render, and the largest hop
+        rungs = {i:[0 if previous[i] is None else self.levels.index(previous[i]),0] for i in blocks} #index in self.levels and in self.hop_sizes
+        spent = sum(cost(i,r) for i,r in rungs.items())
+        if spent > self.budget:
+            #keeping the current levels already overruns: move the sources of lowest priority to the coarsest level, which costs
+            #their crossfade in this block but brings the next ones back within the budget
+            steady = sum(cost(i,r,False) for i,r in rungs.items())
+            for i in sorted(rungs,key=lambda i: priorities[i][0]):
+                if steady <= self.budget:
+                    break
+                if rungs[i][0] > 0:
+                    steady += cost(i,[0,0],False) - cost(i,rungs[i],False)
+                    rungs[i][0] = 0
+            spent = sum(cost(i,r) for i,r in rungs.items())
+        while True:
+            best = None
+            for i,r in rungs.items():
+                level_value,hop_value = priorities[i]
+                for axis,value in ((0,level_value),(1,hop_value)):
+                    top = len(self.levels) if axis == 0 else len(self.hop_sizes)
+                    if r[axis] + 1 >= top:
+                        continue
+                    up = list(r)
+                    up[axis] += 1
+                    extra = cost(i,up) - cost(i,r)
+                    if spent + extra > self.budget:
+                        continue
+                    score = (value + 1e-12)/(r[axis] + 1)/max(extra,1e-9) #diminishing returns on the same axis
+                    if best is None or score > best[0]:
+                        best = (score,i,up,extra)
+            if best is None:
+                break
+            _,i,up,extra = best
+            rungs[i] = up
+            spent += extra
+        return {i:(self.levels[r[0]],self.hop_sizes[r[1]]) for i,r in rungs.items()},spent
+
+    def process(self,blocks,offset):
+        '''
+        render one block of every source and sum them. A source that changes level is crossfaded over the block.
+
+        Parameters
+        ----------
+        blocks : dict of str -> (L,) float
+          mono signal of every source for this block, L <= blocksize
+        offset : int
+          index of the first sample of the block
+        Returns
+        ----------
+        out : (L, n_coarse) float
+        '''
+        start = time.perf_counter()
+        plan,predicted = self.plan(blocks,offset)
+        out = None
+        for source_id,block in blocks.items():
+            s = self.sources[source_id]
+            level,hop_size = plan[source_id]
+            rendered = self._render(s,level,hop_size,block,offset)
+            if s.level is not None and s.level != level:
+                fade = (np.arange(len(block)) + 1)/len(block)
+                previous = self._render(s,s.level,hop_size,block,offset)
+                rendered = rendered*fade.reshape(-1,1) + previous*(1 - fade).reshape(-1,1)
+            s.level,s.hop_size = level,hop_size
+            out = rendered if out is None else out + rendered
+        elapsed = time.perf_counter() - start
+        if predicted > 0:
+            self.load = float(np.clip(0.8*self.load + 0.2*self.load*elapsed/predicted,0.25,8.0))
+        self.last = {'plan':plan,'predicted':predicted,'elapsed':elapsed,'budget':self.budget,'load':self.load}
+        if out is None:
+            out = np.zeros((0,self.encoders[self.levels[0]].shape[0]))
+        return out
+
+    def _render(self,source,level,hop_size,block,offset):
+        if level not in source.renderers:
+            source.renderers[level] = Renderer(self.views[level],source.trajectory,self.samplerate,encoder=self.encoders[level],hop_size=hop_size)
+        renderer = source.renderers[level]
+        renderer.hop_size = hop_size
+        return renderer.process(block,offset)
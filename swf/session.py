@@ -0,0 +1,127 @@
+import numpy as np
+
+class Source():
+    def __init__(self,source_id,num_vertices):
+        '''
+        per-source state of a Session
+
+        source_id : str
+            address of the source, as in /source/<id>/position
+        num_vertices : int
+            number of vertices in the finest mesh of the model
+        '''
+        self.source_id = source_id
+        self.position = None
+        self.face = None #locator cache: last face of the finest mesh containing the source
+        self.weights = None #last interpolation weights over self.face
+        self.gains = np.zeros(num_vertices) #last gains sent, defined over the finest mesh
+        self.start = np.zeros(num_vertices) #gains at the start of the current ramp
+        self.target = np.zeros(num_vertices) #gains at the end of the current ramp
+        self.ramp = 0 #number of ticks left in the current ramp
+        self.dirty = False
+
+    def __repr__(self):
+        return f"source {self.source_id}" + "\nposition: \n" + str(self.position)
+
+class Session():
+    def __init__(self,model,truncation_level=0,ramp_steps=1):
+        '''
+        model : SWF
+            the format used to render every source
+        truncation_level : int
+            level of the encoder used for the summed coarse mix
+        ramp_steps : int
+            number of control ticks over which the gains of a moving source are ramped to their new value.
+            1 jumps to the new gains on the next tick.
+        '''
+        self.model = model
+        self.truncation_level = truncation_level
+        self.ramp_steps = max(int(ramp_steps),1)
+        self.num_vertices = self.model.meshes[-1].vertices.shape[0]
+        self.sources = {}
+
+    def __repr__(self):
+        return f"session of {len(self.sources)} sources"
+
+    def source(self,source_id):
+        '''
+        returns the state of the source source_id, creating it if it is new
+        '''
+        source_id = str(source_id)
+        if source_id not in self.sources:
+            self.sources[source_id] = Source(source_id,self.num_vertices)
+        return self.sources[source_id]
+
+    def remove(self,source_id):
+        '''
+        forget the state of the source source_id
+        '''
+        self.sources.pop(str(source_id),None)
+
+    def set_position(self,source_id,position):
+        '''
+        store a new position for a source, it is rendered on the next call to tick
+
+        Parameters
+        ----------
+        source_id : str
+          address of the source
+        position : (3,) float
+          cartesian coordinates of the source
+        '''
+        source = self.source(source_id)
+        source.position = np.asarray(position,dtype=float).reshape(3)
+        source.dirty = True
+
+    def tick(self):
+        """
+        Render every dirty source in one vectorized batch.
+        Sources whose new position still falls inside their cached face skip the point location over the whole mesh.
+        Sources that are still ramping towards their target gains are advanced one step.
+
+        Returns
+        ----------
+        updated : dict of str -> (N,) float
+          the gains over the finest mesh for each source that changed on this tick
+        """
+        moved = [s for s in self.sources.values() if s.dirty and s.position is not None]
+        if len(moved) > 0:
+            loc = np.vstack([s.position for s in moved])
+            ind = np.array([-1 if s.face is None else s.face for s in moved])
+            cached = ind >= 0
+            if np.any(cached):
+                cached[cached] = self.model.contains(loc[cached],ind[cached])
+            if not np.all(cached):
+                ind[~cached] = self.model.locate(loc[~cached])
+            weights = self.model.weights(loc,ind)
+            faces = self.model.meshes[-1].faces[ind]
+            for s,face,w,verts in zip(moved,ind,weights,faces):
+                s.face = face
+                s.weights = w
+                s.start = s.gains.copy()
+                s.target = np.zeros(self.num_vertices)
+                s.target[verts] = w
+                s.ramp = self.ramp_steps
+                s.dirty = False
+
+        updated = {}
+        for s in self.sources.values():
+            if s.ramp > 0:
+                s.ramp -= 1
+                t = 1 - s.ramp/self.ramp_steps
+                s.gains = s.start + t*(s.target - s.start)
+                updated[s.source_id] = s.gains
+        return updated
+
+    def mix(self):
+        """
+        Encode the sum of the gains of every source to the coarse mesh at the truncation level of the session
+
+        Returns
+        ----------
+        coarse : (shape of vertices at truncation level)
+        """
+        fine = np.zeros(self.num_vertices)
+        for s in self.sources.values():
+            fine += s.gains
+        return self.model.encode(fine,self.truncation_level)
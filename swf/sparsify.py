@@ -0,0 +1,148 @@
+import time
+import numpy as np
+
+def _drop_columns(X,bound):
+    """
+    For each column, the mask of the smallest entries that can be dropped while the largest change of that column,
+    after the renormalization done by renormalize_columns, stays below bound
+    """
+    order = np.argsort(np.abs(X),axis=0)
+    s = np.take_along_axis(X,order,axis=0)
+    sa = np.abs(s)
+    kept = sa.sum(axis=0) - np.cumsum(sa,axis=0) #absolute mass left after dropping the first i+1 sorted entries
+    deficit = np.abs(np.cumsum(s,axis=0))
+    with np.errstate(divide='ignore',invalid='ignore'):
+        change = np.where(kept > 0,deficit*sa[-1]/kept,np.inf) #the largest kept entry receives the largest share of the deficit
+    ok = np.logical_and.accumulate(np.maximum(sa,change) <= bound,axis=0)
+    drop = np.zeros(X.shape,dtype=bool)
+    np.put_along_axis(drop,order,ok,axis=0)
+    return drop
+
+def _drop_rows(X,bound):
+    """
+    For each row, the mask of the smallest entries whose energy is at most bound**2 times the energy of the row
+    """
+    order = np.argsort(np.abs(X),axis=1)
+    s2 = np.take_along_axis(X,order,axis=1)**2
+    ok = np.cumsum(s2,axis=1) <= (bound**2)*s2.sum(axis=1).reshape(-1,1)
+    drop = np.zeros(X.shape,dtype=bool)
+    np.put_along_axis(drop,order,ok,axis=1)
+    return drop
+
+def renormalize_columns(X,sums):
+    """
+    Spread the difference between the target column sums and the column sums of X over the entries of each column,
+    in proportion to their absolute value, so that zero entries stay zero
+
+    Parameters
+    -----------
+    X : (n, N) float
+    sums : (N,) float
+      target sum of each column, e.g. 1 for an encoder that preserves the total acoustic pressure
+    Returns
+    -----------
+    (n, N) float
+    """
+    X = np.array(X,dtype=float)
+    mass = np.abs(X).sum(axis=0)
+    deficit = sums - X.sum(axis=0)
+    scale = np.divide(deficit,mass,out=np.zeros_like(mass),where=mass > 0)
+    return X + np.abs(X)*scale
+
+def sparsify(X,bound,criterion='gain',renormalize=True,measure=False,block=1024):
+    """
+    Prune the small entries of a composed operator (e.g. phi2s[j]) down to an error bound, keeping the sum of every column.
+    For encoders, columns are the directions of the finest mesh and their sum is the total acoustic pressure checked by check_sum_to_1.
+
+    Parameters
+    -----------
+    X : (n, N) float
+      the operator
+    bound : float
+      'gain': largest absolute change of any entry of any column, i.e. the max gain error over all finest-level directions
+      'energy': largest relative energy (2-norm) of the pruned part of each row
+    criterion : str
+      'gain' or 'energy'
+    renormalize : bool
+      spread what was pruned over the kept entries of each column so that column sums are unchanged
+    measure : bool
+      also time a dense and a sparse product with a block of samples to report the actual speedup
+    block : int
+      number of samples of the timed product
+    Returns
+    -----------
+    sparse : scipy.sparse.csr_matrix
+    report : dict
+      nnz before and after, density, speedup estimate (ratio of non-zeros), achieved max gain error, achieved max relative row error,
+      whether the column sums are preserved, and the measured speedup if asked
+    """
+    import scipy.sparse as sparse
+    X = np.asarray(X,dtype=float)
+    if criterion not in ('gain','energy'):
+        raise ValueError(f"unknown criterion {criterion}, use 'gain' or 'energy'")
+    row_norm = np.linalg.norm(X,axis=1)
+    target = bound
+    for _ in range(20):
+        drop = _drop_columns(X,target) if criterion == 'gain' else _drop_rows(X,target)
+        Y = np.where(drop,0,X)
+        if renormalize:
+            Y = renormalize_columns(Y,X.sum(axis=0))
+        if criterion == 'gain':
+            break #the renormalization is already accounted for by _drop_columns
+        #the renormalization adds to the row errors, tighten the pruning until the bound holds
+        achieved = np.max(np.divide(np.linalg.norm(Y - X,axis=1),row_norm,out=np.zeros_like(row_norm),where=row_norm > 0))
+        if achieved <= bound:
+            break
+        target *= 0.8*bound/achieved
+    S = sparse.csr_matrix(Y)
+    S.eliminate_zeros()
+
+    error = Y - X
+    nnz = int(np.count_nonzero(X))
+    report = {
+        'nnz_before': nnz,
+        'nnz_after': int(S.nnz),
+        'density': S.nnz/X.size,
+        'speedup_estimate': nnz/max(S.nnz,1),
+        'max_gain_error': float(np.max(np.abs(error))),
+        'max_row_error': float(np.max(np.divide(np.linalg.norm(error,axis=1),row_norm,out=np.zeros_like(row_norm),where=row_norm > 0))),
+        'sums_preserved': bool(np.allclose(Y.sum(axis=0),X.sum(axis=0))),
+    }
+    if measure:
+        data = np.random.default_rng(0).standard_normal((X.shape[1],block))
+        def best(fn):
+            times = []
+            for _ in range(5):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            return min(times)
+        report['speedup_measured'] = best(lambda: X @ data)/best(lambda: S @ data)
+    return S,report
+
+def sparsify_model(model,bound,criterion='gain',operators=('phi2s','psi2s','phis','psis'),renormalize=True,measure=False):
+    """
+    Sparsify the composed encoders and decoders of a SWF, every level of every operator list
+
+    Parameters
+    -----------
+    model : SWF
+    bound : float
+      error bound, see sparsify
+    criterion : str
+      'gain' or 'energy'
+    operators : iterable of str
+      names of the operator lists of the model to prune
+    Returns
+    -----------
+    pruned : dict of str -> list of scipy.sparse.csr_matrix
+      usable in place of the dense lists, e.g. model.phi2s[j] @ data
+    reports : dict of str -> list of dict
+    """
+    pruned = {}
+    reports = {}
+    for name in operators:
+        results = [sparsify(X,bound,criterion,renormalize,measure) for X in getattr(model,name)]
+        pruned[name] = [S for S,_ in results]
+        reports[name] = [r for _,r in results]
+    return pruned,reports
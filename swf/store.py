@@ -0,0 +1,88 @@
+import json
+import os
+import numpy as np
+
+class Store():
+    def __init__(self,path,block_rows=1024):
+        '''
+        a directory of .npy files opened as memory maps, used to keep the filters and operators of deep formats on disk.
+        Arrays are written block of rows by block of rows, and read back read-only so that several processes
+        opening the same store share the same pages.
+
+        path : str
+            directory of the store, created if it does not exist
+        block_rows : int
+            number of rows written or multiplied at once
+        '''
+        self.path = str(path)
+        self.block_rows = int(block_rows)
+        os.makedirs(self.path,exist_ok=True)
+
+    def __repr__(self):
+        return f"store at {self.path}" + "\narrays: \n" + str(len(self.names()))
+
+    def __contains__(self,name):
+        return os.path.exists(self.filename(name))
+
+    def filename(self,name):
+        return os.path.join(self.path,name + '.npy')
+
+    def names(self):
+        '''
+        names of the arrays in the store
+        '''
+        return sorted(f[:-4] for f in os.listdir(self.path) if f.endswith('.npy'))
+
+    def get(self,name):
+        '''
+        open the array name read-only as a memory map
+        '''
+        return np.load(self.filename(name),mmap_mode='r')
+
+    def create(self,name,shape,dtype=np.float64):
+        '''
+        create the array name on disk and return it as a writable memory map, it must be flushed and deleted once filled
+        '''
+        return np.lib.format.open_memmap(self.filename(name),mode='w+',dtype=dtype,shape=tuple(shape))
+
+    def put(self,name,arr):
+        '''
+        copy arr into the store block by block and return the stored array as a read-only memory map
+        '''
+        out = self.create(name,arr.shape,arr.dtype)
+        for r in range(0,arr.shape[0],self.block_rows):
+            out[r:r+self.block_rows] = arr[r:r+self.block_rows]
+        out.flush()
+        del out
+        return self.get(name)
+
+    def matmul(self,name,X,Y):
+        '''
+        compute X @ Y one block of rows of X at a time, write it into the store and return it as a read-only memory map.
+        Only one block of the result is held in memory. The result is written to a temporary file renamed to name once
+        complete, so X or Y may be the array name itself, e.g. when an operator is replaced by its product with a filter.
+        '''
+        partial = name + '.partial'
+        out = self.create(partial,(X.shape[0],Y.shape[1]),np.result_type(X.dtype,Y.dtype))
+        for r in range(0,X.shape[0],self.block_rows):
+            out[r:r+self.block_rows] = np.asarray(X[r:r+self.block_rows]) @ Y
+        out.flush()
+        del out
+        os.replace(self.filename(partial),self.filename(name))
+        return self.get(name)
+
+    @property
+    def meta(self):
+        '''
+        the contents of meta.json, an empty dict if there is none
+        '''
+        path = os.path.join(self.path,'meta.json')
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @meta.setter
+    def meta(self,value):
+        with open(os.path.join(self.path,'meta.json'),'w') as f:
+            json.dump(value,f,indent=2)
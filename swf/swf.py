@@ -1,10 +1,13 @@
+import os
 import numpy as np
-from trimesh import *
-from utils import *
-from constants import *
+from .trimesh import *
+from .utils import *
+from .profiling import span, count, profiled
+from .store import Store
 
 class SWF():
-    def __init__(self,base,n=3,meshset=None):
+    @profiled('swf/init')
+    def __init__(self,base,n=3,meshset=None,store=None):
         '''
         base : Trimesh 
             Trimesh sets the base mesh manually
@@ -14,8 +17,14 @@ class SWF():
         meshset : iterable (optional)
             If, for example, you had a particular set of manually subdivided meshes that were compatible, they could be provided 
             here instead of generating the subdivisions automatically. It is important to note that n subdivisions will still occur. If this is not taken into account, it could result in a long runtime if you provide a relatively dense mesh in the meshset.
+        store : Store or str (optional)
+            If given, the filters of every level and the operators phis, psis, phi2s, psi2s are written to this on-disk store block by block
+            and kept as read-only memory maps, for formats too deep to hold in memory. The finished store can be reopened with SWF.load.
         
         '''
+        if isinstance(store,str):
+            store = Store(store)
+        self.store = store
         self.base = base
         self.n = int(n)
         if meshset is not None:
@@ -23,22 +32,232 @@ class SWF():
 
         self.meshes = []
         if meshset is not None:
-            self.meshes = meshset
+            self.meshes = list(meshset) #a copy, the caller's list is not extended with the subdivisions
             current = self.meshes[-1]
         else:
             current = self.base
         for i in range(int(n)):
-            result = current.subdivide()
+            result = current.subdivide(store=store)
             self.meshes.append(result)
             current = result
         self.Ps = [m.filters[0] for m in self.meshes]
         self.Qs = [m.filters[1] for m in self.meshes]
         self.As = [m.filters[2] for m in self.meshes]
         self.Bs = [m.filters[3] for m in self.meshes]
-        self.phis = [self.phi(j) for j in range(self.n)]
-        self.psis = [self.psi(j) for j in range(self.n)]
-        self.phi2s = [self.phi2(j) for j in range(self.n)]
-        self.psi2s = [self.psi2(j) for j in range(self.n)]
+        self._truncated = [] #meshes removed by truncate, finest last, reused by extend
+        self.operators()
+        if self.store is not None:
+            self.save()
+
+    def operators(self):
+        '''
+        computes the lists phis, psis, phi2s and psi2s from the finest level down. Each operator reuses the one of the level above, 
+        phis[j] = phis[j+1] @ P_j+1, psis[j] = phis[j+1] @ Q_j+1, phi2s[j] = A_j+1 @ phi2s[j+1], psi2s[j] = B_j+1 @ phi2s[j+1],
+        so that every level costs one product instead of a whole chain. With a store, the products are written to it block by block.
+        '''
+        n = self.n
+        store = self.store
+        self.phis = [None]*n
+        self.psis = [None]*n
+        self.phi2s = [None]*n
+        self.psi2s = [None]*n
+        matmul,copy = self._writers()
+        if n == 0:
+            return
+        with span('swf/phis'):
+            self.phis[-1] = copy('phi%d'%(n-1),self.Ps[-1])
+            for j in range(n-2,-1,-1):
+                self.phis[j] = matmul('phi%d'%j,self.phis[j+1],self.Ps[j])
+        with span('swf/psis'):
+            self.psis[-1] = copy('psi%d'%(n-1),self.Qs[-1])
+            for j in range(n-2,-1,-1):
+                self.psis[j] = matmul('psi%d'%j,self.phis[j+1],self.Qs[j])
+        with span('swf/phi2s'):
+            self.phi2s[-1] = copy('phi2%d'%(n-1),self.As[-1])
+            for j in range(n-2,-1,-1):
+                self.phi2s[j] = matmul('phi2%d'%j,self.As[j],self.phi2s[j+1])
+        with span('swf/psi2s'):
+            self.psi2s[-1] = copy('psi2%d'%(n-1),self.Bs[-1])
+            for j in range(n-2,-1,-1):
+                self.psi2s[j] = matmul('psi2%d'%j,self.Bs[j],self.phi2s[j+1])
+
+    def _writers(self):
+        #how operators are formed and kept: in memory, or written to the store block by block
+        if self.store is None:
+            return (lambda name,X,Y: X @ Y),(lambda name,X: np.array(X))
+        return self.store.matmul,self.store.put
+
+    @profiled('swf/extend')
+    def extend(self,k=1,**kwargs):
+        '''
+        adds k finer levels to the format, reusing every existing mesh, filter and operator. The operators of the existing
+        levels are only multiplied by the filters of each new level L,
+        phis[j] = P_L @ phis[j], psis[j] = P_L @ psis[j], phi2s[j] = phi2s[j] @ A_L, psi2s[j] = psi2s[j] @ A_L,
+        and the levels removed by truncate are put back without being subdivided again.
+        Objects built from the format before (renderers, engines, encoders exported to files) keep the old operators.
+        
+        k : int
+            number of levels to add
+        kwargs :
+            arguments of Trimesh.subdivide for the new levels (modified, ALPHA, BETA, GAMMA, LAMBDA, project_to_sphere).
+            The levels removed by truncate are subdivided again if any is given.
+        '''
+        if kwargs:
+            self._truncated = []
+        for _ in range(int(k)):
+            if self._truncated:
+                mesh = self._truncated.pop()
+            else:
+                current = self.meshes[-1] if self.meshes else self.base
+                mesh = current.subdivide(store=self.store,**kwargs)
+            self._add_level(mesh)
+        if self.store is not None:
+            self.save()
+
+    @profiled('swf/truncate')
+    def truncate(self,k=1):
+        '''
+        removes the k finest levels of the format. Since A_L @ P_L = I, the operators of the remaining levels are recovered
+        with one product each, phis[j] = A_L @ phis[j], psis[j] = A_L @ psis[j], phi2s[j] = phi2s[j] @ P_L,
+        psi2s[j] = psi2s[j] @ P_L, equal to those of a format built with fewer levels up to rounding.
+        The removed meshes are kept for extend.
+        
+        k : int
+            number of levels to remove, at most n
+        '''
+        k = int(k)
+        if not 0 <= k <= self.n:
+            raise ValueError(f'cannot remove {k} levels from a format of {self.n}')
+        matmul,copy = self._writers()
+        for _ in range(k):
+            mesh = self.meshes.pop()
+            P,Q,A,B = mesh.filters
+            for filters in (self.Ps,self.Qs,self.As,self.Bs):
+                filters.pop()
+            for operators in (self.phis,self.psis,self.phi2s,self.psi2s):
+                operators.pop()
+            self.n -= 1
+            with span('swf/truncate/operators'):
+                for j in range(self.n):
+                    self.phis[j] = matmul('phi%d'%j,A,self.phis[j])
+                    self.psis[j] = matmul('psi%d'%j,A,self.psis[j])
+                    self.phi2s[j] = matmul('phi2%d'%j,self.phi2s[j],P)
+                    self.psi2s[j] = matmul('psi2%d'%j,self.psi2s[j],P)
+            self._truncated.append(mesh)
+        if self.store is not None:
+            self.save()
+
+    def _add_level(self,mesh):
+        #appends a finer mesh and updates the operators with its filters only
+        P,Q,A,B = mesh.filters
+        L = self.n
+        matmul,copy = self._writers()
+        with span('swf/extend/operators'):
+            for j in range(L):
+                self.phis[j] = matmul('phi%d'%j,P,self.phis[j])
+                self.psis[j] = matmul('psi%d'%j,P,self.psis[j])
+                self.phi2s[j] = matmul('phi2%d'%j,self.phi2s[j],A)
+                self.psi2s[j] = matmul('psi2%d'%j,self.psi2s[j],A)
+            self.phis.append(copy('phi%d'%L,P))
+            self.psis.append(copy('psi%d'%L,Q))
+            self.phi2s.append(copy('phi2%d'%L,A))
+            self.psi2s.append(copy('psi2%d'%L,B))
+        self.meshes.append(mesh)
+        self.Ps.append(P)
+        self.Qs.append(Q)
+        self.As.append(A)
+        self.Bs.append(B)
+        self.n = L + 1
+
+    def save(self):
+        '''
+        writes the meshes, and the filters of the meshes that are not in the store yet, to self.store, with a meta.json describing the format
+        '''
+        store = self.store
+        store.put('base.vertices',self.base.vertices)
+        store.put('base.faces',self.base.faces)
+        meshes = []
+        for m in self.meshes:
+            prefix = f'level{m.level}'
+            store.put(prefix+'.vertices',m.vertices)
+            store.put(prefix+'.faces',m.faces)
+            if m.midpoints is not None:
+                store.put(prefix+'.midpoints',m.midpoints)
+            for name,X in zip('PQAB',m.filters):
+                if not (isinstance(X,np.memmap) and X.filename == store.filename(prefix+'.'+name)):
+                    store.put(prefix+'.'+name,X)
+            meshes.append({'level':m.level,'ALPHA':m.ALPHA,'BETA':m.BETA,'GAMMA':m.GAMMA,'LAMBDA':m.LAMBDA,'projected':m.projected})
+        base = self.base
+        store.meta = {'n':self.n,
+                      'base':{'level':base.level,'ALPHA':base.ALPHA,'BETA':base.BETA,'GAMMA':base.GAMMA,'LAMBDA':base.LAMBDA},
+                      'meshes':meshes}
+
+    @classmethod
+    def load(cls,store):
+        '''
+        reopens a SWF written to a store, without computing anything. 
+        The filters and operators are read-only memory maps, so several processes loading the same store share their pages.
+        
+        store : Store or str
+            the store, or its directory
+        '''
+        if isinstance(store,str):
+            store = Store(store)
+        meta = store.meta
+        if 'meshes' not in meta:
+            raise ValueError(f'{store.path} does not hold a SWF')
+        model = cls.__new__(cls)
+        model.store = store
+        model.n = meta['n']
+        b = meta['base']
+        model.base = Trimesh(np.array(store.get('base.vertices')),np.array(store.get('base.faces')),level=b['level'],
+                             ALPHA=b['ALPHA'],BETA=b['BETA'],GAMMA=b['GAMMA'],LAMBDA=b['LAMBDA'])
+        model.meshes = []
+        for m in meta['meshes']:
+            prefix = f"level{m['level']}"
+            filters = tuple(store.get(prefix+'.'+name) for name in 'PQAB')
+            mesh = Trimesh(np.array(store.get(prefix+'.vertices')),np.array(store.get(prefix+'.faces')),filters,m['level'],
+                           ALPHA=m['ALPHA'],BETA=m['BETA'],GAMMA=m['GAMMA'],LAMBDA=m['LAMBDA'])
+            if prefix+'.midpoints' in store:
+                mesh.midpoints = np.array(store.get(prefix+'.midpoints'))
+            mesh.projected = m.get('projected',True)
+            model.meshes.append(mesh)
+        model.Ps = [m.filters[0] for m in model.meshes]
+        model.Qs = [m.filters[1] for m in model.meshes]
+        model.As = [m.filters[2] for m in model.meshes]
+        model.Bs = [m.filters[3] for m in model.meshes]
+        n = model.n
+        model.phis = [store.get('phi%d'%j) for j in range(n)]
+        model.psis = [store.get('psi%d'%j) for j in range(n)]
+        model.phi2s = [store.get('phi2%d'%j) for j in range(n)]
+        model.psi2s = [store.get('psi2%d'%j) for j in range(n)]
+        model._truncated = []
+        return model
+    
+    @profiled('swf/update_geometry')
+    def update_geometry(self,vertices):
+        '''
+        moves the vertices of the base mesh, e.g. after re-measuring the loudspeakers of a venue, without rebuilding the format.
+        The filters and the operators phis, psis, phi2s and psi2s only depend on the connectivity of the meshes and on the lifting
+        coefficients, so they are kept. Only the geometry is refreshed: the base is projected to the sphere, the midpoints of every
+        level are recomputed from their parent edge, and the meshes are replaced so that their point location and interpolation data
+        are recomputed on first use. Vertices given to manual_subdivide (e.g. the transcoding meshes) keep their position.
+        The symmetries of the meshes (Trimesh symmetry and permutations) are kept as long as the new vertices still satisfy them,
+        and dropped otherwise, e.g. when a single loudspeaker moved.
+        
+        vertices : (n, 3) float
+            new locations of the vertices of self.base, in the same order
+        '''
+        self.base = self.base.with_vertices(vertices)
+        parent = self.base
+        meshes = []
+        for mesh in self.meshes:
+            parent = mesh.with_vertices(mesh.refine_vertices(parent))
+            meshes.append(parent)
+        self.meshes = meshes
+        self._truncated = [] #their vertices are out of date
+        if self.store is not None:
+            self.save()
     
     def phi(self,j):
         '''
@@ -86,6 +305,7 @@ class SWF():
         result = self.Bs[j] @ result
         return result
 
+    @profiled('encode')
     def encode(self,data,truncation_level=0):
         """
     Encode data in the fine representation to the coarse representation using the encoding filter at the given truncation level
@@ -101,8 +321,119 @@ class SWF():
     encoded : (shape of vertices at truncation level)
     """
         encoded = self.phi2s[truncation_level] @ data
+        count('encode/samples',encoded.shape[-1] if encoded.ndim > 1 else 1)
         return encoded
     
+    @profiled('interpolate/locate')
+    def locate(self,loc,block=1<<22):
+        '''
+        for the given points (loc), returns the index of the nearest face of the finest mesh.
+        The distance to the faces around the nearest vertex bounds the distance to the closest face, and the closest point
+        is then only searched among the faces whose bounding sphere is within that bound
+        Parameters
+        ----------
+        loc : (n,3) float
+          one or many query points 
+        block : int
+          largest number of point-vertex or point-face distances held at once
+        Returns
+        ----------
+        ind : (n,) int
+          index of the nearest face in self.meshes[-1].faces for each query point, the lowest one on ties as in closest_point_naive
+        '''
+        loc = np.asarray(loc,dtype=float).reshape((-1,3))
+        mesh = self.meshes[-1]
+        geometry = mesh.geometry()
+        vertices = mesh.vertices
+        triangles,centers,radii,incident = geometry['triangles'],geometry['centers'],geometry['radii'],geometry['incident']
+        norms = np.sum(vertices*vertices,axis=1)
+        center_norms = np.sum(centers*centers,axis=1)
+        rows = max(block//max(vertices.shape[0],centers.shape[0]),1)
+        ind = np.empty(loc.shape[0],dtype=int)
+        for start in range(0,loc.shape[0],rows):
+            d = loc[start:start+rows]
+            #upper bound of the distance to the closest face
+            nearest = np.argmin(norms - 2*d@vertices.T,axis=1)
+            bound = np.full(d.shape[0],np.inf)
+            for c in incident[nearest].T:
+                valid = c >= 0
+                dist = np.sum((closest_point_corresponding(triangles[np.where(valid,c,0)],d) - d)**2,axis=1)
+                bound = np.where(valid,np.minimum(bound,dist),bound)
+            #lower bound of the distance to every face, from its bounding sphere
+            gap = np.sqrt(np.maximum(center_norms - 2*d@centers.T + np.sum(d*d,axis=1).reshape(-1,1),0)) - radii
+            i,f = np.nonzero(gap <= np.sqrt(bound).reshape(-1,1) + 1e-9)
+            dist = np.sum((closest_point_corresponding(triangles[f],d[i]) - d[i])**2,axis=1)
+            #closest face of each point, ties go to the lowest face index
+            order = np.lexsort((f,dist,i))
+            i,f = i[order],f[order]
+            first = np.concatenate(([True],i[1:] != i[:-1]))
+            ind[start + i[first]] = f[first]
+        return ind
+
+    def contains(self,loc,ind,tol=1e-9):
+        '''
+        checks whether the projection of each point (loc) onto the plane of the face ind of the finest mesh falls inside that face. 
+        Used to reuse a previously located face for a slowly moving source without searching the whole mesh again.
+        Parameters
+        ----------
+        loc : (n,3) float
+          one or many query points 
+        ind : (n,) int
+          candidate face index for each query point
+        tol : float
+          tolerance on the signed barycentric coordinates
+        Returns
+        ----------
+        inside : (n,) bool
+        '''
+        loc = loc.reshape((-1,3))
+        geometry = self.meshes[-1].geometry()
+        facing = np.sum(geometry['normals'][ind]*loc,axis=1) > 0 #the point must lie on the same side of the origin as the face
+        #barycentric coordinates of the projection of loc onto the plane of the face, all of them are positive iff it falls inside PQR
+        return facing & np.all(self.barycentric(loc,ind) >= -tol,axis=1)
+
+    def barycentric(self,loc,ind):
+        '''
+        signed barycentric coordinates of the orthogonal projection of each point (loc) onto the plane of the face ind of the finest mesh,
+        from the per-face solvers of Trimesh.geometry, one 3x3 product per point
+        Parameters
+        ----------
+        loc : (n,3) float
+          one or many query points 
+        ind : (n,) int
+          face index for each query point
+        Returns
+        ----------
+        barycentric : (n,3) float
+          coordinates for the vertices self.meshes[-1].faces[ind], they sum to 1
+        '''
+        geometry = self.meshes[-1].geometry()
+        QR = np.einsum('kij,kj->ki',geometry['solvers'][ind,:2],loc.reshape((-1,3)) - geometry['triangles'][ind,0])
+        return np.column_stack((1 - QR[:,0] - QR[:,1],QR[:,0],QR[:,1]))
+
+    @profiled('interpolate/weights')
+    def weights(self,loc,ind):
+        '''
+        for the given points (loc) and faces (ind) of the finest mesh, returns the triangular interpolation weights accross the three vertices of each face PQR.
+        For a vertex P and a query point S, the interpolation weight for a vertex P is calculated as the area of the sub-triangle SQR divided by the total area of the triangle PQR. 
+        Parameters
+        ----------
+        loc : (n,3) float
+          one or many query points 
+        ind : (n,) int
+          face index for each query point, as returned by locate
+        Returns
+        ----------
+        interpolation : (n,3) float
+          weights for the vertices self.meshes[-1].faces[ind]
+        '''
+        #the area of the sub-triangle SQR over the area of PQR is the absolute value of the barycentric coordinate of P,
+        #for the projection S of the query point onto the plane of PQR
+        interpolation = np.abs(self.barycentric(loc,ind))
+        interpolation = interpolation/interpolation.sum(axis=1).reshape(-1,1)
+        return interpolation
+    
+    @profiled('interpolate')
     def interpolate(self,loc,hop_size=1):
         '''
         for a given point (loc), returns the triangular interpolation accross the three vertices of the nearest triangle PQR on the mesh. 
@@ -119,36 +450,45 @@ class SWF():
         encoded : (shape of vertices at truncation level)
         '''
         loc = loc.reshape((-1,3))
-        triangles = self.meshes[-1].vertices[self.meshes[-1].faces]
-        closest, dist, ind = self.meshes[-1].closest_point_naive(loc[::hop_size])
-        closest = np.repeat(closest,hop_size)
-        dist = np.repeat(dist,hop_size)
-        ind = np.repeat(ind,hop_size)
-
-        PQR = triangles[ind]
-    
-        AreaPQR = AreaTRI(PQR) #Area of PQR
-
-        PQ = PQR[:,1] - PQR[:,0] #get the PQ vector of the triangle PQR
-        PR = PQR[:,2] - PQR[:,0] #get the PR vector of the triangle PQR
-        normals = np.cross(PQ,PR) #get the normal vector for the plane defined by the triangle PQR
-        unitNormals = normals/np.linalg.norm(normals,axis=1).reshape(-1,1) #normal vector of unit length defined by PQR
-        scalarDist = np.sum(unitNormals*(loc-PQR[:,0,:]),axis=1) #scalar distance from panning point to plane along the normal
-        projection = loc - scalarDist.reshape(-1,1)*unitNormals #projection of panning point onto the plane defined by triangle PQR
-
-        S = projection.reshape(-1,1,3) #reshaped for use in the area calculations
-
-        SQR = np.hstack((S,PQR[:,1:,:])) #The triangle SQR defined by the panning point S and its two furthest neighbors
-        PSR = np.hstack((PQR[:,0,:].reshape(-1,1,3),S,PQR[:,2,:].reshape(-1,1,3))) #The triangle PSR defined by S and its closest and furthest neighbors
-        PQS = np.hstack((PQR[:,:2,:],S)) #The triangle PQS defined by S and its two closest neighbors
+        count('interpolate/points',loc.shape[0])
+        ind = self.locate(loc[::hop_size])
+        ind = np.repeat(ind,hop_size)[:loc.shape[0]]
 
-        AreaSQR = AreaTRI(SQR) #area of SQR
-        AreaPSR = AreaTRI(PSR) #area of PSR
-        AreaPQS = AreaTRI(PQS) #area of PQS
-
-        interpolation = np.vstack((AreaSQR/AreaPQR,AreaPSR/AreaPQR,AreaPQS/AreaPQR)).T 
-        interpolation = interpolation/interpolation.sum(axis=1).reshape(-1,1)
+        interpolation = self.weights(loc,ind)
         fine = np.zeros((self.meshes[-1].vertices.shape[0],loc.shape[0]))
         fine[self.meshes[-1].faces[ind],np.arange(ind.shape[0]).reshape(-1,1)] = interpolation
         
         return fine
+
+def _build(variant):
+    variant = dict(variant)
+    vertices = variant.pop('vertices')
+    faces = variant.pop('faces')
+    n = variant.pop('n',3)
+    meshset = variant.pop('meshset',None)
+    return SWF(Trimesh(vertices,faces,**variant),n=n,meshset=meshset)
+
+def build_formats(variants,threads=None):
+    """
+    Build several formats concurrently in a pool of threads, e.g. to compare layouts or lifting coefficients.
+    Subdividing never changes a mesh, so variants may share base meshes and meshsets, and most of the work is in
+    numpy products that release the GIL.
+
+    Parameters
+    -----------
+    variants : iterable of dict
+      the arguments of every format: vertices and faces of the base mesh, and optionally n, meshset and the other
+      arguments of Trimesh (ALPHA, BETA, GAMMA, LAMBDA, symmetry)
+    threads : int (optional)
+      number of threads, one per variant up to the number of CPUs if None
+    Returns
+    -----------
+    models : list of SWF
+      in the order of variants
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    variants = list(variants)
+    if threads is None:
+        threads = min(len(variants),os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(int(threads),1)) as pool:
+        return list(pool.map(_build,variants))
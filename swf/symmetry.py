@@ -0,0 +1,211 @@
+import numpy as np
+from .utils import faces_to_edges, vertex_permutations, velocity
+
+# Symmetries of a mesh are the orthogonal maps R of the sphere (rotations and reflections) that map its vertices onto its
+# vertices and, for the topology, its faces onto its faces. Such an R permutes the vertices of every level of the
+# subdivision, and since the lifting coefficients are the same for every vertex, the filters commute with it:
+#   phi2s[j][p_c[a], p_f[i]] == phi2s[j][a, i]
+# with p_c and p_f the permutations of the coarse and finest vertices. A source at R v is then rendered as the source
+# at v rotated by R, so the velocities, and the cost, are the same for every vertex of an orbit of the group.
+
+def _frame(a,b):
+    #orthonormal frame whose first axis is a and whose second is in the plane of a and b
+    a = a/np.linalg.norm(a)
+    b = b - (a @ b)*a
+    b = b/np.linalg.norm(b)
+    return np.column_stack((a,b,np.cross(a,b)))
+
+def _face_keys(faces):
+    return set(map(tuple,np.sort(faces,axis=1)))
+
+def detect(mesh,tol=1e-6,topology=True):
+    """
+    Find the orthogonal maps of the sphere that map a mesh onto itself. Every candidate maps vertex 0 and one of its
+    neighbors onto a vertex of the same degree and a neighbor of it at the same angle, as a rotation and as a reflection.
+
+    Parameters
+    -----------
+    mesh : Trimesh
+    tol : float
+      largest distance between a mapped vertex and the vertex it is matched with
+    topology : bool
+      whether the faces must be mapped onto faces too, which the filters need to be symmetric. Without it, only the
+      vertices are, e.g. for the left/right symmetry of a layout whose triangulation is not symmetric.
+    Returns
+    -----------
+    rotations : list of (3, 3) float
+      the group of the mesh, the identity first
+    """
+    vertices = mesh.vertices/np.linalg.norm(mesh.vertices,axis=1).reshape(-1,1)
+    n = vertices.shape[0]
+    edges = faces_to_edges(mesh.faces)
+    neighbors = [set() for _ in range(n)]
+    for i,j in edges:
+        neighbors[i].add(j)
+        neighbors[j].add(i)
+    degree = np.array([len(s) for s in neighbors])
+    faces = _face_keys(mesh.faces) if topology else None
+    b = min(neighbors[0])
+    F = _frame(vertices[0],vertices[b])
+    angle = vertices[0] @ vertices[b]
+    rotations = [np.identity(3)]
+    found = {tuple(range(n))}
+    for a_ in range(n):
+        if degree[a_] != degree[0]:
+            continue
+        for b_ in neighbors[a_]:
+            if degree[b_] != degree[b] or abs(vertices[a_] @ vertices[b_] - angle) > tol:
+                continue
+            G = _frame(vertices[a_],vertices[b_])
+            for flip in (1,-1):
+                R = (G*np.array([1,1,flip])) @ F.T
+                perms,mapped = vertex_permutations([R],mesh.vertices,tol)
+                if not mapped[0] or tuple(perms[0]) in found:
+                    continue
+                p = perms[0]
+                if topology and _face_keys(p[mesh.faces]) != faces:
+                    continue
+                found.add(tuple(p))
+                rotations.append(R)
+    return rotations
+
+def orbits(perms):
+    """
+    Given the vertex permutations of a group, return the orbit of every vertex
+
+    Parameters
+    -----------
+    perms : (g, n) int
+      see utils.vertex_permutations
+    Returns
+    -----------
+    representatives : (r,) int
+      the smallest vertex of every orbit
+    sizes : (r,) int
+      number of vertices of every orbit
+    orbit : (n,) int
+      index in representatives of the orbit of every vertex
+    """
+    perms = np.asarray(perms).reshape(-1,np.shape(perms)[-1])
+    #every vertex takes the smallest label of its images until none changes, which closes the orbits in case perms is
+    #only a set of generators; a whole group takes one pass
+    label = np.arange(perms.shape[1])
+    while True:
+        smallest = np.minimum(label,label[perms].min(axis=0)) if perms.shape[0] else label
+        if np.array_equal(smallest,label):
+            break
+        label = smallest
+    representatives,orbit = np.unique(label,return_inverse=True)
+    return representatives,np.bincount(orbit),orbit
+
+def orbit_cost(SWF,wl,wt,level_to_optimize=0,rotations=None):
+    '''
+    The same cost as utils.cost, with the velocities computed for one source per orbit of the finest vertices and
+    weighted by the size of the orbit. Exact when the filters are symmetric, i.e. when the rotations preserve the topology.
+    -----------
+    SWF: SWF object
+    wl : int
+        weight for the longitudinal velocity component
+    wt : int
+        weight for the transverse velocity component
+    level_to_optimize : int
+    rotations : list of (3, 3) float (optional)
+        symmetries of the format, those inherited by its finest mesh if None, with the permutations it already holds
+    Returns
+    -----------
+    cost : float
+    '''
+    fine = SWF.meshes[-1].vertices
+    if rotations is None and SWF.meshes[-1].permutations is not None:
+        perms = SWF.meshes[-1].permutations
+    else:
+        perms,_ = vertex_permutations([np.identity(3)] if rotations is None else rotations,fine)
+    representatives,sizes,_ = orbits(perms)
+    encoder = np.asarray(SWF.phi2s[level_to_optimize])[:,representatives]
+    if level_to_optimize == 0:
+        opt_level_vertices = SWF.base.vertices
+    else:
+        opt_level_vertices = SWF.meshes[level_to_optimize-1].vertices
+    Vl,Vt = velocity(encoder,opt_level_vertices,fine[representatives].T)
+    E = wl*((Vl-1)**2) + wt*(Vt**2)
+    return np.sum(sizes*E)/fine.shape[0]
+
+def _level_vertices(SWF,j):
+    #vertices of the coarse mesh of phi2s[j]
+    return SWF.base.vertices if j == 0 else SWF.meshes[j-1].vertices
+
+def _paired_permutations(rotations,rows,cols):
+    #permutations of two vertex sets for the rotations that map both onto themselves, in the same order
+    rotations = list(rotations)
+    row_perms,row_ok = vertex_permutations(rotations,rows)
+    col_perms,col_ok = vertex_permutations(rotations,cols)
+    both = row_ok & col_ok
+    return row_perms[both[row_ok]],col_perms[both[col_ok]],both
+
+def check(SWF,rotations=None):
+    """
+    How far the encoders of a format are from commuting with some rotations: for every level j and rotation, the largest
+    |phi2s[j][p_c[a], p_f[i]] - phi2s[j][a, i]|. Rotations that do not map the vertices of a level onto themselves are
+    skipped for it, as a mirror of the layout is when the triangulation is not symmetric.
+
+    Parameters
+    -----------
+    SWF : SWF
+    rotations : list of (3, 3) float (optional)
+      those inherited by the finest mesh if None
+    Returns
+    -----------
+    asymmetry : (levels,) float
+      0 up to rounding for a symmetric format
+    """
+    if rotations is None:
+        rotations = SWF.meshes[-1].symmetry or [np.identity(3)]
+    fine = SWF.meshes[-1].vertices
+    asymmetry = np.zeros(len(SWF.phi2s))
+    for j in range(len(SWF.phi2s)):
+        X = np.asarray(SWF.phi2s[j])
+        row_perms,col_perms,_ = _paired_permutations(rotations,_level_vertices(SWF,j),fine)
+        for pr,pc in zip(row_perms,col_perms):
+            asymmetry[j] = max(asymmetry[j],np.max(np.abs(X[np.ix_(pr,pc)] - X)))
+    return asymmetry
+
+def symmetrize(X,row_perms,col_perms):
+    """
+    The average of a matrix over a group of simultaneous row and column permutations (the Reynolds operator), the closest
+    matrix to X that commutes with the group. Sums of columns are kept, so a symmetrized encoder still preserves pressure.
+
+    Parameters
+    -----------
+    X : (r, c) float
+    row_perms : (g, r) int
+    col_perms : (g, c) int
+      the permutations of the rows and columns by the same elements of a group, the identity included
+    Returns
+    -----------
+    (r, c) float
+    """
+    X = np.asarray(X)
+    Y = np.zeros(X.shape)
+    for pr,pc in zip(row_perms,col_perms):
+        Y[np.ix_(pr,pc)] += X
+    return Y/len(row_perms)
+
+def symmetrize_encoder(SWF,rotations,truncation_level=0):
+    """
+    phi2s[truncation_level] averaged over a group of rotations, to render symmetrically with lifting coefficients or
+    filters that are not, e.g. rotations from detect(mesh, topology=False) when the finest vertices are still symmetric
+
+    Parameters
+    -----------
+    SWF : SWF
+    rotations : list of (3, 3) float
+      a group, the identity included
+    truncation_level : int
+    Returns
+    -----------
+    encoder : (n_coarse, N_fine) float
+    """
+    row_perms,col_perms,both = _paired_permutations(rotations,_level_vertices(SWF,truncation_level),SWF.meshes[-1].vertices)
+    if not np.all(both):
+        raise ValueError(f'{np.sum(~both)} of the rotations do not map the vertices of level {truncation_level} and of the finest mesh onto themselves')
+    return symmetrize(SWF.phi2s[truncation_level],row_perms,col_perms)
@@ -1,10 +1,52 @@
 import numpy as np
 from numpy import inf
-import scipy.sparse as sparse
-from utils import *
+from .utils import *
+from .profiling import span, count, profiled
+
+def trivial_filters(n,m):
+    """
+    Sparse version of the trivial filters P0,Q0,A0,B0 that the lifting schemes start from, 
+    for a mesh of n coarse vertices subdivided by adding m detail vertices.
+    
+    Returns
+    ----------
+    (P0,Q0,A0,B0) : 4-tuple of scipy.sparse csr matrices
+    """
+    import scipy.sparse as sparse #only needed for stored formats, kept out of the import of this module
+    P = sparse.vstack((sparse.identity(n),sparse.csr_matrix((m,n)))).tocsr()
+    Q = sparse.vstack((sparse.csr_matrix((n,m)),sparse.identity(m))).tocsr()
+    return P,Q,P.T.tocsr(),Q.T.tocsr()
+
+def _eye_rows(r0,r1,k):
+    #rows r0 to r1 of the k x k identity matrix
+    block = np.zeros((r1-r0,k))
+    block[np.arange(r1-r0),np.arange(r0,r1)] = 1
+    return block
+
+def _dense(X):
+    #a block of an array or of a scipy.sparse matrix, as an array
+    return X.toarray() if hasattr(X,'toarray') else np.asarray(X)
+
+def _sums(X,axis):
+    #sums of the rows (axis=1) or columns (axis=0) of an array or a scipy.sparse matrix, as a 1d array
+    return np.asarray(X.sum(axis=axis)).reshape(-1)
+
+def _sparse_adjacency(edges,n):
+    #adjacency matrix of n vertices from their unique edges, kept sparse for stored formats
+    import scipy.sparse as sparse
+    i = np.concatenate((edges[:,0],edges[:,1]))
+    j = np.concatenate((edges[:,1],edges[:,0]))
+    return sparse.csr_matrix((np.ones(i.shape[0],dtype=edges.dtype),(i,j)),shape=(n,n))
+
+def _weighted_neighbors(adj,adj2,adj3,ALPHA,BETA,GAMMA,n,m):
+    #T = ALPHA*adj[:n,-m:] + BETA*adj2[:,:n].T + GAMMA*adj3[:,:n].T, the weights of column j applied to detail vertex j.
+    #With a sparse adjacency (stored formats), the same sum of sparse matrices.
+    if hasattr(adj,'toarray'):
+        return (adj[-m:,:n].multiply(ALPHA.reshape(-1,1)) + adj2[:,:n].multiply(BETA.reshape(-1,1)) + adj3[:,:n].multiply(GAMMA.reshape(-1,1))).T.tocsr()
+    return ALPHA * adj[:n,-m:] + BETA * adj2[:,:n].T + GAMMA * adj3[:,:n].T
 
 class Trimesh():
-    def __init__(self,vertices=None,faces=None,filters=None,level=0,ALPHA=1/2,BETA=1/8,GAMMA=-1/16,LAMBDA=1/6):
+    def __init__(self,vertices=None,faces=None,filters=None,level=0,ALPHA=1/2,BETA=1/8,GAMMA=-1/16,LAMBDA=1/6,symmetry=None,permutations=None):
         """
         vertices : (n, 3) float
            Array of vertex locations
@@ -26,6 +68,12 @@ class Trimesh():
             multiplicative parameter for third neighbors, used in constructing T
         LAMBDA : float
             multiplicative parameter for first neighbors, used in constructing S
+        symmetry : list of (3, 3) float (optional)
+            rotations and reflections that map the mesh onto itself, see symmetry.detect. The meshes subdivided from this one
+            inherit them, and the lifting schemes then only count the neighbors of one detail vertex per orbit.
+        permutations : (g, n) int (optional)
+            the vertex permutations of the symmetries, in the same order. Matched with utils.vertex_permutations if None,
+            which drops the symmetries that do not map the vertices onto themselves; subdivide derives them from the parent.
         """
         self.level = level
         if vertices is not None:
@@ -53,22 +101,53 @@ class Trimesh():
             self.LAMBDA = LAMBDA
         else:
             raise ValueError('lifting coefficients do not satisfy the relation: 2a+2b+4c=1')  
+        
+        if symmetry is not None and permutations is None:
+            permutations,mapped = vertex_permutations(symmetry,self.vertices)
+            symmetry = [R for R,ok in zip(symmetry,mapped) if ok]
+        self.symmetry = symmetry
+        self.permutations = permutations
+        self.midpoints = None #for meshes made by subdivide, the two parent vertices of each new vertex
+        self.projected = True #whether the new vertices were projected to the unit sphere
+        self._incident = None
+        self._geometry = None
 
     def __repr__(self):
         return f"mesh level {self.level}" + "\nnum vertices: \n" + str(self.vertices.shape[0])
 
-    def liftingScheme(self,P0,Q0,A0,B0,adj):
+    def coefficients(self,ALPHA=None,BETA=None,GAMMA=None,LAMBDA=None):
+        '''
+        the lifting coefficients of this mesh, with some of them replaced. The mesh itself is never changed, so that it can
+        be subdivided from several threads at once.
+        
+        Returns
+        ----------
+        (ALPHA,BETA,GAMMA,LAMBDA) : 4-tuple of float
+        '''
+        ALPHA = self.ALPHA if ALPHA is None else ALPHA
+        BETA = self.BETA if BETA is None else BETA
+        GAMMA = self.GAMMA if GAMMA is None else GAMMA
+        LAMBDA = self.LAMBDA if LAMBDA is None else LAMBDA
+        if not checkRelation(ALPHA,BETA,GAMMA):
+            raise ValueError('lifting coefficients do not satisfy the relation: 2a+2b+4c=1')
+        return ALPHA,BETA,GAMMA,LAMBDA
+
+    @profiled('lifting/liftingScheme')
+    def liftingScheme(self,P0,Q0,A0,B0,adj,store=None,perms=None,coefficients=None):
         m = Q0.shape[1] #details
         n = P0.shape[1] #coarse
         #S is mxn matrix coarse -> details
         #T is nxm matrix details -> coarse
-        adj2 = get_second_neighbors(adj)
-        adj3 = get_third_neighbors(adj)
-        
-        np.seterr(divide='ignore', invalid='ignore') #the following computations regularize the parameters (Alpha,Beta,Gamma,Delta) for first, second, third and fourth neighbors for each of the details points, using the number of neighbors they actually have, i.e. the topology of the neighborhood of each point. 
-        ALPHA = 2*self.ALPHA/np.sum(adj[-m:,:n],axis=1)
-        BETA = 2*self.BETA/np.sum(adj2[-m:,:n],axis=1)
-        GAMMA = 4*self.GAMMA/np.sum(adj3[-m:,:n],axis=1)
+        with span('lifting/neighbors'):
+            #only the rows of the details are needed: the neighbor matrices are symmetric, so adj2[:n,-m:] is adj2[-m:,:n].T
+            adj2,adj3 = neighbor_rows(adj,np.arange(n,n+m),perms)
+        
+        a,b,c,l = self.coefficients() if coefficients is None else coefficients
+        #the following computations regularize the parameters (Alpha,Beta,Gamma,Delta) for first, second, third and fourth neighbors for each of the details points, using the number of neighbors they actually have, i.e. the topology of the neighborhood of each point. 
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ALPHA = 2*a/_sums(adj[-m:,:n],1)
+            BETA = 2*b/_sums(adj2[:,:n],1)
+            GAMMA = 4*c/_sums(adj3[:,:n],1)
        
         #get rid of nans and infs if we have any.
         ALPHA[np.isnan(ALPHA)] = 0
@@ -81,33 +160,41 @@ class Trimesh():
         GAMMA[GAMMA == -inf] = 0
         GAMMA[GAMMA == inf] = 0
         
-        S = self.LAMBDA * adj[-m:,:n]
-        T = ALPHA * adj[:n,-m:] + BETA * adj2[:n,-m:] + GAMMA * adj3[:n,-m:]
+        S = l * adj[-m:,:n]
+        T = _weighted_neighbors(adj,adj2,adj3,ALPHA,BETA,GAMMA,n,m)
+        
+        if store is not None:
+            return self.store_filters(store,S,T,modified=False)
         
         Im = np.identity(S.shape[0]) #mxm identity matrix
         In = np.identity(T.shape[0]) #nxn identity matrix
         
-        P = P0 + Q0@S
-        Q = -P0 @ T + Q0 @ (Im - S@T)
-        A = (In - T@S)@A0 + T@B0
-        B = B0-S@A0
+        with span('lifting/products'):
+            P = P0 + Q0@S
+            Q = -P0 @ T + Q0 @ (Im - S@T)
+            A = (In - T@S)@A0 + T@B0
+            B = B0-S@A0
         
         return P,Q,A,B
 
-    def modliftingScheme(self,P0,Q0,A0,B0,adj):
+    @profiled('lifting/modliftingScheme')
+    def modliftingScheme(self,P0,Q0,A0,B0,adj,store=None,perms=None,coefficients=None):
         m = Q0.shape[1] #details
         n = P0.shape[1] #coarse
         #S_ is mxn matrix coarse -> details
         #T_ is nxm matrix details -> coarse
-        adj2 = get_second_neighbors(adj)
-        adj3 = get_third_neighbors(adj)
-        
-        np.seterr(divide='ignore', invalid='ignore') #the following computations regularize the parameters (Alpha,Beta,Gamma) for first, second and third neighbors for each of the details points, using the number of neighbors they actually have, i.e. the topology of the neighborhood of each point. 
-        ALPHA = 2*self.ALPHA/np.sum(adj[-m:,:n],axis=1)
-        BETA = 2*self.BETA/np.sum(adj2[-m:,:n],axis=1)
-        GAMMA = 4*self.GAMMA/np.sum(adj3[-m:,:n],axis=1)
-        
-        LAMBDA = 6*self.LAMBDA/np.sum(adj[-m:,:n],axis=0)
+        with span('lifting/neighbors'):
+            #only the rows of the details are needed: the neighbor matrices are symmetric, so adj2[:n,-m:] is adj2[-m:,:n].T
+            adj2,adj3 = neighbor_rows(adj,np.arange(n,n+m),perms)
+        
+        a,b,c,l = self.coefficients() if coefficients is None else coefficients
+        #the following computations regularize the parameters (Alpha,Beta,Gamma) for first, second and third neighbors for each of the details points, using the number of neighbors they actually have, i.e. the topology of the neighborhood of each point. 
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ALPHA = 2*a/_sums(adj[-m:,:n],1)
+            BETA = 2*b/_sums(adj2[:,:n],1)
+            GAMMA = 4*c/_sums(adj3[:,:n],1)
+            
+            LAMBDA = 6*l/_sums(adj[-m:,:n],0)
         
         #get rid of nans and infs if we have any.
         
@@ -121,23 +208,82 @@ class Trimesh():
         GAMMA[GAMMA == -inf] = 0
         GAMMA[GAMMA == inf] = 0
         
-        BETA[GAMMA==0] += (4*self.GAMMA / (np.sum(adj2[-m:,:n],axis=1)[GAMMA==0])) #if there are no third neighbors, compensate by reweighting the second neighbors accordingly
+        with np.errstate(divide='ignore', invalid='ignore'):
+            BETA[GAMMA==0] += (4*c / (_sums(adj2[:,:n],1)[GAMMA==0])) #if there are no third neighbors, compensate by reweighting the second neighbors accordingly
        
-        S_ = self.LAMBDA * adj[-m:,:n]
-        T_ = ALPHA * adj[:n,-m:] + BETA * adj2[:n,-m:] + GAMMA * adj3[:n,-m:]
+        S_ = l * adj[-m:,:n]
+        T_ = _weighted_neighbors(adj,adj2,adj3,ALPHA,BETA,GAMMA,n,m)
         #print(np.all(check_sum_to_1(T_@B0,0)[n:]))
         
+        if store is not None:
+            return self.store_filters(store,S_,T_,modified=True)
+        
         Im = np.identity(S_.shape[0]) #mxm identity matrix
         In = np.identity(T_.shape[0]) #nxn identity matrix
         
-        P = Q0 @ S_ + P0 @ (In - T_@S_)
-        Q = Q0 - P0 @ T_
-        A = A0 + T_ @ B0
-        B = (Im - S_@T_)@B0 - S_@A0
+        with span('lifting/products'):
+            P = Q0 @ S_ + P0 @ (In - T_@S_)
+            Q = Q0 - P0 @ T_
+            A = A0 + T_ @ B0
+            B = (Im - S_@T_)@B0 - S_@A0
         
         return P,Q,A,B
 
-    def subdivide(self, project_to_sphere = True, modified = True, ALPHA=None,BETA=None,GAMMA=None,LAMBDA=None):
+    @profiled('lifting/store_filters')
+    def store_filters(self,store,S,T,modified=True):
+        """
+        Write the filters P,Q,A,B of the next level into a Store, one block of rows at a time, without forming them in memory.
+        This relies on the lifting schemes always starting from the trivial filters P0 = [I;0], Q0 = [0;I], A0 = P0.T, B0 = Q0.T,
+        which gives the block forms
+        modified:   P = [I-TS ; S],  Q = [-T ; I],     A = [I, T],     B = [-S, I-ST]
+        unmodified: P = [I ; S],     Q = [-T ; I-ST],  A = [I-TS, T],  B = [-S, I]
+        
+        Parameters
+        ------------
+        store : Store
+          where to write the filters, as level<L>.P, level<L>.Q, level<L>.A, level<L>.B for the next level L
+        S : (m, n) float, array or scipy.sparse matrix
+          lifting matrix coarse -> details
+        T : (n, m) float, array or scipy.sparse matrix
+          lifting matrix details -> coarse, only one block of rows of each is made dense at a time
+        modified : bool
+          whether S and T come from the modified lifting scheme
+          
+        Returns
+        ----------
+        (P,Q,A,B) : read-only memory maps
+        """
+        m,n = S.shape
+        N = n+m
+        b = store.block_rows
+        prefix = f'level{self.level+1}'
+        P = store.create(prefix+'.P',(N,n))
+        Q = store.create(prefix+'.Q',(N,m))
+        A = store.create(prefix+'.A',(n,N))
+        B = store.create(prefix+'.B',(m,N))
+        for r0 in range(0,n,b):
+            r1 = min(r0+b,n)
+            T_rows = _dense(T[r0:r1])
+            TS = _dense(T[r0:r1]@S)
+            P[r0:r1] = _eye_rows(r0,r1,n) - TS if modified else _eye_rows(r0,r1,n)
+            Q[r0:r1] = -T_rows
+            A[r0:r1,:n] = _eye_rows(r0,r1,n) if modified else _eye_rows(r0,r1,n) - TS
+            A[r0:r1,n:] = T_rows
+        for r0 in range(0,m,b):
+            r1 = min(r0+b,m)
+            S_rows = _dense(S[r0:r1])
+            ST = _dense(S[r0:r1]@T)
+            P[n+r0:n+r1] = S_rows
+            Q[n+r0:n+r1] = _eye_rows(r0,r1,m) if modified else _eye_rows(r0,r1,m) - ST
+            B[r0:r1,:n] = -S_rows
+            B[r0:r1,n:] = _eye_rows(r0,r1,m) - ST if modified else _eye_rows(r0,r1,m)
+        for X in (P,Q,A,B):
+            X.flush()
+        del P,Q,A,B
+        return tuple(store.get(prefix+'.'+name) for name in 'PQAB')
+
+    @profiled('subdivide')
+    def subdivide(self, project_to_sphere = True, modified = True, ALPHA=None,BETA=None,GAMMA=None,LAMBDA=None,store=None):
         """
         Subdivide a mesh into smaller triangles,
         Carry out one iteration of lifting scheme on the 
@@ -153,30 +299,28 @@ class Trimesh():
         modified : wether or not to use the modified lifting scheme (True) or the unmodified lifting scheme (False).
           if True: calls modliftingScheme() to construct non-trivial P,Q,A,B
           if False: calls liftingScheme() to construct non-trivial P,Q,A,B
+        ALPHA, BETA, GAMMA, LAMBDA : float (optional)
+          lifting coefficients of this subdivision and of the new mesh, instead of those of this mesh, which is left unchanged
+        store : Store (optional)
+          if given, the filters of the new mesh are written to the store block by block and kept there as read-only memory maps
           
         Returns
         ----------
         New subdivided trimesh object
         """
-        if ALPHA is not None:
-            self.ALPHA = ALPHA
-        if BETA is not None:
-            self.BETA = BETA
-        if GAMMA is not None:
-            self.GAMMA = GAMMA
-        if LAMBDA is not None:
-            self.LAMBDA = LAMBDA
+        coefficients = self.coefficients(ALPHA,BETA,GAMMA,LAMBDA)
         
         face_index = np.arange(len(self.faces))
 
         # find the unique edges of our faces subset
         edges = np.sort(faces_to_edges(self.faces), axis=1)
-        _, unique, inverse, counts = np.unique(
-            edges,
-            return_index=True,
-            return_inverse=True,
-            return_counts=True,
-            axis=0)
+        with span('subdivide/unique_edges'):
+            _, unique, inverse, counts = np.unique(
+                edges,
+                return_index=True,
+                return_inverse=True,
+                return_counts=True,
+                axis=0)
         # then only produce one midpoint per unique edge
         mid = self.vertices[edges[unique]].mean(axis=1) #new vertices ordered by unique edges
         mid_idx = inverse.reshape((-1, 3)) + len(self.vertices) 
@@ -206,7 +350,11 @@ class Trimesh():
         if project_to_sphere:
             new_vertices = new_vertices/np.linalg.norm(new_vertices,axis=1).reshape(-1,1)
         
-        if self.level==0:
+        if store is not None:
+            #the filters go to disk, start from sparse trivial filters rather than dense ones
+            P,Q,A,B = trivial_filters(self.vertices.shape[0],mid.shape[0])
+            
+        elif self.level==0:
             eye = self.filters[0]
             
             P = np.vstack((eye,np.zeros((mid.shape[0],eye.shape[1]))))
@@ -231,29 +379,43 @@ class Trimesh():
             B = Q.T
             
         new_edges = np.sort(faces_to_edges(new_faces), axis=1)
-        _1, unique1, inverse1, counts1 = np.unique(
-            new_edges,
-            return_index=True,
-            return_inverse=True,
-            return_counts=True,
-            axis=0)
+        with span('subdivide/unique_edges'):
+            _1, unique1, inverse1, counts1 = np.unique(
+                new_edges,
+                return_index=True,
+                return_inverse=True,
+                return_counts=True,
+                axis=0)
         
         arr = new_edges[unique1]
         shape = (new_vertices.shape[0],new_vertices.shape[0])
         #create adjacency matrix including the newly generated vertices
-        adj = sparse.coo_matrix((np.ones((arr.shape[0]*2)), (np.hstack((arr[:, 0],arr[:,1])), np.hstack((arr[:, 1],arr[:,0])))), 
-                                shape=shape,dtype=arr.dtype).toarray() 
+        with span('subdivide/adjacency'):
+            if store is not None:
+                #a dense N x N adjacency would be the largest array of a stored level
+                adj = _sparse_adjacency(arr,shape[0])
+            else:
+                adj = np.zeros(shape,dtype=arr.dtype)
+                adj[arr[:, 0],arr[:, 1]] = 1
+                adj[arr[:, 1],arr[:, 0]] = 1
+        count('subdivide/vertices',new_vertices.shape[0])
+        perms,symmetry = self._symmetry_of(new_vertices,edges[unique])
         if modified:
-            P,Q,A,B = self.modliftingScheme(P,Q,A,B,adj)
+            P,Q,A,B = self.modliftingScheme(P,Q,A,B,adj,store=store,perms=perms,coefficients=coefficients)
             
         else:
-            P,Q,A,B = self.liftingScheme(P,Q,A,B,adj)
+            P,Q,A,B = self.liftingScheme(P,Q,A,B,adj,store=store,perms=perms,coefficients=coefficients)
         
         new_filters = (P,Q,A,B)
 
-        return Trimesh(new_vertices, new_faces, new_filters, self.level + 1, ALPHA=self.ALPHA, BETA=self.BETA, GAMMA=self.GAMMA, LAMBDA=self.LAMBDA)
+        ALPHA,BETA,GAMMA,LAMBDA = coefficients
+        result = Trimesh(new_vertices, new_faces, new_filters, self.level + 1, ALPHA=ALPHA, BETA=BETA, GAMMA=GAMMA, LAMBDA=LAMBDA, symmetry=symmetry, permutations=perms)
+        result.midpoints = edges[unique]
+        result.projected = project_to_sphere
+        return result
     
-    def manual_subdivide(self, new_vertices, new_faces, project_to_sphere = True, modified = True, ALPHA=None,BETA=None,GAMMA=None,LAMBDA=None):
+    @profiled('manual_subdivide')
+    def manual_subdivide(self, new_vertices, new_faces, project_to_sphere = True, modified = True, ALPHA=None,BETA=None,GAMMA=None,LAMBDA=None,store=None):
         """
         Lets a user specify the next "level" of mesh manually. This should only really be used with extreme caution, as it is neccessary to include all the vertices of the base mesh in the next level. 
         
@@ -266,26 +428,27 @@ class Trimesh():
         modified : wether or not to use the modified lifting scheme (True) or the unmodified lifting scheme (False).
           if True: calls modliftingScheme() to construct non-trivial P,Q,A,B
           if False: calls liftingScheme() to construct non-trivial P,Q,A,B
+        ALPHA, BETA, GAMMA, LAMBDA : float (optional)
+          lifting coefficients of this subdivision and of the new mesh, instead of those of this mesh, which is left unchanged
+        store : Store (optional)
+          if given, the filters of the new mesh are written to the store block by block and kept there as read-only memory maps
           
         Returns
         ----------
         New subdivided trimesh object
         """
-        if ALPHA is not None:
-            self.ALPHA = ALPHA
-        if BETA is not None:
-            self.BETA = BETA
-        if GAMMA is not None:
-            self.GAMMA = GAMMA
-        if LAMBDA is not None:
-            self.LAMBDA = LAMBDA
+        coefficients = self.coefficients(ALPHA,BETA,GAMMA,LAMBDA)
          #turn new vertices into unit vectors w.r.t. the origin
         if project_to_sphere:
             new_vertices = new_vertices/np.linalg.norm(new_vertices,axis=1).reshape(-1,1)
             
         num_new_vertices = new_vertices.shape[0] - self.vertices.shape[0]
         
-        if self.level==0:
+        if store is not None:
+            #the filters go to disk, start from sparse trivial filters rather than dense ones
+            P,Q,A,B = trivial_filters(self.vertices.shape[0],num_new_vertices)
+            
+        elif self.level==0:
             eye = self.filters[0]
             
             P = np.vstack((eye,np.zeros((num_new_vertices,eye.shape[1]))))
@@ -310,28 +473,157 @@ class Trimesh():
             B = Q.T
             
         new_edges = np.sort(faces_to_edges(new_faces), axis=1)
-        _1, unique1, inverse1, counts1 = np.unique(
-            new_edges,
-            return_index=True,
-            return_inverse=True,
-            return_counts=True,
-            axis=0)
+        with span('subdivide/unique_edges'):
+            _1, unique1, inverse1, counts1 = np.unique(
+                new_edges,
+                return_index=True,
+                return_inverse=True,
+                return_counts=True,
+                axis=0)
         
         arr = new_edges[unique1]
         shape = (new_vertices.shape[0],new_vertices.shape[0])
         #create adjacency matrix including the newly generated vertices
-        adj = sparse.coo_matrix((np.ones((arr.shape[0]*2)), (np.hstack((arr[:, 0],arr[:,1])), np.hstack((arr[:, 1],arr[:,0])))), 
-                                shape=shape,dtype=arr.dtype).toarray() 
+        with span('subdivide/adjacency'):
+            if store is not None:
+                #a dense N x N adjacency would be the largest array of a stored level
+                adj = _sparse_adjacency(arr,shape[0])
+            else:
+                adj = np.zeros(shape,dtype=arr.dtype)
+                adj[arr[:, 0],arr[:, 1]] = 1
+                adj[arr[:, 1],arr[:, 0]] = 1
+        count('subdivide/vertices',new_vertices.shape[0])
+        perms,symmetry = self._symmetry_of(new_vertices)
         if modified:
-            P,Q,A,B = self.modliftingScheme(P,Q,A,B,adj)
+            P,Q,A,B = self.modliftingScheme(P,Q,A,B,adj,store=store,perms=perms,coefficients=coefficients)
             
         else:
-            P,Q,A,B = self.liftingScheme(P,Q,A,B,adj)
+            P,Q,A,B = self.liftingScheme(P,Q,A,B,adj,store=store,perms=perms,coefficients=coefficients)
         
         new_filters = (P,Q,A,B)
 
-        return Trimesh(new_vertices, new_faces, new_filters, self.level + 1, ALPHA=self.ALPHA, BETA=self.BETA, GAMMA=self.GAMMA, LAMBDA=self.LAMBDA)
+        ALPHA,BETA,GAMMA,LAMBDA = coefficients
+        result = Trimesh(new_vertices, new_faces, new_filters, self.level + 1, ALPHA=ALPHA, BETA=BETA, GAMMA=GAMMA, LAMBDA=LAMBDA, symmetry=symmetry, permutations=perms)
+        result.projected = project_to_sphere
+        return result
+    
+    def _symmetry_of(self, new_vertices, midpoints=None):
+        #the vertex permutations of a subdivision induced by the symmetries of this mesh, and the symmetries that still hold.
+        #A midpoint of the edge (a, b) is mapped onto the midpoint of (p[a], p[b]), so the permutations of a subdivision are
+        #looked up in its sorted edges, without matching any coordinates.
+        if self.symmetry is None:
+            return None,None
+        if midpoints is None or self.permutations is None:
+            perms,mapped = vertex_permutations(self.symmetry,new_vertices)
+            return perms,[R for R,ok in zip(self.symmetry,mapped) if ok]
+        n = self.vertices.shape[0]
+        keys = midpoints[:,0]*n + midpoints[:,1] #increasing, the edges come from np.unique
+        image = np.sort(self.permutations[:,midpoints],axis=2)
+        image = image[...,0]*n + image[...,1]
+        k = np.minimum(np.searchsorted(keys,image),keys.shape[0] - 1)
+        mapped = np.all(keys[k] == image,axis=1)
+        perms = np.hstack((self.permutations[mapped],n + k[mapped]))
+        return perms,[R for R,ok in zip(self.symmetry,mapped) if ok]
+    
+    def with_vertices(self, vertices):
+        """
+        A copy of this mesh with its vertices moved, sharing its faces, filters and lifting coefficients, which only depend on the connectivity.
+        Base meshes normalize their vertices to the unit sphere, as in the constructor.
+        Of the symmetries of this mesh, those that still map the moved vertices onto themselves are kept with their permutations.
+        
+        Parameters
+        ------------
+        vertices : (n, 3) float
+          new vertex locations, in the same order
+        Returns
+        ----------
+        Trimesh
+        """
+        vertices = np.asarray(vertices,dtype=float)
+        if vertices.shape != self.vertices.shape:
+            raise ValueError(f'expected vertices of shape {self.vertices.shape}, got {vertices.shape}')
+        result = Trimesh(vertices, self.faces, self.filters, self.level, ALPHA=self.ALPHA, BETA=self.BETA, GAMMA=self.GAMMA, LAMBDA=self.LAMBDA)
+        if self.symmetry is not None:
+            #the symmetries that still map the moved vertices onto themselves keep their permutations
+            kept = [k for k,R in enumerate(self.symmetry)
+                    if np.allclose(result.vertices @ np.asarray(R).T,result.vertices[self.permutations[k]],atol=1e-6)]
+            result.symmetry = [self.symmetry[k] for k in kept]
+            result.permutations = self.permutations[kept]
+        result.midpoints = self.midpoints
+        result.projected = self.projected
+        result._incident = self._incident #topology only, still valid
+        return result
+    
+    def refine_vertices(self, parent):
+        """
+        The vertices of this mesh recomputed from the vertices of the mesh it was subdivided from: the vertices inherited from 
+        the parent are copied, midpoints are recomputed from their parent edge, and the vertices given to manual_subdivide are kept.
+        
+        Parameters
+        ------------
+        parent : Trimesh
+          the mesh of the level below, possibly with moved vertices
+        Returns
+        ----------
+        vertices : (n, 3) float
+        """
+        n = parent.vertices.shape[0]
+        vertices = np.array(self.vertices,dtype=float)
+        vertices[:n] = parent.vertices
+        if self.midpoints is not None:
+            vertices[n:] = parent.vertices[self.midpoints].mean(axis=1)
+        if self.projected:
+            vertices = vertices/np.linalg.norm(vertices,axis=1).reshape(-1,1)
+        return vertices
     
+    def geometry(self):
+        """
+        Per-face data used for point location and interpolation, computed on first use and kept with the mesh
+        
+        Returns
+        ----------
+        geometry : dict
+          triangles (m, 3, 3) float, the corners P,Q,R of every face
+          centers (m, 3) float and radii (m,) float, the bounding sphere of every face
+          normals (m, 3) float, the unit normal of every face, pointing away from the origin
+          solvers (m, 3, 3) float, the inverse of the basis [Q-P, R-P, normal] of every face, so that solvers[f] @ (x - P) gives
+            the barycentric coordinates of Q and R of the projection of x onto the plane of the face, and the distance of x to that plane
+          incident (n, d) int, the faces around every vertex, see vertex_faces
+        """
+        if self._geometry is None:
+            if self._incident is None:
+                self._incident = self.vertex_faces()
+            triangles = self.vertices[self.faces]
+            centers = triangles.mean(axis=1)
+            radii = np.max(np.linalg.norm(triangles - centers.reshape(-1,1,3),axis=2),axis=1)
+            PQ = triangles[:,1] - triangles[:,0]
+            PR = triangles[:,2] - triangles[:,0]
+            normals = np.cross(PQ,PR)
+            normals = normals/np.linalg.norm(normals,axis=1).reshape(-1,1)
+            normals[np.sum(normals*centers,axis=1) < 0] *= -1 #pointing away from the origin, whatever the winding of the face
+            solvers = np.linalg.inv(np.stack((PQ,PR,normals),axis=2))
+            self._geometry = {'triangles':triangles,'centers':centers,'radii':radii,'normals':normals,'solvers':solvers,
+                              'incident':self._incident}
+        return self._geometry
+    
+    def vertex_faces(self):
+        """
+        The faces incident to each vertex, padded with -1
+        Returns
+        ----------
+        incident : (n, max degree) int
+          incident[i] lists the indices of the faces that have vertex i as a corner
+        """
+        corners = self.faces.reshape(-1)
+        order = np.argsort(corners,kind='stable')
+        degree = np.bincount(corners,minlength=self.vertices.shape[0])
+        starts = np.concatenate(([0],np.cumsum(degree)[:-1]))
+        slot = np.arange(corners.shape[0]) - np.repeat(starts,degree) #position of each corner among the corners of its vertex
+        incident = np.full((self.vertices.shape[0],max(degree.max(),1)),-1)
+        incident[corners[order],slot] = order//3
+        return incident
+
+    @profiled('closest_point_naive')
     def closest_point_naive(self, points):
         """
         Given a list of points find the closest point
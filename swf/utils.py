@@ -1,8 +1,4 @@
 import numpy as np 
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-import plotly.offline as pyo
-from plotly.subplots import make_subplots
 
 def checkRelation(a,b,c):
     """
@@ -73,9 +69,121 @@ def get_third_neighbors(adj):
     #fourth[fourth < 0] = 0
     third = pathExists.astype(int)-second-adj-np.eye(adj.shape[0]) #exclude vertices that are first and second neighbors, and identity (a_ii)
     third[third < 0] = 0
-    
+
     return third
 
+def neighbor_rows(adj,rows,perms=None):
+    """
+    Given an adjacency matrix, return some rows of the matrices of second and third neighbors, the same as
+    get_second_neighbors(adj)[rows] and get_third_neighbors(adj)[rows]. The walks are counted in floating point, which is exact here and much faster.
+    With vertex permutations that preserve the adjacency (symmetries of the mesh), only one row per orbit is computed
+    and the others are permuted from it, since second[p[i],p[j]] == second[i,j] for such a permutation p.
+    A scipy.sparse adjacency gives sparse rows, counted with sparse products, for meshes too fine for dense (r, n) walks.
+    Parameters
+    -----------
+    adj : (n, n) int, array or scipy.sparse matrix
+      A matrix where a_ij == 1 iff node i is incident to node j in the graph
+    rows : (r,) int
+      the vertices whose neighbors are needed
+    perms : (g, n) int (optional)
+      a group of vertex permutations, those that do not preserve adj or do not map rows onto themselves are ignored
+    Returns
+    -----------
+    second : (r, n) float, scipy.sparse csr matrix if adj is sparse
+    third : (r, n) float, scipy.sparse csr matrix if adj is sparse
+    """
+    rows = np.asarray(rows)
+    n = adj.shape[0]
+    is_sparse = hasattr(adj,'toarray')
+    position = np.full(n,-1)
+    position[rows] = np.arange(rows.shape[0])
+    usable = np.arange(n).reshape(1,n)
+    if perms is not None:
+        perms = np.asarray(perms).reshape(-1,n)
+        #a permutation preserves adj if it maps every edge onto an edge, looked up in the sorted edges
+        i,j = adj.nonzero()
+        edges = np.sort(i*n + j)
+        image = perms[:,i]*n + perms[:,j]
+        found = edges[np.minimum(np.searchsorted(edges,image),edges.shape[0] - 1)] == image
+        keep = np.all(position[perms[:,rows]] >= 0,axis=1) & np.all(found,axis=1)
+        usable = np.vstack((usable,perms[keep]))
+    #the permutations kept form a group, so the orbit of a row is its set of images: its smallest image is the
+    #representative, and some permutation maps the representative onto the row
+    images = position[usable[:,rows]] #(g, r)
+    source = images.min(axis=0)
+    through = np.argmax(images[:,source] == np.arange(rows.shape[0]),axis=0)
+    reps,index = np.unique(source,return_inverse=True)
+    reps = rows[reps]
+    A = adj.astype(float)
+    first = A[reps]
+    walks2 = first @ A
+    walks3 = walks2 @ A
+    if is_sparse:
+        import scipy.sparse as sparse #only needed for stored formats, kept out of the import of this module
+        eye = sparse.csr_matrix((np.ones(reps.shape[0]),(np.arange(reps.shape[0]),reps)),shape=(reps.shape[0],n))
+        second = ((walks2 > 0).astype(float) - first - eye).maximum(0).tocsr()
+        third = ((walks3 > 1).astype(float) - second - first - eye).maximum(0).tocsr()
+        second.eliminate_zeros()
+        third.eliminate_zeros()
+    else:
+        eye = np.zeros((reps.shape[0],n))
+        eye[np.arange(reps.shape[0]),reps] = 1
+        second = np.clip((walks2 > 0) - first - eye,0,None)
+        third = np.clip((walks3 > 1) - second - first - eye,0,None)
+    if reps.shape[0] == rows.shape[0]:
+        return second,third
+    #rows of the representatives permuted onto the others: row p[i] at columns p is row i, i.e. row i at columns p^-1
+    inverse = np.empty(n,dtype=int)
+    if is_sparse:
+        order,blocks2,blocks3 = [],[],[]
+        for g in np.unique(through):
+            k = np.flatnonzero(through == g)
+            inverse[usable[g]] = np.arange(n)
+            order.append(k)
+            blocks2.append(second[index[k]][:,inverse])
+            blocks3.append(third[index[k]][:,inverse])
+        order = np.argsort(np.concatenate(order))
+        return sparse.vstack(blocks2).tocsr()[order],sparse.vstack(blocks3).tocsr()[order]
+    out2 = np.empty((rows.shape[0],n))
+    out3 = np.empty((rows.shape[0],n))
+    for g in np.unique(through):
+        k = np.flatnonzero(through == g)
+        inverse[usable[g]] = np.arange(n)
+        out2[k] = second[index[k]][:,inverse]
+        out3[k] = third[index[k]][:,inverse]
+    return out2,out3
+
+def vertex_permutations(rotations,vertices,tol=1e-6):
+    """
+    Given orthogonal maps of the sphere, return the permutation of the vertices induced by each of them
+    Parameters
+    -----------
+    rotations : iterable of (3, 3) float
+      rotations or reflections
+    vertices : (n, 3) float
+    tol : float
+      largest distance between a mapped vertex and the vertex it is matched with
+    Returns
+    -----------
+    perms : (g, n) int
+      perms[k,i] == j iff rotations[k] maps vertex i onto vertex j, for the rotations that map every vertex onto a vertex
+    mapped : (len(rotations),) bool
+      which rotations do, perms holds their permutations in the same order
+    """
+    from scipy.spatial import cKDTree
+    vertices = np.asarray(vertices,dtype=float)
+    rotations = [np.asarray(R) for R in rotations]
+    tree = cKDTree(vertices)
+    perms = []
+    mapped = []
+    for R in rotations:
+        d,p = tree.query(vertices @ R.T,distance_upper_bound=tol)
+        ok = np.all(np.isfinite(d)) and np.unique(p).shape[0] == p.shape[0]
+        mapped.append(bool(ok))
+        if ok:
+            perms.append(p)
+    return np.array(perms,dtype=int).reshape(-1,vertices.shape[0]),np.array(mapped,dtype=bool)
+
 def cost(SWF,wl,wt,level_to_optimize=0):
     '''
     Given a SWF defined over some mesh with some lifting coefficients, compute the acoustic pressure, longitudinal velocity, and 
@@ -94,23 +202,15 @@ def cost(SWF,wl,wt,level_to_optimize=0):
     cost : int
           cost value
     '''
-    encoder = SWF.phi2s[level_to_optimize]
+    encoder = np.asarray(SWF.phi2s[level_to_optimize])
     if level_to_optimize == 0:
         opt_level_vertices = SWF.base.vertices
     else:
         opt_level_vertices = SWF.meshes[level_to_optimize-1].vertices
     N = SWF.meshes[-1].vertices.shape[0]
-    E = np.zeros([N,1])
-    for i in range(N):
-        onesource = np.zeros([N,1])
-        onesource[i] = 1
-        ui = SWF.meshes[-1].vertices[i]
-        c0 = encoder@onesource
-        V_ = np.sum(c0 * opt_level_vertices,axis=0)#velocity vector for each vertex
-        Vl = np.sum(V_ * ui)
-        Vt = np.linalg.norm(np.cross(V_,ui))
-        Ei = wl*((Vl-1)**2) + wt*(Vt**2) #the cost as computed for a source at vertex i
-        E[i]=Ei
+    #a source at finest vertex i is encoded to the column i of the encoder, so all N sources are handled at once
+    Vl,Vt = velocity(encoder,opt_level_vertices,SWF.meshes[-1].vertices.T)
+    E = wl*((Vl-1)**2) + wt*(Vt**2) #the cost as computed for a source at each vertex
     cost = np.sum(E)/N
     return cost
 
@@ -148,220 +248,58 @@ def toCartesian(point):
     z = point[0]*np.cos(point[2])
     return np.array([x,y,z])
 
-def PlotMesh(mesh,name=''):  
-    x = mesh.vertices[:,0]
-    y = mesh.vertices[:,1]
-    z = mesh.vertices[:,2]
-    i = mesh.faces[:,0]
-    j = mesh.faces[:,1]
-    k = mesh.faces[:,2]
-
-    verts = mesh.vertices
-    faces = mesh.faces
-
-    fig = make_subplots(
-              rows=1, cols=2, 
-              subplot_titles=(f'{name} Level {mesh.level} 3D Mesh', f'{name} Level {mesh.level} 3D Mesh with faces colored'),
-              horizontal_spacing=0.02,
-              specs=[[{"type": "scene"}]*2])  
-
-    #plot surface triangulation
-    tri_vertices = verts[faces]
-    Xe = []
-    Ye = []
-    Ze = []
-    for T in tri_vertices:
-        Xe += [T[k%3][0] for k in range(4)] + [ None]
-        Ye += [T[k%3][1] for k in range(4)] + [ None]
-        Ze += [T[k%3][2] for k in range(4)] + [ None]
-
-
-    fig.add_trace(go.Scatter3d(x=Xe,
-                         y=Ye,
-                         z=Ze,
-                         mode='lines',
-                         name='',
-                         line=dict(color= 'rgb(40,40,40)', width=0.5)), 1, 1);
-
-    lighting = dict(ambient=0.5,
-                    diffuse=1,
-                    fresnel=4,        
-                    specular=0.5,
-                    roughness=0.05,
-                    facenormalsepsilon=0)
-    lightposition=dict(x=100,
-                       y=100,
-                       z=10000)
-
-    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, 
-                            i=i, j=j, k=k, colorscale='matter_r' ,
-                            colorbar_len=0.85,
-                            colorbar_x=0.97,
-                            colorbar_thickness=20,
-                            intensity=np.random.rand(len(faces)),  
-                            intensitymode='cell',
-                            flatshading=True), 1, 2)
-    fig.data[1].update(lighting=lighting,
-                       lightposition=lightposition)                         
-
-
-    fig.update_layout(width=1000, height=600, font_size=10)
-    fig.update_scenes(camera_eye_x=1.45, camera_eye_y=1.45, camera_eye_z=1.45);
-    fig.update_scenes(xaxis_visible=False, yaxis_visible=False,zaxis_visible=False )
-
-    fig.show()
-    
-def weights3D(mesh, weights, name=''):  
+def toSpherical(point):
     """
-    plot weights over the vertices of a mesh
+    Given a point in cartesian coordinates, convert to spherical, the inverse of toCartesian
     
     Parameters
     -----------
-    mesh : Trimesh
-      the mesh over which to plot
-    weights : np.arr
-      array of weights, same length as vertices in the mesh 
-      
+    point : np.array(x,y,z)
     Returns
     -----------
-    plotly fig
+    np.array(r,a,e)
+      radius, azimuth, elevation (measured from the z axis, as in toCartesian)
     
     """
-    x = mesh.vertices[:,0]
-    y = mesh.vertices[:,1]
-    z = mesh.vertices[:,2]
-    i = mesh.faces[:,0]
-    j = mesh.faces[:,1]
-    k = mesh.faces[:,2]
-
-    verts = mesh.vertices
-    faces = mesh.faces
-
-    fig = make_subplots(
-              rows=1, cols=1, 
-              subplot_titles=[f'{name}'],
-              horizontal_spacing=0.02,
-              specs=[[{"type": "scene"}]*1])  
-
-    #plot surface triangulation
-    tri_vertices = verts[faces]
-    Xe = []
-    Ye = []
-    Ze = []
-    for T in tri_vertices:
-        Xe += [T[k%3][0] for k in range(4)] + [ None]
-        Ye += [T[k%3][1] for k in range(4)] + [ None]
-        Ze += [T[k%3][2] for k in range(4)] + [ None]
-
-
-
-    fig.add_trace(go.Mesh3d(x=x, y=y, z=z, 
-                            i=i, j=j, k=k, colorscale='matter_r' ,
-                            colorbar_len=0.85,
-                            colorbar_x=0.97,
-                            colorbar_thickness=20,
-                            intensity=weights,
-                            text=weights,
-                            intensitymode='vertex',
-                            flatshading=True), 1, 1)
-    lighting = dict(ambient=0.5,
-                    diffuse=1,
-                    fresnel=4,        
-                    specular=0.5,
-                    roughness=0.05,
-                    facenormalsepsilon=0)
-    lightposition=dict(x=100,
-                       y=100,
-                       z=10000)
-    
-    fig.data[0].update(lighting=lighting,
-                       lightposition=lightposition)                         
+    r = np.sqrt(point[0]**2 + point[1]**2 + point[2]**2)
+    a = np.arctan2(point[1],point[0])
+    e = np.arccos(np.clip(point[2]/r,-1,1)) if r > 0 else 0.0
+    return np.array([r,a,e])
 
-
-    fig.update_layout(width=1000, height=600, font_size=10)
-    fig.update_scenes(camera_eye_x=1.45, camera_eye_y=1.45, camera_eye_z=1.45);
-    fig.update_scenes(xaxis_visible=False, yaxis_visible=False,zaxis_visible=False )
-
-    fig.show()
-    
-def PlotFilters(meshset,idx=0):
+def PlotMesh(mesh,name='',lod=None,max_edges=50000,show=True):
     """
-    plot first row/column of A,B,P,Q filters for every mesh in meshset
-    
-    Parameters
-    -----------
-    meshset : iterable of Trimesh
-      the meshes from which to plot
-      
-    Returns
-    -----------
-    matplotlib fig
-    
+    plot a mesh, see plotting.PlotMesh. matplotlib and plotly are only imported when plotting.
     """
-    fig, axs = plt.subplots(2,2,figsize=(12,12))
-    for mesh in (meshset):
-        plane = np.isclose(mesh.vertices[:,2],np.zeros(mesh.vertices[:,2].shape))
-        P,Q,A,B = mesh.filters
-        azimuth = np.arctan2(mesh.vertices[:,1],mesh.vertices[:,0])[plane].flatten()
-        sorts = np.argsort(azimuth)
-        axs[0,0].plot(azimuth[sorts],A[idx,:][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
-
-        axs[0,1].plot(azimuth[sorts],B[idx,:][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+    from .plotting import PlotMesh
+    return PlotMesh(mesh,name,lod,max_edges,show)
 
-        axs[1,0].plot(azimuth[sorts],P[:,idx][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+def weights3D(mesh, weights, name='', show=True):
+    """
+    plot weights over the vertices of a mesh, see plotting.weights3D. matplotlib and plotly are only imported when plotting.
+    """
+    from .plotting import weights3D
+    return weights3D(mesh,weights,name,show)
 
-        axs[1,1].plot(azimuth[sorts],Q[:,idx][plane].flatten()[sorts],'--o',label=f'Level {mesh.level-1}')
+def SaveMesh(mesh, path, weights=None, name='', elev=30, azim=45, dpi=150):
+    """
+    render a mesh to an image file without a browser, see plotting.SaveMesh. matplotlib is only imported when plotting.
+    """
+    from .plotting import SaveMesh
+    return SaveMesh(mesh,path,weights,name,elev,azim,dpi)
 
-    axs[0,0].set_title('First Row of A')
-    axs[0,1].set_title('First Row of B')
-    axs[1,0].set_title('First Column of P')
-    axs[1,1].set_title('First Column of Q')
-    axs[0,0].legend()
-    axs[0,1].legend()
-    axs[1,0].legend()
-    axs[1,1].legend()
-    fig.tight_layout()
+def PlotFilters(meshset,idx=0):
+    """
+    plot first row/column of A,B,P,Q filters for every mesh in meshset, see plotting.PlotFilters. matplotlib and plotly are only imported when plotting.
+    """
+    from .plotting import PlotFilters
+    return PlotFilters(meshset,idx)
 
 def PlotWavelets(SWF,idx=0):
     """
-    plot wavelets and scaling functions for a given base vertex within a given SWF
-    
-    Parameters
-    -----------
-    SWF : SWF object
-      the format of interest
-    idx : int
-      the index of the vertex to graph
-      
-    Returns
-    -----------
-    matplotlib fig
-    
+    plot wavelets and scaling functions for a given base vertex within a given SWF, see plotting.PlotWavelets. matplotlib and plotly are only imported when plotting.
     """
-    fig, axs = plt.subplots(2,2,figsize=(10,10))
-    for i in range(0,SWF.n):
-        mesh = SWF.meshes[-1]
-        plane = np.isclose(mesh.vertices[:,2],np.zeros(mesh.vertices[:,2].shape))
-        phi,psi,dualphi,dualpsi = (SWF.phis[i],SWF.psis[i],SWF.phi2s[i],SWF.psi2s[i]) 
-        azimuth = np.arctan2(mesh.vertices[:,1],mesh.vertices[:,0])[plane].flatten()
-        sorts = np.argsort(azimuth)
-        axs[0,0].plot(azimuth[sorts],dualphi[idx,:][plane].flatten()[sorts],'-',label=f'$\overline{{\phi^{i+1}_{idx}}}$')
-
-        axs[0,1].plot(azimuth[sorts],dualpsi[idx,:][plane].flatten()[sorts],'-',label=f'$\overline{{\psi^{i+1}_{idx}}}$')
-
-        axs[1,0].plot(azimuth[sorts],phi[:,idx][plane].flatten()[sorts],'-',label=f'$\phi^{i+1}_{idx}$')
-
-        axs[1,1].plot(azimuth[sorts],psi[:,idx][plane].flatten()[sorts],'-',label=f'$\psi^{i+1}_{idx}$')
-
-    axs[0,0].set_title('horizontal section of dual scaling function, first row')
-    axs[0,1].set_title('horizontal section of dual wavelet, first row')
-    axs[1,0].set_title('horizontal section of scaling function, first column')
-    axs[1,1].set_title('horizontal section of wavelet, first column')
-    axs[0,0].legend()
-    axs[0,1].legend()
-    axs[1,0].legend()
-    axs[1,1].legend()
-    fig.tight_layout()
+    from .plotting import PlotWavelets
+    return PlotWavelets(SWF,idx)
 
 def AreaTRI(TRI):
     """
@@ -505,7 +443,7 @@ def total_acoustic_pressure(coarse):
     total_acoustic_pressure : (k,) float
       TAP for each sample in k
     """
-    return np.sum(coarse)
+    return np.sum(coarse,axis=0)
 
 def energy(coarse):
     """
@@ -520,10 +458,24 @@ def energy(coarse):
     energy : (k,) float
       energy for each sample in k
     """
-    return np.sum(np.absolute(coarse)**2)
+    return np.sum(np.absolute(coarse)**2,axis=0)
+
+def _samples(coarse,vertices,loc):
+    #coarse gains as (n, k) and source locations as (3, k), and whether a single source was given as (n,) and (3,)
+    coarse = np.asarray(coarse)
+    loc = np.asarray(loc)
+    single = loc.ndim == 1
+    if loc.shape[0] != 3 or loc.ndim > 2:
+        raise ValueError(f'source locations must be (3,) or (3, k), got {loc.shape}; transpose (k, 3) locations')
+    coarse = coarse.reshape(vertices.shape[0],-1)
+    loc = loc.reshape(3,-1)
+    if coarse.shape[1] != loc.shape[1]:
+        raise ValueError(f'{coarse.shape[1]} samples of coarse gains for {loc.shape[1]} source locations')
+    return coarse,loc,single
+
 def velocity(coarse,vertices,loc):
     """
-    Return the longitudinal and transverse velocity in some coarse representation
+    Return the longitudinal and transverse velocity in some coarse representation. See metrics.py for large grids of directions.
     
     Parameters
     ----------
@@ -532,20 +484,23 @@ def velocity(coarse,vertices,loc):
     vertices : (n, 3) float
       vertex locations for coarse mesh
     loc : (3, k) float
-      virtual source location in R3 for each sample in k
+      virtual source location in R3 for each sample in k, or (3,) for a single source with coarse (n,)
     Returns
     ----------
     (Vl,Vt) : ((k,),(k,)) float
-      Longitudinal and Transverse velocities, respectively 
+      Longitudinal and Transverse velocities, respectively, two floats for a single source
     """
-    coarse = coarse.reshape(11,1)
-    V_ = np.sum(coarse * vertices,axis=0)#velocity vector for each vertex
-    Vl = np.sum(V_ * loc)
-    Vt = np.linalg.norm(np.cross(V_,loc))
+    coarse,loc,single = _samples(coarse,vertices,loc)
+    V_ = vertices.T @ coarse #velocity vector for each sample
+    Vl = np.sum(V_ * loc,axis=0)
+    Vt = np.linalg.norm(np.cross(V_,loc,axis=0),axis=0)
+    if single:
+        return float(Vl[0]),float(Vt[0])
     return Vl,Vt
+
 def intensity(coarse,vertices,loc):
     """
-    Return the longitudinal and transverse intensity in some coarse representation
+    Return the longitudinal and transverse intensity in some coarse representation. See metrics.py for large grids of directions.
     
     Parameters
     ----------
@@ -554,14 +509,16 @@ def intensity(coarse,vertices,loc):
     vertices : (n, 3) float
       vertex locations for coarse mesh
     loc : (3, k) float
-      virtual source location in R3 for each sample in k
+      virtual source location in R3 for each sample in k, or (3,) for a single source with coarse (n,)
     Returns
     ----------
     (Il,It) : ((k,),(k,)) float
-      Longitudinal and Transverse intensities, respectively 
+      Longitudinal and Transverse intensities, respectively, two floats for a single source
     """
-    coarse = coarse.reshape(11,1)
-    I_ = np.sum((np.absolute(coarse)**2 * vertices)/energy(coarse,loc),axis=0)#velocity vector for each vertex
-    Il = np.sum(I_ * loc)
-    It = np.linalg.norm(np.cross(I_,loc))
-    return Il,It
\ No newline at end of file
+    coarse,loc,single = _samples(coarse,vertices,loc)
+    I_ = (vertices.T @ np.absolute(coarse)**2)/energy(coarse) #intensity vector for each sample
+    Il = np.sum(I_ * loc,axis=0)
+    It = np.linalg.norm(np.cross(I_,loc,axis=0),axis=0)
+    if single:
+        return float(Il[0]),float(It[0])
+    return Il,It
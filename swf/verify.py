@@ -0,0 +1,153 @@
+import time
+import numpy as np
+from .utils import checkRelation
+
+# Randomized verification of the filters of a SWF without forming any product of two of them. A relation X == Y between
+# two linear maps is checked on random sign vectors x, comparing X x with Y x, so each filter is only multiplied by a thin
+# block of probes. For an error matrix E = X - Y, the entry i of E x is E_ij x_j + (terms independent of x_j), and one of
+# the two signs of x_j makes it at least |E_ij| in magnitude: each probe finds a violation E_ij with probability 1/2 or
+# more, so k probes miss it with probability at most 2**-k. The largest |E x| over the probes is then, with that
+# confidence, at least the largest |E_ij|, and never more than the largest row sum of |E|.
+# The checked relations, for the filters P (N, n), Q (N, m), A (n, N), B (m, N) of every level:
+#   biorthogonality   A P = I, B Q = I, A Q = 0, B P = 0
+#   reconstruction    P A + Q B = I
+#   sums (modified lifting scheme, the default of subdivide, checked exactly with the all-ones vector)
+#                     1 P = 1, 1 Q = 0, 1 A = 1, i.e. the synthesis keeps the pressure and the wavelets have none
+# and for the operators, phi2s[j] phis[j] = I and 1 phi2s[j] = 1.
+RELATIONS = ('AP','BQ','AQ','BP','reconstruction','sum_P','sum_Q','sum_A','coefficients')
+OPERATORS = ('phi2_phi','sum_phi2')
+
+def probe_count(confidence):
+    """
+    Number of random sign probes that find a given violation with at least this probability, ceil(log2(1/(1-confidence)))
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f'confidence must be between 0 and 1, got {confidence}')
+    return max(int(np.ceil(-np.log2(1 - confidence))),1)
+
+def probes(n,k,rng):
+    """
+    k random sign vectors of length n
+
+    Returns
+    -----------
+    (n, k) float
+    """
+    return rng.integers(0,2,size=(n,k))*2.0 - 1
+
+def _worst(residual):
+    #largest magnitude of a residual, and the row it is in. NaN counts as an infinite error, so that it fails any tolerance
+    residual = np.nan_to_num(np.abs(np.asarray(residual).reshape(residual.shape[0],-1)),nan=np.inf,posinf=np.inf)
+    if residual.size == 0:
+        return 0.0,-1
+    row = int(np.argmax(np.max(residual,axis=1)))
+    return float(np.max(residual[row])),row
+
+def verify_filters(P,Q,A,B,k=30,rng=None,sums=True):
+    """
+    Check the biorthogonality, reconstruction and sums of the filters of one level with k probes
+
+    Parameters
+    -----------
+    P, Q, A, B : arrays, memory maps or scipy.sparse matrices
+      the filters of a level, P (N, n), Q (N, m), A (n, N), B (m, N)
+    k : int
+      number of probes
+    rng : np.random.Generator (optional)
+    sums : bool
+      whether to check the sums, which only hold for the modified lifting scheme
+    Returns
+    -----------
+    worst : dict of str -> (float, int)
+      for every relation, the largest error found and its row (in the output of the relation)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    N,n = P.shape
+    m = Q.shape[1]
+    if Q.shape[0] != N or A.shape != (n,N) or B.shape != (m,N):
+        raise ValueError(f'inconsistent filter shapes P {P.shape}, Q {Q.shape}, A {A.shape}, B {B.shape}')
+    worst = {}
+    #every filter is applied twice: to probes of the coarse and detail spaces, then to probes of the fine space
+    X = probes(n,k,rng)
+    Y = probes(m,k,rng)
+    PX = np.asarray(P @ X)
+    QY = np.asarray(Q @ Y)
+    worst['AP'] = _worst(np.asarray(A @ PX) - X)
+    worst['BQ'] = _worst(np.asarray(B @ QY) - Y)
+    worst['AQ'] = _worst(np.asarray(A @ QY))
+    worst['BP'] = _worst(np.asarray(B @ PX))
+    Z = probes(N,k,rng)
+    worst['reconstruction'] = _worst(np.asarray(P @ np.asarray(A @ Z)) + np.asarray(Q @ np.asarray(B @ Z)) - Z)
+    if sums:
+        worst['sum_P'] = _worst(np.asarray(P.T @ np.ones(N)) - 1)
+        worst['sum_Q'] = _worst(np.asarray(Q.T @ np.ones(N)))
+        worst['sum_A'] = _worst(np.asarray(A.T @ np.ones(n)) - 1)
+    return worst
+
+def verify(model,confidence=1-1e-9,tol=1e-9,sums=True,operators=True,seed=None):
+    """
+    Verify every level of a SWF, and optionally its operators, with random probes
+
+    Parameters
+    -----------
+    model : SWF
+    confidence : float
+      probability of finding any single violation larger than tol, which sets the number of probes
+    tol : float
+      largest error accepted
+    sums : bool
+      check the sums of the filters and encoders, which hold for the modified lifting scheme (the default) only
+    operators : bool
+      also check phi2s[j] phis[j] = I and the sums of phi2s[j] for every level j
+    seed : int (optional)
+    Returns
+    -----------
+    report : dict
+      'levels': for every level, a dict relation -> (error, row); 'operators': the same for every level j if checked;
+      'worst': (error, part, level, relation, row) of the largest error; 'passed': whether it is below tol;
+      'probes' and 'seconds'
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    k = probe_count(confidence)
+    levels = []
+    for mesh,P,Q,A,B in zip(model.meshes,model.Ps,model.Qs,model.As,model.Bs):
+        worst = verify_filters(P,Q,A,B,k,rng,sums)
+        worst['coefficients'] = (0.0 if checkRelation(mesh.ALPHA,mesh.BETA,mesh.GAMMA) else float(abs(2*mesh.ALPHA + 2*mesh.BETA + 4*mesh.GAMMA - 1)),-1)
+        levels.append(worst)
+    chain = []
+    if operators:
+        for phi2,phi in zip(model.phi2s,model.phis):
+            worst = {}
+            X = probes(phi.shape[1],k,rng)
+            worst['phi2_phi'] = _worst(np.asarray(phi2 @ np.asarray(phi @ X)) - X)
+            if sums:
+                worst['sum_phi2'] = _worst(np.asarray(phi2.T @ np.ones(phi2.shape[0])) - 1)
+            chain.append(worst)
+    worst = (0.0,None,None,None,-1)
+    for part,results in (('levels',levels),('operators',chain)):
+        for j,result in enumerate(results):
+            for relation,(error,row) in result.items():
+                if error > worst[0]:
+                    worst = (error,part,j,relation,row)
+    return {'levels':levels,'operators':chain,'worst':worst,'passed':worst[0] <= tol,'probes':k,
+            'seconds':time.perf_counter() - start}
+
+def summary(report):
+    """
+    A table of the largest error of every relation and level of a report of verify
+
+    Returns
+    -----------
+    str
+    """
+    lines = [f"{'':12}" + ''.join(f'{relation:>16}' for relation in RELATIONS + OPERATORS)]
+    for j in range(max(len(report['levels']),len(report['operators']))):
+        result = dict(report['levels'][j]) if j < len(report['levels']) else {}
+        if j < len(report['operators']):
+            result.update(report['operators'][j])
+        lines.append(f'level {j:<6}' + ''.join(f'{result[r][0]:>16.3e}' if r in result else f"{'-':>16}" for r in RELATIONS + OPERATORS))
+    error,part,j,relation,row = report['worst']
+    lines.append(f"{report['probes']} probes, {report['seconds']:.3f} s, " + ('passed' if report['passed'] else 'FAILED') +
+                 ('' if part is None else f', worst {error:.3e} in {relation} of level {j} ({part}), row {row}'))
+    return '\n'.join(lines)
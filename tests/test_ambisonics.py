@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.ambisonics import real_sh, transcoder, vertex_solid_angles
+from swf.constants import verticesOCT, facesOCT
+
+
+@pytest.fixture(scope='module')
+def model():
+    return SWF(Trimesh(verticesOCT, facesOCT), n=3)
+
+
+def test_solid_angles_cover_the_sphere(model):
+    assert np.isclose(vertex_solid_angles(model.meshes[-1]).sum(), 4*np.pi)
+
+
+@pytest.mark.parametrize('order,normalization', [(1, 'sn3d'), (1, 'n3d'), (1, 'fuma'), (3, 'sn3d'), (3, 'n3d')])
+@pytest.mark.parametrize('truncation_level', [0, 2])
+def test_plane_wave_pressure(model, order, normalization, truncation_level):
+    directions = np.random.default_rng(0).standard_normal((20, 3))
+    M = transcoder(model, order, truncation_level, normalization)
+    coarse = M @ real_sh(directions, order, normalization).T
+    assert np.allclose(coarse.sum(axis=0), 1)
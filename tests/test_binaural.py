@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.binaural import BinauralDecoder, synthetic_hrirs
+from swf.constants import verticesOCT, facesOCT
+
+
+@pytest.mark.parametrize('taps,blocksize', [(100, 32), (64, 64), (20, 64)], ids=['partitions', 'one partition', 'short'])
+def test_overlap_add_equals_convolution(taps, blocksize):
+    rng = np.random.default_rng(0)
+    hrirs = rng.standard_normal((3, 2, taps))
+    decoder = BinauralDecoder(hrirs, blocksize)
+    signal = rng.standard_normal((10*blocksize, 3))
+    out = np.vstack([decoder.process(signal[i:i+blocksize]) for i in range(0, signal.shape[0], blocksize)])
+    for ear in range(2):
+        expected = sum(np.convolve(signal[:, c], hrirs[c, ear]) for c in range(3))[:signal.shape[0]]
+        assert np.allclose(out[:, ear], expected)
+
+
+def test_from_model_uses_the_nearest_hrirs():
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=1)
+    directions = np.vstack((model.base.vertices[::-1], [[0.6, 0.8, 0]]))
+    hrirs = synthetic_hrirs(directions, taps=64)
+    decoder = BinauralDecoder.from_model(model, hrirs, directions, 32)
+    impulse = np.zeros((32, model.base.vertices.shape[0]))
+    impulse[0] = 1
+    out = np.vstack([decoder.process(impulse)] + [decoder.process(np.zeros_like(impulse)) for _ in range(2)])
+    assert np.allclose(out[:64], hrirs[:-1].sum(axis=0).T)
@@ -0,0 +1,40 @@
+import numpy as np
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT, vertices704, faces704
+from swf.swf import build_formats
+
+
+def assert_same_format(a, b):
+    assert a.n == b.n
+    for mesh, other in zip([a.base] + a.meshes, [b.base] + b.meshes):
+        assert np.array_equal(mesh.faces, other.faces)
+        assert np.allclose(mesh.vertices, other.vertices)
+    for name in ('Ps', 'Qs', 'As', 'Bs', 'phis', 'psis', 'phi2s', 'psi2s'):
+        for X, Y in zip(getattr(a, name), getattr(b, name)):
+            assert np.array_equal(np.asarray(X), np.asarray(Y))
+
+
+def test_threaded_builds_match_sequential():
+    variants = [dict(vertices=verticesOCT, faces=facesOCT, n=2),
+                dict(vertices=verticesOCT, faces=facesOCT, n=2, ALPHA=0.55, BETA=0.0, GAMMA=(1 - 2*0.55)/4),
+                dict(vertices=vertices704, faces=faces704, n=2)]
+    threaded = build_formats(variants, threads=3)
+    for variant, model in zip(variants, threaded):
+        variant = dict(variant)
+        vertices, faces, n = variant.pop('vertices'), variant.pop('faces'), variant.pop('n')
+        assert_same_format(model, SWF(Trimesh(vertices, faces, **variant), n=n))
+
+
+def test_shared_mesh_subdivided_from_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    base = Trimesh(verticesOCT, facesOCT)
+    vertices, faces = base.vertices.copy(), base.faces.copy()
+    expected = base.subdivide()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        meshes = list(pool.map(lambda _: base.subdivide(), range(8)))
+    assert np.array_equal(base.vertices, vertices) and np.array_equal(base.faces, faces)
+    for mesh in meshes:
+        assert np.array_equal(mesh.vertices, expected.vertices) and np.array_equal(mesh.faces, expected.faces)
+        assert all(np.array_equal(np.asarray(X), np.asarray(Y)) for X, Y in zip(mesh.filters, expected.filters))
+
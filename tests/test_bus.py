@@ -0,0 +1,32 @@
+import numpy as np
+
+from swf.bus import GainBus, BusRenderer
+
+
+def test_stale_counts_blocks_behind_the_bus():
+    bus = GainBus(2, 3)
+    try:
+        renderer = BusRenderer(bus, 16)
+        block = np.ones((16, 2))
+        out = np.zeros((16, 3))
+        renderer.process(block, out) #nothing published yet
+        bus.publish(np.ones((2, 3)))
+        renderer.process(block, out)
+        assert (renderer.stale, renderer.torn) == (0, 0)
+        # a writer caught in the middle of writing over the active slot: the read is torn and the gains in use are behind
+        bus.publish(2*np.ones((2, 3)))
+        bus.header[1 + int(bus.header[0])] += 1
+        renderer.process(block, out)
+        assert (renderer.stale, renderer.torn) == (1, 1)
+        assert np.all(renderer.gains == 1)
+        bus.header[1 + int(bus.header[0])] -= 1
+        renderer.process(block, out)
+        assert (renderer.stale, renderer.torn) == (1, 1)
+        assert np.all(renderer.gains == 2)
+        # a publish landing just after the poll of a block
+        poll = renderer.poll
+        renderer.poll = lambda: (poll(), bus.publish(3*np.ones((2, 3))))[0]
+        renderer.process(block, out)
+        assert (renderer.stale, renderer.torn) == (2, 1)
+    finally:
+        bus.close()
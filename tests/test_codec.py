@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.codec import Codec
+from swf.constants import verticesOCT, facesOCT
+
+
+@pytest.fixture(scope='module')
+def model():
+    return SWF(Trimesh(verticesOCT, facesOCT), n=2)
+
+
+def test_round_trip_at_zero_threshold(model):
+    fine = np.random.default_rng(0).standard_normal((model.meshes[-1].vertices.shape[0], 4))
+    codec = Codec(model)
+    assert np.allclose(codec.decode(*codec.encode(fine)), fine)
+    assert codec.report(fine)['max_error'] < 1e-9
+
+
+def test_quantization_error_is_bounded_by_the_steps(model):
+    fine = np.random.default_rng(1).standard_normal((model.meshes[-1].vertices.shape[0], 4))
+    step = 1e-3
+    codec = Codec(model, steps=step, base_step=step)
+    base, details = codec.encode(fine)
+    assert base.dtype == np.int32 and all(d.dtype == np.int32 for d in details)
+    # every coefficient is off by at most half a step, spread by the synthesis operators
+    exact_base, exact_details = codec.analyze(fine)
+    assert np.max(np.abs(codec.dequantize(base, details)[0] - exact_base)) <= step/2 + 1e-12
+    bound = step/2*(np.abs(np.asarray(model.phis[0])).sum(axis=1).max() + sum(np.abs(np.asarray(psi)).sum(axis=1).max() for psi in model.psis))
+    assert np.max(np.abs(codec.decode(base, details) - fine)) <= bound
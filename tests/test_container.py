@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import vertices704, faces704
+from swf.container import ContainerWriter, ContainerReader
+
+
+@pytest.fixture(scope='module')
+def model():
+    return SWF(Trimesh(vertices704, faces704), n=2)
+
+
+def test_read_at_every_level(tmp_path, model):
+    fine = np.random.default_rng(0).standard_normal((model.meshes[-1].vertices.shape[0], 300))
+    path = str(tmp_path / 'stream.swfc')
+    writer = ContainerWriter(path, model, 48000, fine.shape[1])
+    writer.write(fine[:, :128])
+    writer.write(fine[:, 128:])
+    writer.close()
+    reader = ContainerReader(path)
+    assert reader.levels == model.n
+    for k in range(model.n):
+        expected = np.asarray(model.phi2s[k]) @ fine
+        assert np.allclose(reader.read(k, model=model), expected.T, atol=1e-5) #stored as float32
+    assert np.allclose(reader.read(model.n, model=model), fine.T, atol=1e-5)
+    assert np.allclose(reader.read(1, start=100, frames=50, model=model), (np.asarray(model.phi2s[1]) @ fine[:, 100:150]).T, atol=1e-5)
+
+
+def test_empty_stream(tmp_path, model):
+    path = str(tmp_path / 'empty.swfc')
+    ContainerWriter(path, model, 48000, 0).close()
+    reader = ContainerReader(path)
+    assert reader.read(model.n, model=model).shape == (0, model.meshes[-1].vertices.shape[0])
+    with pytest.raises(ValueError):
+        ContainerWriter(path, model, 48000, -1)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import vertices704, faces704, verticesOCT, facesOCT
+from swf.engine import Engine, allocations
+from swf.render import Orbit
+
+
+@pytest.mark.parametrize('vertices,faces', [(verticesOCT, facesOCT), (vertices704, faces704)], ids=['octahedron', '704'])
+def test_no_allocation_after_warmup(vertices, faces):
+    # a simulated callback loop of moving sources: once warmed up, the engine must not allocate any array
+    model = SWF(Trimesh(vertices, faces), n=3)
+    sources, blocksize, blocks = 8, 512, 96
+    engine = Engine(model, sources, blocksize)
+    trajectories = [Orbit(2 + k, elevation=0.1*k) for k in range(sources)]
+    signal = np.random.default_rng(0).standard_normal((blocks*blocksize, sources))
+    report = allocations(engine, trajectories, signal)
+    assert report['blocks'] == blocks - 16
+    assert report['retained_bytes'] == 0
+    assert report['relocations'] == 0
+    assert report['peak_bytes'] < blocksize*8 #smaller than one block of one source
+
+
+def test_matches_encoder():
+    model = SWF(Trimesh(vertices704, faces704), n=3)
+    engine = Engine(model, 1, 64)
+    position = np.array([[0.6, 0.3, 0.5]])
+    position /= np.linalg.norm(position)
+    engine.set_position(0, position[0])
+    out = np.zeros((64, engine.channels))
+    engine.process(np.ones((64, 1)), out)
+    engine.process(np.ones((64, 1)), out) #the gains ramp over the first block
+    expected = np.asarray(model.phi2s[0]) @ model.interpolate(position)
+    assert np.allclose(out[-1], expected[:, 0], atol=1e-12)
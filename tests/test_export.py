@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.export import DENSE, SPARSE, FUSED, export_encoder, load_encoder, read_header
+
+
+@pytest.fixture(scope='module')
+def model():
+    return SWF(Trimesh(verticesOCT, facesOCT), n=2)
+
+
+def test_dense_round_trip(model, tmp_path):
+    nbytes = export_encoder(model, tmp_path/'encoder.bin', truncation_level=1)
+    encoder, header = load_encoder(tmp_path/'encoder.bin')
+    expected = np.asarray(model.phi2s[1])
+    assert nbytes == (tmp_path/'encoder.bin').stat().st_size == 32 + 4*expected.size
+    assert header['layout'] == DENSE and header['truncation_level'] == 1
+    assert np.array_equal(encoder, expected.astype(np.float32))
+
+
+def test_sparse_round_trip(model, tmp_path):
+    tol = 1e-3
+    export_encoder(model, tmp_path/'sparse.bin', layout=SPARSE, tol=tol)
+    (indptr, indices, values), header = load_encoder(tmp_path/'sparse.bin')
+    expected = np.asarray(model.phi2s[0])
+    dense = np.zeros(expected.shape, dtype=np.float32)
+    rows = np.repeat(np.arange(header['rows']), np.diff(indptr))
+    dense[rows, indices] = values
+    kept = np.abs(expected) > tol
+    assert header['nnz'] == kept.sum()
+    assert np.array_equal(dense, np.where(kept, expected, 0).astype(np.float32))
+
+
+def test_fused_gains_match_interpolation(model, tmp_path):
+    export_encoder(model, tmp_path/'fused.bin', layout=FUSED)
+    fused, header = load_encoder(tmp_path/'fused.bin')
+    assert header['faces'] == model.meshes[-1].faces.shape[0]
+    loc = np.random.default_rng(0).standard_normal((10, 3))
+    ind = model.locate(loc)
+    w = model.weights(loc, ind)
+    gains = np.stack([w[k] @ fused[3*f:3*f+3] for k, f in enumerate(ind)], axis=1)
+    assert np.allclose(gains, model.encode(model.interpolate(loc), 0), atol=1e-6)
+
+
+def test_rejects_other_files(tmp_path):
+    (tmp_path/'other.bin').write_bytes(b'\0'*32)
+    with pytest.raises(ValueError):
+        read_header(tmp_path/'other.bin')
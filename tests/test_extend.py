@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT, vertices704, faces704
+
+
+def assert_close_formats(a, b):
+    assert a.n == b.n
+    for mesh, other in zip([a.base] + a.meshes, [b.base] + b.meshes):
+        assert np.array_equal(mesh.faces, other.faces)
+        assert np.allclose(mesh.vertices, other.vertices)
+    for name in ('Ps', 'Qs', 'As', 'Bs', 'phis', 'psis', 'phi2s', 'psi2s'):
+        for X, Y in zip(getattr(a, name), getattr(b, name)):
+            assert np.allclose(np.asarray(X), np.asarray(Y), atol=1e-10)
+
+
+@pytest.mark.parametrize('vertices,faces', [(verticesOCT, facesOCT), (vertices704, faces704)], ids=['octahedron', '704'])
+def test_extend_and_truncate_match_fresh_builds(vertices, faces):
+    model = SWF(Trimesh(vertices, faces), n=1)
+    model.extend(2)
+    assert_close_formats(model, SWF(Trimesh(vertices, faces), n=3))
+    model.truncate(2)
+    assert_close_formats(model, SWF(Trimesh(vertices, faces), n=1))
+    model.extend(1)
+    assert_close_formats(model, SWF(Trimesh(vertices, faces), n=2))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT, vertices704, faces704
+from swf.utils import AreaTRI
+
+
+def area_weights(model, loc, ind):
+    # the sub-triangle areas of the projection of each point, over the area of its face
+    PQR = model.meshes[-1].vertices[model.meshes[-1].faces[ind]]
+    normals = np.cross(PQR[:, 1] - PQR[:, 0], PQR[:, 2] - PQR[:, 0])
+    normals = normals/np.linalg.norm(normals, axis=1).reshape(-1, 1)
+    S = loc - np.sum(normals*(loc - PQR[:, 0]), axis=1).reshape(-1, 1)*normals
+    areas = [AreaTRI(np.stack([S if c == corner else PQR[:, c] for c in range(3)], axis=1)) for corner in range(3)]
+    return np.column_stack(areas)/AreaTRI(PQR).reshape(-1, 1)
+
+
+@pytest.mark.parametrize('vertices,faces', [(verticesOCT, facesOCT), (vertices704, faces704)], ids=['octahedron', '704'])
+def test_weights_match_sub_triangle_areas(vertices, faces):
+    model = SWF(Trimesh(vertices, faces), n=2)
+    rng = np.random.default_rng(0)
+    loc = rng.standard_normal((300, 3))
+    loc = loc/np.linalg.norm(loc, axis=1).reshape(-1, 1)
+    ind = model.locate(loc)
+    expected = area_weights(model, loc, ind)
+    assert np.allclose(model.weights(loc, ind), expected/expected.sum(axis=1).reshape(-1, 1))
+    # inside their face, the signed coordinates are the area ratios and sum to 1
+    assert np.allclose(np.abs(model.barycentric(loc, ind)), expected)
+    assert np.allclose(model.barycentric(loc, ind).sum(axis=1), 1)
+    # the centroid of every face is inside it, with equal coordinates, and outside the next face
+    faces = np.arange(model.meshes[-1].faces.shape[0])
+    centers = model.meshes[-1].geometry()['centers']
+    assert model.contains(centers, faces).all()
+    assert np.allclose(model.barycentric(centers, faces), 1/3)
+    assert not model.contains(centers, (faces + 1) % faces.shape[0]).any()
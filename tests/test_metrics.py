@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.metrics import MAPS, evaluate, summary
+from swf.utils import cost, velocity, intensity
+
+
+@pytest.fixture(scope='module')
+def model():
+    return SWF(Trimesh(verticesOCT, facesOCT), n=2)
+
+
+def test_cost_map_matches_utils_cost(model):
+    fine = model.meshes[-1].vertices
+    maps = evaluate(model, directions=fine)
+    assert np.isclose(np.mean(maps['cost'], dtype=float), cost(model, 1, 1), rtol=1e-5)
+
+
+def test_summary_of_non_finite_maps():
+    maps = {name: np.array([np.nan, np.inf]) for name in MAPS}
+    stats = summary(maps)
+    assert all(np.isnan(value) for entry in stats.values() for value in entry.values())
+    maps = {name: np.array([3.0, np.nan]) for name in MAPS}
+    assert summary(maps)['pressure_error']['rms'] == 3.0
+
+
+def test_velocity_shapes(model):
+    vertices = model.base.vertices
+    encoder = np.asarray(model.phi2s[0])
+    loc = model.meshes[-1].vertices[:5]
+    Vl, Vt = velocity(encoder[:, :5], vertices, loc.T)
+    assert Vl.shape == Vt.shape == (5,)
+    single = velocity(encoder[:, 0], vertices, loc[0])
+    assert isinstance(single[0], float) and np.allclose(single, (Vl[0], Vt[0]))
+    assert np.allclose(intensity(encoder[:, 0], vertices, loc[0]), [x[0] for x in intensity(encoder[:, :5], vertices, loc.T)])
+    with pytest.raises(ValueError):
+        velocity(encoder[:, :5], vertices, loc)
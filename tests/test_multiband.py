@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.multiband import MultibandRenderer
+from swf.render import Renderer
+
+
+def static(t):
+    return np.tile([0.3, -0.5, 0.8], (np.size(t), 1))
+
+
+@pytest.mark.parametrize('crossovers,levels', [((700,), (1, 1)), ((300, 1500), (1, 1, 1))], ids=['two bands', 'three bands'])
+def test_static_source_matches_full_band(crossovers, levels):
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    samplerate, L = 16000, 512
+    signal = np.random.default_rng(0).standard_normal(16*L)
+    multiband = MultibandRenderer(model, [static], samplerate, crossovers, levels)
+    full = Renderer(model, static, samplerate, 1)
+    out = np.vstack([multiband.process(signal[i:i+L].reshape(-1, 1), i) for i in range(0, signal.shape[0], L)])
+    expected = np.vstack([full.process(signal[i:i+L], i) for i in range(0, signal.shape[0], L)])
+    latency = multiband.latency
+    assert 0 < latency < signal.shape[0]//2
+    assert np.allclose(out[latency:], expected[:-latency], atol=1e-9)
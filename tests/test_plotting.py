@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('plotly')
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.plotting import PlotMesh, wireframe
+
+
+def test_lod_applies_to_both_traces():
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    fig = PlotMesh(model.meshes[-1], lod=model.meshes[0], show=False)
+    lines, faces = fig.data
+    assert len(lines.x) == 3*12*4 #every edge of the first level and a NaN after it
+    assert len(faces.i) == model.meshes[0].faces.shape[0]
+    assert len(faces.x) == model.meshes[0].vertices.shape[0]
+
+
+def test_max_edges_thins_the_wireframe():
+    mesh = SWF(Trimesh(verticesOCT, facesOCT), n=2).meshes[-1]
+    Xe, Ye, Ze = wireframe(mesh, max_edges=10)
+    assert len(Xe) == 30 and np.isnan(Xe[2::3]).all()
@@ -0,0 +1,27 @@
+from swf import SWF, Trimesh, profiling
+from swf.constants import verticesOCT, facesOCT
+
+
+def test_enable_records_spans_of_the_library():
+    # the package modules must share the profiling state of swf.profiling, as OSCserver.py --profile relies on
+    was_enabled = profiling.enabled()
+    profiling.reset()
+    profiling.enable()
+    try:
+        SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    finally:
+        if not was_enabled:
+            profiling.disable()
+    stats = profiling.stats()
+    for name in ('swf/init', 'subdivide', 'lifting/modliftingScheme', 'lifting/neighbors', 'swf/phis'):
+        assert name in stats, name
+    assert stats['subdivide']['calls'] == 2
+    profiling.reset()
+
+
+def test_profiled_keeps_the_metadata_of_the_function():
+    method = Trimesh.subdivide
+    assert method.__qualname__ == 'Trimesh.subdivide'
+    assert method.__module__ == 'swf.trimesh'
+    assert method.__wrapped__.__name__ == 'subdivide'
+    assert 'Subdivide a mesh' in method.__doc__
@@ -0,0 +1,74 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.render import Orbit, load_trajectory, render_file
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def signal(tmp_path):
+    path = tmp_path/'source.wav'
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, 3000)
+    sf.write(path, samples, 8000, subtype='FLOAT')
+    return path, samples.astype(np.float32).astype(float)
+
+
+def test_streaming_matches_direct_encoding(tmp_path, signal):
+    path, samples = signal
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    orbit = Orbit(0.2, elevation=0.4)
+    frames = render_file(model, path, tmp_path/'out.wav', orbit, truncation_level=1, blocksize=700, hop_size=1, subtype='DOUBLE')
+    out, samplerate = sf.read(tmp_path/'out.wav')
+    assert frames == samples.shape[0] and samplerate == 8000
+    expected = (model.encode(model.interpolate(orbit(np.arange(frames)/8000)), 1)*samples).T
+    assert np.allclose(out, expected)
+
+
+def test_trajectory_files(tmp_path):
+    csv = tmp_path/'path.csv'
+    csv.write_text('t,x,y,z\n0,1,0,0\n1,0,2,0\n')
+    trajectory = load_trajectory(csv)
+    np.savez(tmp_path/'path.npz', times=[0, 1], positions=[[1, 0, 0], [0, 2, 0]])
+    for loaded in (trajectory, load_trajectory(tmp_path/'path.npz')):
+        assert np.allclose(loaded([0, 0.5, 2]), [[1, 0, 0], [1/np.sqrt(5), 2/np.sqrt(5), 0], [0, 1, 0]])
+
+
+def test_command_line(tmp_path, signal):
+    path, _ = signal
+    subprocess.run([sys.executable, 'offline_render.py', str(path), str(tmp_path/'cli.wav'), '--model', 'octahedron',
+                    '--subdivisions', '1', '--orbit', '0.5', '--blocksize', '1024', '--subtype', 'DOUBLE'],
+                   cwd=ROOT, check=True, capture_output=True)
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=1)
+    render_file(model, path, tmp_path/'direct.wav', Orbit(0.5), blocksize=1024, subtype='DOUBLE')
+    assert np.array_equal(sf.read(tmp_path/'cli.wav')[0], sf.read(tmp_path/'direct.wav')[0])
+
+
+def test_scene_is_the_same_for_any_number_of_processes(tmp_path, signal):
+    from swf.render import render_scene
+    path, _ = signal
+    other = tmp_path/'other.wav'
+    sf.write(other, np.random.default_rng(1).uniform(-0.5, 0.5, 2000), 8000, subtype='FLOAT')
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    sources = [(str(path), Orbit(0.3)), (str(other), Orbit(-0.7, elevation=0.5))]
+    outputs = []
+    for processes in (1, 2):
+        outfile = tmp_path/f'scene{processes}.wav'
+        frames = render_scene(model, sources, outfile, truncation_level=1, blocksize=256, chunk_size=1000, processes=processes, subtype='DOUBLE')
+        assert frames == 3000
+        outputs.append(sf.read(outfile)[0])
+    assert np.array_equal(outputs[0], outputs[1])
+    # the sum of the sources rendered on their own
+    for i, (infile, trajectory) in enumerate(sources):
+        render_file(model, infile, tmp_path/f'alone{i}.wav', trajectory, truncation_level=1, blocksize=256, subtype='DOUBLE')
+    alone = [sf.read(tmp_path/f'alone{i}.wav')[0] for i in range(2)]
+    expected = alone[0].copy()
+    expected[:alone[1].shape[0]] += alone[1]
+    assert np.allclose(outputs[0], expected)
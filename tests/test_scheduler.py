@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(SWF(Trimesh(verticesOCT, facesOCT), n=2), 48000, blocksize=256, hop_sizes=(256,))
+    # a fixed cost table: a finer level costs one more unit
+    scheduler.cost = {(L, 256): 1 + L for L in scheduler.levels}
+    scheduler.load = 1.0
+    scheduler.add('a', lambda t: np.outer(np.cos(t), [1, 0, 0]) + np.outer(np.sin(t), [0, 1, 0]))
+    return scheduler
+
+
+def test_plan_counts_the_crossfade(scheduler):
+    blocks = {'a': np.ones(256)}
+    scheduler.sources['a'].level = 1
+    # staying costs 2, moving up to level 2 costs 3 plus 2 for the crossfade
+    scheduler.budget = 4
+    plan, predicted = scheduler.plan(blocks, 0)
+    assert plan['a'] == (1, 256) and predicted == 2
+    scheduler.budget = 5
+    plan, predicted = scheduler.plan(blocks, 0)
+    assert plan['a'] == (2, 256) and predicted == 5
+
+
+def test_plan_degrades_an_overrun(scheduler):
+    scheduler.add('b', scheduler.sources['a'].trajectory)
+    scheduler.sources['a'].level = scheduler.sources['b'].level = 2
+    scheduler.budget = 5
+    plan, predicted = scheduler.plan({'a': np.ones(256), 'b': 0.1*np.ones(256)}, 0)
+    # the quiet source drops to the coarsest level, which fits the budget from the next block on
+    assert plan == {'a': (2, 256), 'b': (0, 256)}
+    assert predicted == 3 + 1 + 3
@@ -0,0 +1,31 @@
+import numpy as np
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.session import Session
+
+
+def test_locate_matches_naive():
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    points = np.random.default_rng(0).standard_normal((500, 3))
+    _, _, naive = model.meshes[-1].closest_point_naive(points)
+    assert np.array_equal(model.locate(points), naive)
+    assert np.array_equal(model.locate(points, block=64), naive)
+
+
+def test_batched_tick_matches_interpolate():
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    session = Session(model)
+    positions = np.random.default_rng(1).standard_normal((6, 3))
+    for i, position in enumerate(positions):
+        session.set_position(i, position)
+    updated = session.tick()
+    for i, position in enumerate(positions):
+        assert np.allclose(updated[str(i)], model.interpolate(position)[:, 0])
+    # a second tick reuses the cached faces of the sources that stayed inside them
+    moved = positions + 1e-3
+    for i, position in enumerate(moved):
+        session.set_position(i, position)
+    updated = session.tick()
+    for i, position in enumerate(moved):
+        assert np.allclose(updated[str(i)], model.interpolate(position)[:, 0])
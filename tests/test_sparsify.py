@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.sparsify import sparsify
+
+
+@pytest.fixture(scope='module')
+def encoder():
+    return np.asarray(SWF(Trimesh(verticesOCT, facesOCT), n=3).phi2s[0])
+
+
+@pytest.mark.parametrize('criterion', ['gain', 'energy'])
+def test_bound_and_column_sums(encoder, criterion):
+    bound = 1e-2
+    S, report = sparsify(encoder, bound, criterion)
+    pruned = S.toarray()
+    assert S.nnz < np.count_nonzero(encoder)
+    assert np.allclose(pruned.sum(axis=0), encoder.sum(axis=0))
+    if criterion == 'gain':
+        assert np.max(np.abs(pruned - encoder)) <= bound + 1e-12
+    else:
+        assert np.max(np.linalg.norm(pruned - encoder, axis=1)/np.linalg.norm(encoder, axis=1)) <= bound + 1e-12
+    assert report['sums_preserved'] and report['nnz_after'] == S.nnz
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh, symmetry
+from swf.constants import verticesOCT, facesOCT, vertices704, faces704
+
+
+@pytest.mark.parametrize('vertices,faces', [(verticesOCT, facesOCT), (vertices704, faces704)], ids=['octahedron', '704'])
+@pytest.mark.parametrize('symmetric', [False, True], ids=['plain', 'symmetric'])
+def test_stored_filters_match(tmp_path, vertices, faces, symmetric):
+    # a stored format builds its lifting matrices sparse, and must give the same filters and encoders
+    rotations = symmetry.detect(Trimesh(vertices, faces)) if symmetric else None
+    memory = SWF(Trimesh(vertices, faces, symmetry=rotations), n=3)
+    stored = SWF(Trimesh(vertices, faces, symmetry=rotations), n=3, store=str(tmp_path))
+    for a, b in zip(memory.meshes, stored.meshes):
+        for X, Y in zip(a.filters, b.filters):
+            assert isinstance(Y, np.memmap)
+            assert np.allclose(np.asarray(X), Y, rtol=0, atol=1e-15)
+    for X, Y in zip(memory.phi2s, stored.phi2s):
+        assert np.allclose(X, Y, rtol=0, atol=1e-15)
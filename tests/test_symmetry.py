@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from swf import SWF, Trimesh, symmetry
+from swf.constants import verticesOCT, facesOCT, vertices301, faces301
+from swf.utils import cost, vertex_permutations
+
+
+@pytest.mark.parametrize('vertices,faces,order', [(verticesOCT, facesOCT, 48), (vertices301, faces301, 6)], ids=['octahedron', '301'])
+def test_inherited_permutations(vertices, faces, order):
+    rotations = symmetry.detect(Trimesh(vertices, faces))
+    assert len(rotations) == order
+    model = SWF(Trimesh(vertices, faces, symmetry=rotations), n=3)
+    plain = SWF(Trimesh(vertices, faces), n=3)
+    for mesh in model.meshes:
+        # derived from the parent's, they are the permutations matched from the coordinates
+        perms, mapped = vertex_permutations(mesh.symmetry, mesh.vertices)
+        assert mapped.all()
+        assert np.array_equal(perms, mesh.permutations)
+    for X, Y in zip(model.phi2s, plain.phi2s):
+        assert np.array_equal(X, Y)
+    assert np.isclose(symmetry.orbit_cost(model, 1, 1), cost(plain, 1, 1), rtol=1e-12)
+
+
+def test_orbits_of_generators():
+    # a 3-cycle, and two generators of the cyclic group of the last 4 vertices
+    perms = [[1, 2, 0, 3, 4, 5, 6], [0, 1, 2, 4, 3, 5, 6], [0, 1, 2, 3, 5, 6, 4]]
+    representatives, sizes, orbit = symmetry.orbits(perms)
+    assert np.array_equal(representatives, [0, 3])
+    assert np.array_equal(sizes, [3, 4])
+    assert np.array_equal(orbit, [0, 0, 0, 1, 1, 1, 1])
+
+
+
+def test_update_geometry_keeps_the_symmetries_that_hold():
+    rotations = symmetry.detect(Trimesh(verticesOCT, facesOCT))
+    model = SWF(Trimesh(verticesOCT, facesOCT, symmetry=rotations), n=2)
+    model.update_geometry(verticesOCT)
+    assert [len(mesh.symmetry) for mesh in [model.base] + model.meshes] == [48, 48, 48]
+    # moving one loudspeaker breaks most of them
+    moved = np.array(verticesOCT, dtype=float)
+    moved[0] += [0.1, 0.2, 0.3]
+    model.update_geometry(moved)
+    for mesh in [model.base] + model.meshes:
+        assert 1 <= len(mesh.symmetry) < 48
+        perms, mapped = vertex_permutations(mesh.symmetry, mesh.vertices)
+        assert mapped.all() and np.array_equal(perms, mesh.permutations)
@@ -0,0 +1,20 @@
+import numpy as np
+
+from swf import SWF, Trimesh
+from swf.constants import verticesOCT, facesOCT
+from swf.verify import verify
+
+
+def test_passes_on_exact_filters():
+    report = verify(SWF(Trimesh(verticesOCT, facesOCT), n=2), seed=0)
+    assert report['passed']
+
+
+def test_non_finite_residual_fails():
+    model = SWF(Trimesh(verticesOCT, facesOCT), n=2)
+    A = np.array(model.As[0], dtype=float)
+    A[3, 5] = np.nan
+    model.As[0] = A
+    report = verify(model, seed=0)
+    assert not report['passed']
+    assert report['worst'][0] == np.inf